@@ -2,8 +2,9 @@ from .wrapped_internal_port import WrappedVerilogInternalPort
 from .ms_types import (RealIn, RealOut, RealType,
                        ElectIn, ElectOut, ElectType)
 from .tester import (Tester, SymbolicTester, PythonTester, TesterBase,
-                     SynchronousTester)
+                     SynchronousTester, VerilatorTester)
 from .power_tester import PowerTester
+from .test_suite import TestSuite, TestResult
 from .value import Value, AnyValue, UnknownValue, HiZ
 import fault.random
 from .verilogams import VAMSWrap
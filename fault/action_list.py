@@ -0,0 +1,187 @@
+"""
+Structure-of-arrays storage for long action sequences.
+
+A `CompactActionList` behaves like the list of actions stored in
+`Tester.actions`, but the common actions (`Poke`, `Expect`, `Eval` and
+`Step` of plain ports with constant values) are stored as one row of a few
+typed arrays instead of as Python objects:
+
+    kind   action type (`_POKE`, `_EXPECT`, ..., `_NONE` for objects)
+    port   index into the table of interned ports
+    type   index into the table of interned value types
+    value  the value as an unsigned 64-bit int (the steps for `Step`)
+
+Equivalent action objects are created on demand when the list is indexed or
+iterated.  Any other action is kept as is.
+"""
+from array import array
+from collections.abc import MutableSequence
+from hwtypes import BitVector, Bit
+import fault.actions as actions
+
+
+_NONE, _POKE, _EXPECT, _EXPECT_STRICT, _EVAL, _STEP = range(6)
+_MAX_VALUE = (1 << 64) - 1
+
+
+def _make(cls, **kwargs):
+    # bypass __init__, the arguments were checked when the action was first
+    # created
+    action = cls.__new__(cls)
+    for name, value in kwargs.items():
+        setattr(action, name, value)
+    return action
+
+
+class CompactActionList(MutableSequence):
+    def __init__(self, iterable=()):
+        self.kinds = array('B')
+        self.ports = array('I')
+        self.types = array('H')
+        self.values = array('Q')
+        # actions that aren't stored in the arrays (None for compact rows)
+        self.objects = []
+        self.port_table = []
+        self.port_ids = {}
+        self.type_table = []
+        self.type_ids = {}
+        self.extend(iterable)
+
+    def _intern_port(self, port):
+        key = id(port)
+        if key not in self.port_ids:
+            self.port_ids[key] = len(self.port_table)
+            # keeps `port` alive, so its id isn't reused
+            self.port_table.append(port)
+        return self.port_ids[key]
+
+    def _intern_type(self, type_):
+        if type_ not in self.type_ids:
+            self.type_ids[type_] = len(self.type_table)
+            self.type_table.append(type_)
+        return self.type_ids[type_]
+
+    def _compact_value(self, value):
+        if isinstance(value, Bit):
+            return type(value), int(value)
+        if isinstance(value, BitVector) and value.num_bits <= 64:
+            return type(value), value.as_uint()
+        return None
+
+    def _encode(self, action):
+        """
+        Returns a (kind, port, type, value) row for `action`, or None if the
+        action has to be stored as an object.
+        """
+        cls = type(action)
+        if cls is actions.Eval:
+            return _EVAL, 0, 0, 0
+        if cls is actions.Step:
+            if not isinstance(action.steps, int) or \
+                    not 0 <= action.steps <= _MAX_VALUE or \
+                    action.until is not None or not action.trace:
+                return None
+            return _STEP, self._intern_port(action.clock), 0, action.steps
+        if cls is actions.Poke:
+            if action.delay is not None:
+                return None
+            kind = _POKE
+        elif cls is actions.Expect:
+            if (action.above is not None or action.below is not None or
+                    action.caller is not None or action.msg is not None or
+                    action.strict not in (True, False)):
+                return None
+            kind = _EXPECT_STRICT if action.strict else _EXPECT
+        else:
+            return None
+        value = self._compact_value(action.value)
+        if value is None:
+            return None
+        type_, value = value
+        return (kind, self._intern_port(action.port), self._intern_type(type_),
+                value)
+
+    def _decode(self, index):
+        obj = self.objects[index]
+        if obj is not None:
+            return obj
+        kind = self.kinds[index]
+        if kind == _EVAL:
+            return _make(actions.Eval)
+        port = self.port_table[self.ports[index]]
+        if kind == _STEP:
+            return _make(actions.Step, clock=port, steps=self.values[index],
+                         until=None, trace=True)
+        value = self.type_table[self.types[index]](self.values[index])
+        if kind == _POKE:
+            return _make(actions.Poke, port=port, value=value, delay=None)
+        return _make(actions.Expect, port=port, value=value,
+                     strict=kind == _EXPECT_STRICT, above=None, below=None,
+                     caller=None, msg=None)
+
+    def _row(self, action):
+        row = self._encode(action)
+        if row is None:
+            return (_NONE, 0, 0, 0), action
+        return row, None
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._decode(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("action index out of range")
+        return self._decode(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._decode(index)
+
+    def __setitem__(self, index, action):
+        if isinstance(index, slice):
+            raise NotImplementedError("Slice assignment")
+        (kind, port, type_, value), obj = self._row(action)
+        self.kinds[index] = kind
+        self.ports[index] = port
+        self.types[index] = type_
+        self.values[index] = value
+        self.objects[index] = obj
+
+    def __delitem__(self, index):
+        for column in (self.kinds, self.ports, self.types, self.values,
+                       self.objects):
+            del column[index]
+
+    def insert(self, index, action):
+        (kind, port, type_, value), obj = self._row(action)
+        self.kinds.insert(index, kind)
+        self.ports.insert(index, port)
+        self.types.insert(index, type_)
+        self.values.insert(index, value)
+        self.objects.insert(index, obj)
+
+    def append(self, action):
+        (kind, port, type_, value), obj = self._row(action)
+        self.kinds.append(kind)
+        self.ports.append(port)
+        self.types.append(type_)
+        self.values.append(value)
+        self.objects.append(obj)
+
+    def __add__(self, other):
+        # like list concatenation, e.g. when a target adds actions around the
+        # ones of a test
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __str__(self):
+        return str(list(self))
+
+    def __repr__(self):
+        return f"CompactActionList({list(self)})"
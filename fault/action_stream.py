@@ -0,0 +1,76 @@
+"""
+Incremental code generation for long tests.
+
+An `ActionStream` stands in for the list of actions of a tester: the code for
+every appended action is generated right away and written to a body file, so
+the memory used by a test doesn't grow with its length.  Only `GetValue`
+actions are retained (their values are read back after the simulation).
+
+When the test bench is written, the template is formatted with `MARKER` in
+place of the body of the test, which `write_source` replaces with the contents
+of the body file.
+"""
+import shutil
+from pathlib import Path
+from fault.actions import GetValue, FileOpen, FileClose
+
+
+MARKER = "__fault_action_stream__"
+
+
+class ActionStream:
+    def __init__(self, target, body_file, indent):
+        self.target = target
+        self.body_file = Path(body_file)
+        self.indent = indent
+        self.length = 0
+        self.get_value_actions = []
+        self.file = open(self.body_file, "w")
+        # the value file is always opened, since GetValue actions can be
+        # recorded at any point of the stream
+        self._write(FileOpen(target.value_file))
+
+    @property
+    def closed(self):
+        return self.file is None
+
+    def _write(self, action):
+        if self.closed:
+            raise RuntimeError(f"Action stream {self.body_file} is closed")
+        for line in self.target.generate_action_code(self.length, action):
+            self.file.write(f"{self.indent}{line}\n")
+        self.length += 1
+
+    def append(self, action):
+        self._write(action)
+        if isinstance(action, GetValue):
+            self.get_value_actions.append(action)
+
+    def extend(self, actions):
+        for action in actions:
+            self.append(action)
+
+    def close(self):
+        if not self.closed:
+            self._write(FileClose(self.target.value_file))
+            self.file.close()
+            self.file = None
+
+    def write_source(self, f, src):
+        """
+        Write `src` to the file object `f`, replacing the line containing
+        `MARKER` with the code generated for the stream.
+        """
+        self.close()
+        head, tail = src.split(MARKER, 1)
+        f.write(head[:head.rfind("\n") + 1])
+        with open(self.body_file, "r") as body:
+            shutil.copyfileobj(body, f)
+        f.write(tail[tail.find("\n") + 1:])
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        # only the retained actions are available
+        return iter(self.get_value_actions)
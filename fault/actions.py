@@ -11,6 +11,10 @@ import fault.expression as expression
 
 
 class Action(ABC):
+    # Subclasses for the common actions define __slots__ so that long tests
+    # don't pay for an instance __dict__ per action
+    __slots__ = ()
+
     @abstractmethod
     def retarget(self, new_circuit, clock):
         """
@@ -23,6 +27,8 @@ class Action(ABC):
 
 
 class PortAction(Action):
+    __slots__ = ('port', 'value')
+
     def __init__(self, port, value):
         super().__init__()
         self.port = port
@@ -52,6 +58,8 @@ def is_input(port):
 
 
 class Poke(PortAction):
+    __slots__ = ('delay', )
+
     def __init__(self, port, value, delay=None):
         if not isinstance(port, Var) and is_input(port):
             raise ValueError(f"Can only poke inputs: {port.debug_name} "
@@ -126,6 +134,8 @@ class GetValue(Action):
 
 
 class Expect(PortAction):
+    __slots__ = ('strict', 'above', 'below', 'caller', 'msg')
+
     def __init__(self, port, value, strict=False, abs_tol=None, rel_tol=None,
                  above=None, below=None, caller=None, msg=None):
         # call super constructor
@@ -196,6 +206,8 @@ class Peek(Action, expression.Expression):
 
 
 class Eval(Action):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
 
@@ -219,17 +231,28 @@ class Delay(Action):
 
 
 class Step(Action):
-    def __init__(self, clock, steps):
+    __slots__ = ('clock', 'steps', 'until', 'trace')
+
+    def __init__(self, clock, steps, until=None, trace=True):
         super().__init__()
         # TODO(rsetaluri): Check if `clock` is a clock type?
         self.clock = clock
         self.steps = steps
+        # stop early once this signal (or expression) is true
+        self.until = until
+        # whether waveforms are dumped while stepping
+        self.trace = trace
 
     def __str__(self):
-        return f"Step({self.clock.debug_name}, steps={self.steps})"
+        options = ""
+        if self.until is not None:
+            options += f", until={self.until}"
+        if not self.trace:
+            options += ", trace=False"
+        return f"Step({self.clock.debug_name}, steps={self.steps}{options})"
 
     def retarget(self, new_circuit, clock):
-        return Step(clock, self.steps)
+        return Step(clock, self.steps, self.until, self.trace)
 
 
 class Loop(Action):
@@ -251,6 +274,43 @@ class Loop(Action):
                     actions=actions, count=self.count)
 
 
+class TableLoop(Action):
+    """
+    Run `actions` `n_iter` times, reading the data of the pokes and expects
+    in `actions` from consecutive rows of `table` (see
+    fault.loop_compression).  `start` is the index of the first action
+    replaced by the loop and `period` is the number of actions per
+    iteration, which together determine the index reported for failures.
+    Unless `loop_var` is given, the loop variable is named after `start`, so
+    that it doesn't clash with user variables or other table loops.
+    """
+    def __init__(self, n_iter, period, actions, table, start=0,
+                 loop_var=None):
+        self.n_iter = n_iter
+        self.period = period
+        self.actions = actions
+        self.table = table
+        self.start = start
+        if loop_var is None:
+            loop_var = f"__fault_table_row_{start}"
+        self.loop_var = loop_var
+
+    def __str__(self):
+        return f"TableLoop({self.n_iter}, {self.period}, {self.actions})"
+
+    def index(self, j):
+        """
+        Expression computing the index of action `j` of the loop body.
+        """
+        return f"({self.start} + {self.loop_var} * {self.period} + {j})"
+
+    def retarget(self, new_circuit, clock):
+        actions = [action.retarget(new_circuit, clock) for action in
+                   self.actions]
+        return TableLoop(self.n_iter, self.period, actions, self.table,
+                         start=self.start, loop_var=self.loop_var)
+
+
 class Fork(Action):
     def __init__(self, name, actions):
         self.name = name
@@ -460,3 +520,50 @@ class Finish(Action):
 
     def retarget(self, new_circuit, clock):
         return Finish()
+
+
+class SaveState(Action):
+    """
+    Save the state of the simulation to `file_name`, so that later
+    simulations can start from it (see `RestoreState`)
+    """
+    def __init__(self, file_name):
+        super().__init__()
+        self.file_name = str(file_name)
+
+    def __str__(self):
+        return f"SaveState({self.file_name})"
+
+    def retarget(self, new_circuit, clock):
+        return SaveState(self.file_name)
+
+
+class RestoreState(Action):
+    """
+    Restore the state of the simulation from a file written by `SaveState`
+    """
+    def __init__(self, file_name):
+        super().__init__()
+        self.file_name = str(file_name)
+
+    def __str__(self):
+        return f"RestoreState({self.file_name})"
+
+    def retarget(self, new_circuit, clock):
+        return RestoreState(self.file_name)
+
+
+class TraceControl(Action):
+    """
+    Start (`enable=True`) or stop dumping waveforms from this point of the
+    simulation on
+    """
+    def __init__(self, enable):
+        super().__init__()
+        self.enable = enable
+
+    def __str__(self):
+        return f"TraceControl({self.enable})"
+
+    def retarget(self, new_circuit, clock):
+        return TraceControl(self.enable)
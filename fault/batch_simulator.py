@@ -0,0 +1,666 @@
+"""
+Word-parallel simulator for CoreIR netlists.
+
+The netlist is flattened into primitives whose ports are connected by nets of
+single bits.  Every primitive output (and every top-level input) is a word
+holding one numpy uint64 per stimulus vector, so each primitive is evaluated
+for all of the independent vectors of a batch with a handful of numpy
+operations.  This makes exhaustive sweeps of small blocks (ALUs, decoders,
+...) much faster than simulating one vector at a time.
+
+Only signals of at most 64 bits are supported.
+"""
+import json
+import re
+import numpy as np
+
+
+MAX_WIDTH = 64
+
+_BV_LITERAL = re.compile(r"^(\d+)'([bdhoBDHO])([0-9a-fA-F_xXzZ]+)$")
+_BASES = {'b': 2, 'o': 8, 'd': 10, 'h': 16}
+
+
+def _mask(width):
+    return np.uint64((1 << width) - 1)
+
+
+def _clog2(n):
+    return max((n - 1).bit_length(), 1)
+
+
+def _parse_value(value):
+    """
+    Parse a CoreIR modarg value, e.g. ["Bool", true] or
+    [["BitVector", 16], "16'h0001"], into an int.
+    """
+    if isinstance(value, list):
+        value = value[1]
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int):
+        return value
+    match = _BV_LITERAL.match(value)
+    if match is None:
+        return int(value, 0)
+    digits = match.group(3).replace('_', '')
+    return int(digits, _BASES[match.group(2).lower()])
+
+
+def _arg(args, name, default=None):
+    if name not in args:
+        if default is None:
+            raise KeyError(name)
+        return default
+    return _parse_value(args[name])
+
+
+def _bits(width, direction):
+    return ["Array", width, direction]
+
+
+def _primitive_type(ref, genargs, modargs):
+    """
+    Port types of the supported CoreIR primitives, in the same format as the
+    types of modules in CoreIR JSON.  Returns None if `ref` is not a
+    primitive.
+    """
+    lib, name = ref.split('.', 1)
+    if lib == 'corebit':
+        binary = {'and', 'or', 'xor'}
+        if name in binary:
+            return {'in0': 'BitIn', 'in1': 'BitIn', 'out': 'Bit'}
+        if name in {'not', 'wire'}:
+            return {'in': 'BitIn', 'out': 'Bit'}
+        if name == 'mux':
+            return {'in0': 'BitIn', 'in1': 'BitIn', 'sel': 'BitIn',
+                    'out': 'Bit'}
+        if name in {'const', 'undriven'}:
+            return {'out': 'Bit'}
+        if name == 'term':
+            return {'in': 'BitIn'}
+        if name == 'reg':
+            return {'in': 'BitIn', 'clk': 'BitIn', 'out': 'Bit'}
+        if name == 'reg_arst':
+            return {'in': 'BitIn', 'clk': 'BitIn', 'arst': 'BitIn',
+                    'out': 'Bit'}
+        if name == 'concat':
+            return {'in0': 'BitIn', 'in1': 'BitIn', 'out': _bits(2, 'Bit')}
+        return None
+    if lib == 'coreir':
+        if name in {'wrap', 'unwrap'}:
+            return {'in': 'BitIn', 'out': 'Bit'}
+        if name == 'slice':
+            width = _arg(genargs, 'width')
+            lo, hi = _arg(genargs, 'lo'), _arg(genargs, 'hi')
+            return {'in': _bits(width, 'BitIn'), 'out': _bits(hi - lo, 'Bit')}
+        if name == 'concat':
+            width0, width1 = _arg(genargs, 'width0'), _arg(genargs, 'width1')
+            return {'in0': _bits(width0, 'BitIn'),
+                    'in1': _bits(width1, 'BitIn'),
+                    'out': _bits(width0 + width1, 'Bit')}
+        if name in {'zext', 'sext'}:
+            return {'in': _bits(_arg(genargs, 'width_in'), 'BitIn'),
+                    'out': _bits(_arg(genargs, 'width_out'), 'Bit')}
+        width = _arg(genargs, 'width')
+        if name in _BINARY_OPS:
+            return {'in0': _bits(width, 'BitIn'), 'in1': _bits(width, 'BitIn'),
+                    'out': _bits(width, 'Bit')}
+        if name in _COMPARE_OPS:
+            return {'in0': _bits(width, 'BitIn'), 'in1': _bits(width, 'BitIn'),
+                    'out': 'Bit'}
+        if name in {'not', 'neg', 'wire'}:
+            return {'in': _bits(width, 'BitIn'), 'out': _bits(width, 'Bit')}
+        if name in {'andr', 'orr', 'xorr'}:
+            return {'in': _bits(width, 'BitIn'), 'out': 'Bit'}
+        if name == 'mux':
+            return {'in0': _bits(width, 'BitIn'), 'in1': _bits(width, 'BitIn'),
+                    'sel': 'BitIn', 'out': _bits(width, 'Bit')}
+        if name in {'const', 'undriven'}:
+            return {'out': _bits(width, 'Bit')}
+        if name == 'term':
+            return {'in': _bits(width, 'BitIn')}
+        if name == 'reg':
+            return {'in': _bits(width, 'BitIn'), 'clk': 'BitIn',
+                    'out': _bits(width, 'Bit')}
+        if name == 'reg_arst':
+            return {'in': _bits(width, 'BitIn'), 'clk': 'BitIn',
+                    'arst': 'BitIn', 'out': _bits(width, 'Bit')}
+        return None
+    if lib == 'commonlib' and name == 'muxn':
+        n, width = _arg(genargs, 'N'), _arg(genargs, 'width')
+        data = ["Array", n, _bits(width, 'BitIn')]
+        return {'in': ["Record", [["data", data],
+                                  ["sel", _bits(_clog2(n), 'BitIn')]]],
+                'out': _bits(width, 'Bit')}
+    return None
+
+
+def _signed(x, width):
+    x = x.astype(np.int64)
+    if width < 64:
+        sign = (x >> np.int64(width - 1)) & np.int64(1)
+        x = x - (sign << np.int64(width))
+    return x
+
+
+def _shift_amount(b, width):
+    return np.minimum(b, np.uint64(63)), b >= np.uint64(width)
+
+
+def _shl(a, b, width):
+    amount, overflow = _shift_amount(b, width)
+    return np.where(overflow, np.uint64(0), a << amount)
+
+
+def _lshr(a, b, width):
+    amount, overflow = _shift_amount(b, width)
+    return np.where(overflow, np.uint64(0), a >> amount)
+
+
+def _ashr(a, b, width):
+    amount, _ = _shift_amount(b, width)
+    amount = np.minimum(amount, np.uint64(width - 1)).astype(np.int64)
+    return (_signed(a, width) >> amount).astype(np.uint64)
+
+
+def _sdiv(a, b, width):
+    a, b = _signed(a, width), _signed(b, width)
+    zero = b == 0
+    b = np.where(zero, 1, b)
+    # C-style division truncates towards zero
+    q = (np.abs(a) // np.abs(b)) * np.sign(a) * np.sign(b)
+    return np.where(zero, 0, q).astype(np.uint64)
+
+
+def _srem(a, b, width):
+    q = _signed(_sdiv(a, b, width), width)
+    sa, sb = _signed(a, width), _signed(b, width)
+    return np.where(sb == 0, sa, sa - q * sb).astype(np.uint64)
+
+
+def _udiv(a, b, width):
+    zero = b == 0
+    return np.where(zero, np.uint64(0), a // np.where(zero, np.uint64(1), b))
+
+
+def _urem(a, b, width):
+    zero = b == 0
+    return np.where(zero, a, a % np.where(zero, np.uint64(1), b))
+
+
+_BINARY_OPS = {
+    'add': lambda a, b, w: a + b,
+    'sub': lambda a, b, w: a - b,
+    'mul': lambda a, b, w: a * b,
+    'udiv': _udiv,
+    'urem': _urem,
+    'sdiv': _sdiv,
+    'srem': _srem,
+    'and': lambda a, b, w: a & b,
+    'or': lambda a, b, w: a | b,
+    'xor': lambda a, b, w: a ^ b,
+    'shl': _shl,
+    'lshr': _lshr,
+    'ashr': _ashr,
+    'umin': lambda a, b, w: np.minimum(a, b),
+    'umax': lambda a, b, w: np.maximum(a, b),
+    'smin': lambda a, b, w: np.where(_signed(a, w) < _signed(b, w), a, b),
+    'smax': lambda a, b, w: np.where(_signed(a, w) > _signed(b, w), a, b),
+}
+
+_COMPARE_OPS = {
+    'eq': lambda a, b, w: a == b,
+    'neq': lambda a, b, w: a != b,
+    'ult': lambda a, b, w: a < b,
+    'ule': lambda a, b, w: a <= b,
+    'ugt': lambda a, b, w: a > b,
+    'uge': lambda a, b, w: a >= b,
+    'slt': lambda a, b, w: _signed(a, w) < _signed(b, w),
+    'sle': lambda a, b, w: _signed(a, w) <= _signed(b, w),
+    'sgt': lambda a, b, w: _signed(a, w) > _signed(b, w),
+    'sge': lambda a, b, w: _signed(a, w) >= _signed(b, w),
+}
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = []
+
+    def new(self):
+        self.parent.append(len(self.parent))
+        return len(self.parent) - 1
+
+    def find(self, x):
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, x, y):
+        self.parent[self.find(x)] = self.find(y)
+
+
+def _named_direction(name):
+    # e.g. coreir.clkIn, coreir.arstIn
+    return 'BitIn' if name.endswith('In') else 'Bit'
+
+
+def _layout(type_, uf, inputs):
+    """
+    Allocate bits for a value of CoreIR type `type_`.  Returns a nested
+    structure of lists (arrays) and dicts (records) with bit ids as leaves.
+    The ids of bits that are inputs of the module are added to `inputs`.
+    """
+    if isinstance(type_, str):
+        if type_ in {'Bit', 'BitIn', 'BitInOut'}:
+            bit = uf.new()
+            if type_ == 'BitIn':
+                inputs.add(bit)
+            return bit
+        raise NotImplementedError(f"Unsupported CoreIR type {type_}")
+    kind = type_[0]
+    if kind == 'Array':
+        return [_layout(type_[2], uf, inputs) for _ in range(type_[1])]
+    if kind == 'Record':
+        fields = type_[1]
+        if isinstance(fields, dict):
+            fields = list(fields.items())
+        return {name: _layout(t, uf, inputs) for name, t in fields}
+    if kind == 'Named':
+        return _layout(_named_direction(type_[1]), uf, inputs)
+    raise NotImplementedError(f"Unsupported CoreIR type {type_}")
+
+
+def _flatten(layout):
+    if isinstance(layout, int):
+        return [layout]
+    if isinstance(layout, dict):
+        layout = layout.values()
+    return [bit for elem in layout for bit in _flatten(elem)]
+
+
+def _select(layout, path):
+    for key in path:
+        if isinstance(layout, list):
+            layout = layout[int(key)]
+        else:
+            layout = layout[key]
+    return layout
+
+
+def _leaves(layout, prefix):
+    """
+    Yield (name, bits) for every bit or array of bits in `layout`.
+    """
+    if isinstance(layout, int) or \
+            (isinstance(layout, list) and
+             all(isinstance(elem, int) for elem in layout)):
+        yield prefix, _flatten(layout)
+    elif isinstance(layout, dict):
+        for key, elem in layout.items():
+            yield from _leaves(elem, f"{prefix}.{key}")
+    else:
+        for k, elem in enumerate(layout):
+            yield from _leaves(elem, f"{prefix}.{k}")
+
+
+class _Primitive:
+    def __init__(self, name, ref, genargs, modargs, ports, out_bits):
+        self.name = name
+        self.ref = ref
+        self.genargs = genargs
+        self.modargs = modargs
+        # input port name -> list of bit ids
+        self.ports = ports
+        self.out_bits = out_bits
+        self.width = len(out_bits)
+        self.is_reg = ref.endswith('.reg') or ref.endswith('.reg_arst')
+
+
+class BatchSimulator:
+    """
+    Simulates `batch_size` independent copies of the top module of a CoreIR
+    JSON netlist.  Top-level ports are addressed by name, with "." separating
+    array indices and record fields (e.g. "I", "I.0", "I.x").
+    """
+    def __init__(self, json_file, batch_size=1, top=None):
+        with open(json_file, 'r') as f:
+            self.netlist = json.load(f)
+        if top is None:
+            top = self.netlist['top']
+        self.batch_size = batch_size
+        self.uf = _UnionFind()
+        self.primitives = []
+        self.top_inputs = set()
+        layout = self._instantiate(top, 'top', self.top_inputs)
+        self._build(layout)
+        self.values = [np.zeros(batch_size, dtype=np.uint64)
+                       for _ in self.signals]
+        for k, prim in enumerate(self.registers):
+            self.values[self.reg_signals[k]][:] = self.reg_init[k]
+        self.last_clocks = None
+        self.evaluate()
+
+    def _module(self, ref):
+        namespace, name = ref.split('.', 1)
+        try:
+            return self.netlist['namespaces'][namespace]['modules'][name]
+        except KeyError:
+            raise NotImplementedError(f"Unsupported CoreIR module {ref}")
+
+    def _instantiate(self, ref, path, inputs):
+        module = self._module(ref)
+        if 'instances' not in module and 'connections' not in module:
+            raise NotImplementedError(
+                f"CoreIR module {ref} has no definition")
+        layouts = {'self': _layout(module['type'], self.uf, inputs)}
+        for name, inst in module.get('instances', {}).items():
+            inst_path = f"{path}.{name}"
+            inst_ref = inst.get('genref', inst.get('modref'))
+            genargs = inst.get('genargs', {})
+            modargs = inst.get('modargs', {})
+            type_ = _primitive_type(inst_ref, genargs, modargs)
+            if type_ is None:
+                # user-defined module, the ports of the instance are the
+                # "self" ports of the module's definition
+                layouts[name] = self._instantiate(inst_ref, inst_path, set())
+                continue
+            prim_inputs = set()
+            layout = {port: _layout(t, self.uf, prim_inputs)
+                      for port, t in type_.items()}
+            layouts[name] = layout
+            out_bits = _flatten(layout['out']) if 'out' in layout else []
+            if len(out_bits) > MAX_WIDTH:
+                raise NotImplementedError(
+                    f"{inst_path}: signals wider than {MAX_WIDTH} bits are "
+                    f"not supported")
+            ports = {port: _flatten(elem) for port, elem in layout.items()
+                     if port != 'out'}
+            if inst_ref == 'commonlib.muxn':
+                ports = {'data': [_flatten(elem)
+                                  for elem in layout['in']['data']],
+                         'sel': _flatten(layout['in']['sel'])}
+            self.primitives.append(_Primitive(inst_path, inst_ref, genargs,
+                                              modargs, ports, out_bits))
+        for a, b in module.get('connections', []):
+            bits_a = _flatten(self._resolve(layouts, a))
+            bits_b = _flatten(self._resolve(layouts, b))
+            if len(bits_a) != len(bits_b):
+                raise ValueError(f"Width mismatch connecting {a} and {b}")
+            for x, y in zip(bits_a, bits_b):
+                self.uf.union(x, y)
+        return layouts['self']
+
+    @staticmethod
+    def _resolve(layouts, endpoint):
+        inst, *path = endpoint.split('.')
+        return _select(layouts[inst], path)
+
+    def _build(self, layout):
+        # every primitive output and top-level input is a word-level signal
+        self.signals = []
+        self.drivers = {}
+        self.layout = layout
+
+        def add_signal(bits):
+            for k, bit in enumerate(bits):
+                self.drivers[self.uf.find(bit)] = (len(self.signals), k)
+            self.signals.append(len(bits))
+            return len(self.signals) - 1
+
+        self.inputs = {}
+        self.outputs = {}
+        for name, bits in _leaves(layout, ''):
+            name = name[1:]
+            if bits[0] in self.top_inputs:
+                if len(bits) > MAX_WIDTH:
+                    raise NotImplementedError(
+                        f"Port {name}: signals wider than {MAX_WIDTH} bits "
+                        f"are not supported")
+                self.inputs[name] = add_signal(bits)
+            else:
+                self.outputs[name] = bits
+        prim_signals = [add_signal(prim.out_bits) if prim.out_bits else None
+                        for prim in self.primitives]
+
+        self.output_plans = {name: self._plan(bits)
+                             for name, bits in self.outputs.items()}
+
+        # evaluation order of the combinational primitives
+        producer = {signal: k for k, signal in enumerate(prim_signals)
+                    if signal is not None}
+        self.steps = []
+        self.registers = []
+        self.reg_signals = []
+        self.reg_init = []
+        comb = []
+        for k, prim in enumerate(self.primitives):
+            if prim.ref == 'commonlib.muxn':
+                plans = {'data': [self._plan(bits)
+                                  for bits in prim.ports['data']],
+                         'sel': self._plan(prim.ports['sel'])}
+            else:
+                plans = {port: self._plan(bits)
+                         for port, bits in prim.ports.items()}
+            item = (prim, plans, prim_signals[k])
+            if prim.is_reg:
+                self.registers.append(item)
+                self.reg_signals.append(prim_signals[k])
+                self.reg_init.append(_arg(prim.modargs, 'init', 0))
+            else:
+                comb.append((k, item))
+
+        def deps(plans):
+            result = set()
+            for value in plans.values():
+                for runs, _ in (value if isinstance(value, list)
+                                else [value]):
+                    result.update(producer[run[0]] for run in runs
+                                  if run[0] in producer)
+            return result
+
+        order = []
+        pending = {k: deps(item[1]) for k, item in comb}
+        items = dict(comb)
+        reg_ids = {k for k, prim in enumerate(self.primitives)
+                   if prim.is_reg}
+        for k in pending:
+            pending[k] -= reg_ids
+        done = set()
+        while pending:
+            ready = [k for k, dep in pending.items() if dep <= done]
+            if not ready:
+                names = [self.primitives[k].name for k in pending]
+                raise ValueError(f"Combinational loop through {names}")
+            for k in ready:
+                order.append(items[k])
+                done.add(k)
+                del pending[k]
+        self.steps = order
+
+    def _plan(self, bits):
+        """
+        Returns the runs of (signal, source bit, destination bit, length)
+        that assemble the word made up of `bits`, along with its width.
+        """
+        runs = []
+        for dst, bit in enumerate(bits):
+            src = self.drivers.get(self.uf.find(bit))
+            if src is None:
+                # undriven bits read as 0
+                continue
+            if runs and runs[-1][0] == src[0] and \
+                    runs[-1][1] + runs[-1][3] == src[1] and \
+                    runs[-1][2] + runs[-1][3] == dst:
+                runs[-1][3] += 1
+            else:
+                runs.append([src[0], src[1], dst, 1])
+        return [tuple(run) for run in runs], len(bits)
+
+    def _gather(self, plan):
+        runs, width = plan
+        if len(runs) == 1:
+            signal, src, dst, length = runs[0]
+            if src == 0 and dst == 0 and length == self.signals[signal]:
+                return self.values[signal]
+        result = np.zeros(self.batch_size, dtype=np.uint64)
+        for signal, src, dst, length in runs:
+            word = self.values[signal]
+            if src:
+                word = word >> np.uint64(src)
+            word = word & _mask(length)
+            if dst:
+                word = word << np.uint64(dst)
+            result |= word
+        return result
+
+    def _eval_primitive(self, prim, plans):
+        lib, name = prim.ref.split('.', 1)
+        width = prim.width
+        if name in {'const', 'undriven'}:
+            value = _arg(prim.modargs, 'value', 0) if name == 'const' else 0
+            return np.full(self.batch_size, value, dtype=np.uint64)
+        if prim.ref == 'commonlib.muxn':
+            sel = self._gather(plans['sel'])
+            data = [self._gather(p) for p in plans['data']]
+            sel = np.minimum(sel, np.uint64(len(data) - 1)).astype(np.intp)
+            return np.choose(sel, data)
+        if name == 'mux':
+            sel = self._gather(plans['sel'])
+            return np.where(sel != 0, self._gather(plans['in1']),
+                            self._gather(plans['in0']))
+        if name in {'wire', 'wrap', 'unwrap'}:
+            return self._gather(plans['in'])
+        if name == 'not':
+            return ~self._gather(plans['in'])
+        if name == 'neg':
+            return np.uint64(0) - self._gather(plans['in'])
+        if name in {'andr', 'orr', 'xorr'}:
+            in_width = plans['in'][1]
+            value = self._gather(plans['in'])
+            if name == 'andr':
+                return (value == _mask(in_width)).astype(np.uint64)
+            if name == 'orr':
+                return (value != 0).astype(np.uint64)
+            parity = np.zeros(self.batch_size, dtype=np.uint64)
+            for k in range(in_width):
+                parity ^= (value >> np.uint64(k)) & np.uint64(1)
+            return parity
+        if name == 'slice':
+            lo = _arg(prim.genargs, 'lo')
+            return self._gather(plans['in']) >> np.uint64(lo)
+        if name == 'concat':
+            in0, in1 = self._gather(plans['in0']), self._gather(plans['in1'])
+            return in0 | (in1 << np.uint64(plans['in0'][1]))
+        if name == 'zext':
+            return self._gather(plans['in'])
+        if name == 'sext':
+            in_width = plans['in'][1]
+            return _signed(self._gather(plans['in']),
+                           in_width).astype(np.uint64)
+        in0, in1 = self._gather(plans['in0']), self._gather(plans['in1'])
+        in_width = plans['in0'][1]
+        if name in _COMPARE_OPS:
+            return _COMPARE_OPS[name](in0, in1, in_width).astype(np.uint64)
+        if name in _BINARY_OPS:
+            return _BINARY_OPS[name](in0, in1, width)
+        raise NotImplementedError(f"Unsupported CoreIR primitive {prim.ref}")
+
+    def _eval_comb(self):
+        with np.errstate(all='ignore'):
+            for prim, plans, signal in self.steps:
+                if signal is None:
+                    continue
+                value = self._eval_primitive(prim, plans)
+                self.values[signal] = value & _mask(prim.width)
+
+    def _clocks(self):
+        return [self._gather(plans['clk']) for _, plans, _ in self.registers]
+
+    def evaluate(self):
+        """
+        Propagate the current inputs, clocking registers whose clock rose
+        since the last evaluation.
+        """
+        self._eval_comb()
+        for _ in range(16):
+            clocks = self._clocks()
+            if self.last_clocks is None:
+                self.last_clocks = clocks
+            updates = []
+            for k, (prim, plans, signal) in enumerate(self.registers):
+                posedge = _arg(prim.modargs, 'clk_posedge', True)
+                if posedge:
+                    edge = (self.last_clocks[k] == 0) & (clocks[k] != 0)
+                else:
+                    edge = (self.last_clocks[k] != 0) & (clocks[k] == 0)
+                value = np.where(edge, self._gather(plans['in']),
+                                 self.values[signal])
+                if 'arst' in plans:
+                    arst = self._gather(plans['arst'])
+                    if not _arg(prim.modargs, 'arst_posedge', True):
+                        arst = arst == 0
+                    value = np.where(arst != 0, np.uint64(self.reg_init[k]),
+                                     value)
+                if np.any(value != self.values[signal]):
+                    updates.append((signal, value & _mask(prim.width)))
+            self.last_clocks = clocks
+            if not updates:
+                return
+            # all registers sample their inputs before any of them update
+            for signal, value in updates:
+                self.values[signal] = value
+            self._eval_comb()
+        raise RuntimeError("Clocks did not settle")
+
+    def _bits(self, name):
+        try:
+            layout = _select(self.layout, name.split('.') if name else [])
+        except (KeyError, IndexError, ValueError):
+            raise KeyError(f"{name} is not a top-level port")
+        return _flatten(layout)
+
+    def set_value(self, name, value):
+        """
+        Set the top-level input `name` to `value` (a scalar, or an array with
+        one value per vector of the batch).
+        """
+        value = np.broadcast_to(np.asarray(value, dtype=np.uint64),
+                                (self.batch_size, ))
+        if name in self.inputs:
+            signal = self.inputs[name]
+            self.values[signal] = value & _mask(self.signals[signal])
+            return
+        # a slice of an input, e.g. a single bit of an array
+        for dst, bit in enumerate(self._bits(name)):
+            if bit not in self.top_inputs:
+                raise KeyError(f"{name} is not a top-level input")
+            signal, src = self.drivers[self.uf.find(bit)]
+            bit_value = (value >> np.uint64(dst)) & np.uint64(1)
+            self.values[signal] = \
+                (self.values[signal] & ~np.uint64(1 << src)) | \
+                (bit_value << np.uint64(src))
+
+    def get_value(self, name):
+        """
+        Returns the value of the top-level port `name` for every vector of
+        the batch.
+        """
+        if name in self.inputs:
+            return self.values[self.inputs[name]].copy()
+        if name in self.output_plans:
+            plan = self.output_plans[name]
+        else:
+            plan = self._plan(self._bits(name))
+        return self._gather(plan).copy()
+
+    def advance(self, clock, steps=1):
+        """
+        Toggle the top-level input `clock` `steps` times.
+        """
+        for _ in range(steps):
+            self.set_value(clock, self.get_value(clock) ^ np.uint64(1))
+            self.evaluate()
@@ -0,0 +1,195 @@
+import os
+from pathlib import Path
+import numpy as np
+from hwtypes import BitVector, Bit
+import magma as m
+import fault.actions
+from fault.target import Target
+from fault.value import AnyValue
+from fault.batch_simulator import BatchSimulator
+from .select_path import SelectPath
+from .wrapper import PortWrapper
+
+
+def _is_array_value(value):
+    return isinstance(value, (np.ndarray, list, tuple, range))
+
+
+def _split_mask(value):
+    """
+    Returns `value` with its `AnyValue` (don't care) entries replaced by 0,
+    along with a mask that is True for those entries (or None if there are
+    none).  Masked numpy arrays are masked where their mask is set.
+    """
+    if isinstance(value, np.ma.MaskedArray):
+        return value.filled(0), np.ma.getmaskarray(value)
+    if _is_array_value(value) and not (isinstance(value, np.ndarray) and
+                                       value.dtype != object):
+        mask = np.array([x is AnyValue for x in value], dtype=bool)
+        if mask.any():
+            value = [0 if x is AnyValue else x for x in value]
+            return value, mask
+    return value, None
+
+
+def _to_int(value):
+    if isinstance(value, BitVector):
+        return value.as_uint()
+    return int(value)
+
+
+class BatchSimulatorTarget(Target):
+    """
+    Runs the actions of a test on `batch_size` independent copies of the
+    circuit at once using `BatchSimulator`.
+
+    Pokes and expects accept either a single value (shared by every copy) or
+    an array with one value per copy, e.g. to sweep all of the input
+    combinations of a combinational block in a single run:
+
+        tester.poke(circ.I, np.arange(256))
+        tester.eval()
+        tester.expect(circ.O, np.arange(256) ^ 0xFF)
+
+    Entries of expected arrays that are `AnyValue` (or masked, for numpy
+    masked arrays) are not checked.
+
+    If `batch_size` is None, it is the length of the longest array value used
+    by the actions.
+    """
+    def __init__(self, circuit, clock=None, directory="build/",
+                 circuit_name=None, skip_compile=False, magma_opts=None,
+                 batch_size=None):
+        super().__init__(circuit)
+        self.clock = clock
+        self.batch_size = batch_size
+        self.circuit_name = circuit_name
+        if self.circuit_name is None:
+            self.circuit_name = self.circuit.name
+        self.directory = Path(directory)
+        os.makedirs(directory, exist_ok=True)
+        self.json_file = self.directory / f"{self.circuit_name}.json"
+        if not skip_compile:
+            magma_opts = magma_opts if magma_opts is not None else {}
+            m.compile(str(self.directory / self.circuit_name), self.circuit,
+                      output="coreir", **magma_opts)
+            if not self.json_file.is_file():
+                raise Exception(f"Compiling {self.circuit} failed")
+        self.port_names = {}
+        for name, port in self.circuit.interface.ports.items():
+            self._add_port_names(name, port)
+
+    def _add_port_names(self, name, port):
+        self.port_names[id(port)] = name
+        if isinstance(port, m.Tuple):
+            for key, elem in port.items():
+                self._add_port_names(f"{name}.{key}", elem)
+        elif isinstance(port, m.Array):
+            for i in range(len(port)):
+                self._add_port_names(f"{name}.{i}", port[i])
+
+    def port_name(self, port):
+        if isinstance(port, fault.actions.Peek):
+            port = port.port
+        if isinstance(port, PortWrapper):
+            port = port.select_path
+        if isinstance(port, SelectPath):
+            if len(port) > 2:
+                raise NotImplementedError(
+                    "BatchSimulatorTarget does not support internal ports")
+            port = port[-1]
+        if id(port) not in self.port_names:
+            raise NotImplementedError(
+                f"BatchSimulatorTarget does not support port {port}")
+        return self.port_names[id(port)]
+
+    def make_value(self, value):
+        """
+        Returns `value` as a uint64 array (or scalar) that can be passed to
+        `BatchSimulator.set_value`.
+        """
+        if _is_array_value(value):
+            if isinstance(value, np.ndarray) and \
+                    np.issubdtype(value.dtype, np.integer):
+                return value.astype(np.int64).astype(np.uint64)
+            return np.array([_to_int(x) & ((1 << 64) - 1) for x in value],
+                            dtype=np.uint64)
+        return np.uint64(_to_int(value) & ((1 << 64) - 1))
+
+    def infer_batch_size(self, actions):
+        batch_size = 1
+        for action in actions:
+            if isinstance(action, (fault.actions.Poke, fault.actions.Expect)) \
+                    and _is_array_value(action.value):
+                batch_size = max(batch_size, len(action.value))
+        return batch_size
+
+    def get_value(self, simulator, port):
+        if isinstance(port, (int, BitVector, Bit)) or \
+                _is_array_value(port):
+            return self.make_value(port)
+        value = simulator.get_value(self.port_name(port))
+        if isinstance(port, m.Digital) or (isinstance(port, m.Array) and
+                                           issubclass(port.T, m.Digital)):
+            return value
+        raise NotImplementedError(
+            f"BatchSimulatorTarget does not support port {port}")
+
+    def check(self, simulator, action):
+        if action.value is AnyValue:
+            return
+        value, mask = _split_mask(action.value)
+        got = self.get_value(simulator, action.port)
+        expected = self.get_value(simulator, value)
+        width = 1 if isinstance(action.port, m.Digital) else \
+            len(action.port)
+        expected = expected & np.uint64((1 << width) - 1)
+        differ = got != expected
+        if mask is not None:
+            differ &= ~mask
+        failed = np.nonzero(differ)[0]
+        if len(failed) == 0:
+            return
+        lane = failed[0]
+        expected = np.broadcast_to(expected, got.shape)
+        error_msg = (f"Port {self.port_name(action.port)}: Got {got[lane]}, "
+                     f"expected {expected[lane]} (vector {lane}, "
+                     f"{len(failed)} of {len(got)} vectors failed)")
+        if isinstance(action.msg, str):
+            error_msg += "\n" + action.msg
+        raise AssertionError(error_msg)
+
+    def run(self, actions):
+        batch_size = self.batch_size
+        if batch_size is None:
+            batch_size = self.infer_batch_size(actions)
+        simulator = BatchSimulator(self.json_file, batch_size)
+        for action in actions:
+            if isinstance(action, fault.actions.Poke):
+                value = self.make_value(action.value)
+                if _is_array_value(value) and len(value) != batch_size:
+                    raise ValueError(f"Expected {batch_size} values for "
+                                     f"{action.port}, got {len(value)}")
+                simulator.set_value(self.port_name(action.port), value)
+            elif isinstance(action, fault.actions.Print):
+                values = [np.broadcast_to(self.get_value(simulator, port),
+                                          (batch_size, ))
+                          for port in action.ports]
+                format_str = action.format_str.replace("\\n", "\n")
+                for lane in range(batch_size):
+                    print(format_str % tuple(int(value[lane])
+                                             for value in values), end="")
+            elif isinstance(action, fault.actions.Expect):
+                self.check(simulator, action)
+            elif isinstance(action, fault.actions.GetValue):
+                value = self.get_value(simulator, action.port)
+                action.value = int(value[0]) if batch_size == 1 else value
+            elif isinstance(action, fault.actions.Eval):
+                simulator.evaluate()
+            elif isinstance(action, fault.actions.Step):
+                if action.until is not None:
+                    raise NotImplementedError(action)
+                simulator.evaluate()
+                simulator.advance(self.port_name(action.clock), action.steps)
+            else:
+                raise NotImplementedError(action)
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from fault.user_cfg import FaultConfig
+
+
+DEFAULT_CACHE_DIR = Path.home() / '.cache' / 'fault'
+
+
+def hash_parts(*parts):
+    '''
+    Returns a hex digest summarizing `parts`.  Each part can be a string, a
+    bytes object, a Path (whose file contents are hashed along with its name),
+    or a list/tuple/dict of parts.  Any other object is hashed via its repr.
+    '''
+    digest = hashlib.sha256()
+
+    def update(part):
+        if isinstance(part, Path):
+            digest.update(f'<file {part.name}>'.encode())
+            if part.is_file():
+                with open(part, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(chunk)
+            else:
+                digest.update(b'<missing>')
+        elif isinstance(part, bytes):
+            digest.update(part)
+        elif isinstance(part, str):
+            digest.update(part.encode())
+        elif isinstance(part, (list, tuple)):
+            digest.update(f'<seq {len(part)}>'.encode())
+            for elem in part:
+                update(elem)
+        elif isinstance(part, dict):
+            digest.update(f'<dict {len(part)}>'.encode())
+            for key in sorted(part, key=str):
+                update(str(key))
+                update(part[key])
+        else:
+            digest.update(repr(part).encode())
+        # separate parts so that ('ab', 'c') and ('a', 'bc') differ
+        digest.update(b'\0')
+
+    for part in parts:
+        update(part)
+    return digest.hexdigest()
+
+
+# attributes of magma circuits that affect the generated code but may not be
+# reflected in their repr
+_CIRCUIT_ATTRS = ('verilogFile', 'verilog_file_name', 'coreir_lib',
+                  'coreir_genargs', 'coreir_configargs')
+
+
+def circuit_parts(circuit):
+    '''
+    Returns a list of parts (for `hash_parts`) describing the magma circuit
+    `circuit` and, recursively, the definitions of its instances.  Verilog
+    files that circuits are defined by are hashed by contents.
+    '''
+    parts = []
+    seen = set()
+
+    def visit(defn):
+        if defn in seen:
+            return
+        seen.add(defn)
+        parts.append(defn.name)
+        parts.append(repr(defn))
+        for attr in _CIRCUIT_ATTRS:
+            value = getattr(defn, attr, None)
+            if isinstance(value, (str, os.PathLike)) and \
+                    os.path.isfile(value):
+                value = Path(value)
+            parts.append((attr, value))
+        for inst in getattr(defn, 'instances', []):
+            visit(type(inst))
+
+    visit(circuit)
+    return parts
+
+
+def _copy_tree(src, dst, ignore=None):
+    # Like shutil.copytree, but merges into an existing `dst`.  copy2
+    # preserves timestamps, which keeps "make" from rebuilding objects that
+    # were restored from the cache.
+    names = os.listdir(src)
+    ignored = ignore(str(src), names) if ignore is not None else set()
+    os.makedirs(dst, exist_ok=True)
+    for name in names:
+        if name in ignored:
+            continue
+        if (src / name).is_dir():
+            _copy_tree(src / name, dst / name, ignore)
+        else:
+            shutil.copy2(src / name, dst / name)
+
+
+class BuildCache:
+    '''
+    Persistent, content-addressed store of build products.  Each entry is a
+    directory named after a key (typically computed with `hash_parts`).
+    Entries are written to a temporary directory first and then renamed into
+    place, so concurrent processes sharing a cache never observe a partially
+    written entry.
+    '''
+
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = FaultConfig().opts.get('build_cache_dir',
+                                               DEFAULT_CACHE_DIR)
+        self.directory = Path(directory).expanduser()
+
+    def entry(self, key):
+        return self.directory / key
+
+    def has(self, key):
+        return self.entry(key).is_dir()
+
+    def fetch(self, key, dst):
+        '''
+        Copy the contents of entry `key` into directory `dst`.  Returns False
+        if there is no such entry.
+        '''
+        src = self.entry(key)
+        if not src.is_dir():
+            return False
+        _copy_tree(src, Path(dst))
+        return True
+
+    def store(self, key, src, names=None, ignore=None):
+        '''
+        Store the contents of directory `src` (or only the files in `names`,
+        if given) as entry `key`, replacing any existing entry.
+        '''
+        src = Path(src)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=f'.{key}.', dir=self.directory))
+        try:
+            if names is None:
+                _copy_tree(src, tmp, ignore=ignore)
+            else:
+                for name in names:
+                    shutil.copy2(src / name, tmp / name)
+            dst = self.entry(key)
+            if dst.is_dir():
+                # directories cannot be atomically replaced, so move the old
+                # entry out of the way first
+                old = Path(tempfile.mkdtemp(prefix=f'.{key}.old.',
+                                            dir=self.directory))
+                os.replace(dst, old / key)
+                shutil.rmtree(old, ignore_errors=True)
+            os.replace(tmp, dst)
+        except OSError:
+            # another process may have won the race to create the entry, in
+            # which case its copy is just as good as ours
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not self.has(key):
+                raise
@@ -0,0 +1,176 @@
+"""
+Compiles simple predicates, given as short lambdas such as
+
+    lambda a: (a < BitVector[16](32768)) & (a != 0)
+
+into C++ expressions, so that generated harnesses can check them at run time.
+Values are unsigned ints of a fixed width (at most 64 bits) with the same
+semantics as the corresponding `BitVector` operators.  Unsupported predicates
+raise NotImplementedError.
+"""
+import ast
+import inspect
+import textwrap
+from fault.utils import get_short_lambda_body_text
+
+
+_BINARY_OPS = {
+    ast.Add: "+",
+    ast.Sub: "-",
+    ast.Mult: "*",
+    ast.BitAnd: "&",
+    ast.BitOr: "|",
+    ast.BitXor: "^",
+}
+
+_COMPARE_OPS = {
+    ast.Lt: "<",
+    ast.LtE: "<=",
+    ast.Gt: ">",
+    ast.GtE: ">=",
+    ast.Eq: "==",
+    ast.NotEq: "!=",
+}
+
+# constructors of unsigned constants, e.g. BitVector[16](32768)
+_CONSTRUCTORS = {"BitVector", "UIntVector", "Bits", "UInt", "int"}
+
+
+def compile_predicate(func, args, width):
+    """
+    Returns a C++ expression for the body of the lambda `func`, where `args`
+    are the C++ expressions (uint64_t values) passed for the arguments of
+    `func` and `width` is the width of the values.
+    """
+    if width > 64:
+        raise NotImplementedError("Predicates on values wider than 64 bits")
+    names = list(inspect.signature(func).parameters)
+    if len(names) != len(args):
+        raise NotImplementedError(f"Expected {len(args)} arguments for {func}")
+    return _Compiler(dict(zip(names, args)), width).compile(
+        _lambda_body(func, names))
+
+
+def _lambda_body(func, names):
+    """
+    Returns the AST of the body of the lambda `func`
+    """
+    try:
+        source = textwrap.dedent(inspect.getsource(func))
+        lambdas = [node for node in ast.walk(ast.parse(source))
+                   if isinstance(node, ast.Lambda) and
+                   [arg.arg for arg in node.args.args] == names]
+    except (IOError, TypeError, SyntaxError):
+        lambdas = []
+    if len(lambdas) == 1:
+        return lambdas[0].body
+    # fall back to the source of the line defining the lambda
+    text = get_short_lambda_body_text(func)
+    if text is None:
+        raise NotImplementedError(f"Could not get the source of {func}")
+    return ast.parse(text, mode="eval").body
+
+
+class _Compiler:
+    def __init__(self, names, width):
+        self.names = names
+        self.width = width
+        self.mask = f"{(1 << width) - 1:#x}ULL"
+
+    def wrap(self, expr):
+        return f"(({expr}) & {self.mask})"
+
+    def constant(self, value):
+        if isinstance(value, bool):
+            return str(int(value))
+        if not isinstance(value, int):
+            raise NotImplementedError(value)
+        return f"{value & ((1 << self.width) - 1):#x}ULL"
+
+    def is_bit(self, node):
+        """
+        Returns True if `node` is a 1-bit value, i.e. its C++ expression is
+        0 or 1
+        """
+        if isinstance(node, (ast.Compare, ast.BoolOp)):
+            return True
+        if isinstance(node, ast.Constant):
+            return isinstance(node.value, bool)
+        if isinstance(node, ast.UnaryOp):
+            return isinstance(node.op, ast.Not) or \
+                (isinstance(node.op, ast.Invert) and self.is_bit(node.operand))
+        if isinstance(node, ast.BinOp):
+            return type(node.op) in (ast.BitAnd, ast.BitOr, ast.BitXor) and \
+                self.is_bit(node.left) and self.is_bit(node.right)
+        if isinstance(node, ast.Call) and len(node.args) == 1:
+            return self.is_bit(node.args[0])
+        return False
+
+    def compile(self, node):
+        if isinstance(node, ast.Name) and node.id in self.names:
+            return self.names[node.id]
+        if isinstance(node, ast.Constant):
+            return self.constant(node.value)
+        if isinstance(node, ast.Call):
+            return self.compile_call(node)
+        if isinstance(node, ast.BoolOp):
+            op = " && " if isinstance(node.op, ast.And) else " || "
+            return "(" + op.join(self.compile(value)
+                                 for value in node.values) + ")"
+        if isinstance(node, ast.UnaryOp):
+            operand = self.compile(node.operand)
+            if isinstance(node.op, ast.Not):
+                return f"(!{operand})"
+            if isinstance(node.op, ast.Invert):
+                # ~ of a 1-bit value (e.g. a comparison) is a logical not
+                if self.is_bit(node.operand):
+                    return f"(!{operand})"
+                return self.wrap(f"~{operand}")
+            if isinstance(node.op, ast.USub):
+                return self.wrap(f"-{operand}")
+        if isinstance(node, ast.BinOp):
+            return self.compile_binop(node)
+        if isinstance(node, ast.Compare):
+            operands = [self.compile(node.left)] + \
+                [self.compile(comparator) for comparator in node.comparators]
+            terms = []
+            for k, op in enumerate(node.ops):
+                if type(op) not in _COMPARE_OPS:
+                    raise NotImplementedError(ast.dump(op))
+                terms.append(f"({operands[k]} {_COMPARE_OPS[type(op)]} "
+                             f"{operands[k + 1]})")
+            return "(" + " && ".join(terms) + ")"
+        raise NotImplementedError(ast.dump(node))
+
+    def compile_call(self, node):
+        func = node.func
+        if isinstance(func, ast.Subscript):
+            func = func.value
+        if isinstance(func, ast.Attribute):
+            name = func.attr
+        elif isinstance(func, ast.Name):
+            name = func.id
+        else:
+            raise NotImplementedError(ast.dump(node))
+        if name not in _CONSTRUCTORS or len(node.args) != 1 or node.keywords:
+            raise NotImplementedError(ast.dump(node))
+        return self.compile(node.args[0])
+
+    def compile_binop(self, node):
+        left = self.compile(node.left)
+        right = self.compile(node.right)
+        op = type(node.op)
+        if op in _BINARY_OPS:
+            return self.wrap(f"{left} {_BINARY_OPS[op]} {right}")
+        # division by zero and shifts by at least the width follow the
+        # BitVector semantics
+        if op in (ast.FloorDiv, ast.Div):
+            return f"({right} ? {left} / {right} : {self.mask})"
+        if op is ast.Mod:
+            return f"({right} ? {left} % {right} : {left})"
+        if op is ast.LShift:
+            return (f"({right} >= {self.width} ? 0ULL : "
+                    f"{self.wrap(f'{left} << {right}')})")
+        if op is ast.RShift:
+            return f"({right} >= {self.width} ? 0ULL : {left} >> {right})"
+        raise NotImplementedError(ast.dump(node))
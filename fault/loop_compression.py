@@ -0,0 +1,177 @@
+"""
+Detect repeated action patterns so that targets can emit table-driven loops
+instead of unrolling every action into straight-line code.
+
+Tests built from Python `for` loops produce long runs of actions that only
+differ in the values being poked or expected, e.g.
+
+    for value in values:
+        tester.poke(circ.I, value)
+        tester.step(2)
+        tester.expect(circ.O, value)
+
+`compress_loops` finds such runs and replaces them with a `TableLoop` whose
+body is the first period of the run with the data values replaced by
+`TableEntry` placeholders.  The data for every iteration is stored in the
+`table` of the loop.
+"""
+import copy
+import magma as m
+from hwtypes import Bit, BitVector
+import fault
+from fault.actions import Eval, Step, Poke, Expect, TableLoop
+from fault.select_path import SelectPath
+from fault.ms_types import RealType
+
+
+class TableEntry:
+    """
+    Placeholder for a value read from column `column` of the current row of
+    a `TableLoop` table.
+    """
+    def __init__(self, column):
+        self.column = column
+
+    def __str__(self):
+        return f"TableEntry({self.column})"
+
+    def __repr__(self):
+        return str(self)
+
+
+def _port_key(port):
+    """
+    Hashable identity of `port`, or None if the port is not supported.
+    """
+    if isinstance(port, fault.WrappedVerilogInternalPort):
+        return None
+    if isinstance(port, SelectPath):
+        if isinstance(port[-1], (fault.WrappedVerilogInternalPort, str)):
+            return None
+        return ('path', port.make_path('.'), id(port[-1]))
+    if isinstance(port, m.Digital) or (isinstance(port, m.Array) and
+                                       issubclass(port.T, m.Digital)):
+        return ('port', id(port))
+    return None
+
+
+def _port_width(port):
+    if isinstance(port, SelectPath):
+        port = port[-1]
+    if isinstance(port, RealType):
+        return None
+    if isinstance(port, m.Digital):
+        return 1
+    return len(port)
+
+
+def _data(port, value):
+    """
+    Return `value` as an unsigned integer that can be stored in a table, or
+    None if it has to be emitted as code.
+    """
+    width = _port_width(port)
+    if width is None or width > 64:
+        return None
+    if isinstance(value, Bit):
+        return int(value)
+    if isinstance(value, BitVector):
+        if value.num_bits > 64:
+            return None
+        return value.as_uint()
+    if isinstance(value, int):
+        if value < 0:
+            return BitVector[width](value).as_uint()
+        if value.bit_length() > 64:
+            return None
+        return int(value)
+    return None
+
+
+def _shape(action):
+    """
+    Return a (key, data) pair for `action`, where `key` identifies the code
+    generated for the action apart from its data, or None if the action can't
+    be part of a table-driven loop.
+    """
+    if isinstance(action, Eval):
+        return ('eval',), ()
+    if isinstance(action, Step):
+        clock = _port_key(action.clock)
+        if clock is None or action.until is not None or not action.trace:
+            return None
+        return ('step', clock, action.steps), ()
+    if isinstance(action, Poke):
+        port = _port_key(action.port)
+        data = _data(action.port, action.value)
+        if port is None or data is None:
+            return None
+        return ('poke', port, action.delay), (data, )
+    if isinstance(action, Expect):
+        if (action.above is not None or action.below is not None or
+                action.msg is not None or action.traceback is not None):
+            return None
+        port = _port_key(action.port)
+        data = _data(action.port, action.value)
+        if port is None or data is None:
+            return None
+        return ('expect', port, action.strict), (data, )
+    return None
+
+
+def _make_template(body):
+    template = []
+    column = 0
+    for action in body:
+        if isinstance(action, (Poke, Expect)):
+            action = copy.copy(action)
+            action.value = TableEntry(column)
+            column += 1
+        template.append(action)
+    return template
+
+
+def compress_loops(actions, min_repeats=4, max_period=32):
+    """
+    Return a list of (index, action) pairs equivalent to
+    `enumerate(actions)`, where runs of at least `min_repeats` repetitions of
+    a pattern of at most `max_period` actions are replaced by a single
+    `TableLoop` (its index is the index of the first action in the run).
+    """
+    shapes = [_shape(action) for action in actions]
+    keys = [shape[0] if shape is not None else None for shape in shapes]
+
+    result = []
+    k = 0
+    n = len(actions)
+    while k < n:
+        best = None
+        if keys[k] is not None:
+            for period in range(1, min(max_period, (n - k) // 2) + 1):
+                # count the number of actions that match the action one
+                # period earlier
+                end = k + period
+                if any(key is None for key in keys[k:end]):
+                    break
+                while end < n and keys[end] == keys[end - period]:
+                    end += 1
+                repeats = (end - k) // period
+                if repeats >= min_repeats and \
+                        (best is None or repeats * period > best[0] * best[1]):
+                    best = (repeats, period)
+        if best is None:
+            result.append((k, actions[k]))
+            k += 1
+            continue
+        repeats, period = best
+        table = []
+        for r in range(repeats):
+            row = []
+            for shape in shapes[k + r * period:k + (r + 1) * period]:
+                row.extend(shape[1])
+            table.append(row)
+        body = _make_template(actions[k:k + period])
+        result.append((k, TableLoop(repeats, period, body, table,
+                                    start=k)))
+        k += repeats * period
+    return result
@@ -107,6 +107,8 @@ class MagmaSimulatorTarget(Target):
             elif isinstance(action, fault.actions.Eval):
                 simulator.evaluate()
             elif isinstance(action, fault.actions.Step):
+                if action.until is not None:
+                    raise NotImplementedError(action)
                 if self.clock is not action.clock:
                     raise RuntimeError(f"Using different clocks: {self.clock}, "
                                        f"{action.clock}")
@@ -1,3 +1,6 @@
+import multiprocessing
+import time
+from collections import namedtuple
 import coreir
 import smt_switch as ss
 from smt_switch.primops import BVAdd, Equal, Ite, Implies
@@ -15,17 +18,62 @@ def get_width(port):
     return len(port)
 
 
+ENGINES = {
+    "kind": pono.KInduction,
+    "bmc": pono.Bmc,
+}
+
+# result of checking a guarantee, `time` is in seconds and `witness` is None
+# if the check passed
+PropertyResult = namedtuple("PropertyResult",
+                            ["index", "passed", "result", "time", "witness"])
+
+# (target, solver, rts, at_end_state_flag, ports) shared with the (forked)
+# worker processes checking guarantees in parallel
+_worker_state = None
+
+
+def _check_guarantee(i):
+    target, solver, rts, at_end_state_flag, ports = _worker_state
+    return target.check_guarantee(i, solver, rts, at_end_state_flag, ports)
+
+
 class PonoTarget(VerilogTarget):
     def __init__(self, circuit, directory="build/", skip_compile=False,
                  include_verilog_libraries=[], magma_output="coreir-verilog",
-                 circuit_name=None, magma_opts={}, solver="btor"):
+                 circuit_name=None, magma_opts={}, solver="btor",
+                 engine="kind", bound=10, processes=None):
+        """
+        engine: "kind" (k-induction) or "bmc" (bounded model checking)
+        bound: bound passed to `check_until` for each guarantee
+        processes: if set, guarantees are checked in parallel by this many
+            worker processes (forked after encoding the transition system),
+            otherwise they are checked one after the other on the same
+            solver
+        """
         super().__init__(circuit, circuit_name, directory, skip_compile,
                          include_verilog_libraries, magma_output, magma_opts)
+        self.reset()
+        self.solver = solver
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine}, expected one of "
+                             f"{list(ENGINES)}")
+        self.engine = engine
+        self.bound = bound
+        self.processes = processes
+        # the CoreIR module is loaded once and shared by every run
+        self.context = None
+        self.top_mod = None
+        # list of `PropertyResult`s of the last run
+        self.property_results = []
+
+    def reset(self):
         self.state_index = 0
         self.curr_state_pokes = []
         self.step_offset = 0
         self.pokes = {}
-        self.solver = solver
+        self.assumptions = []
+        self.guarantees = []
 
     def compile_expression(self, value):
         raise NotImplementedError()
@@ -89,7 +137,7 @@ class PonoTarget(VerilogTarget):
         raise NotImplementedError()
 
     def make_step(self, i, action):
-        if action.steps > 2:
+        if action.steps > 2 or action.until is not None:
             # Only supports 1 cycle per state
             raise NotImplementedError()
         self.step_offset += action.steps
@@ -116,18 +164,58 @@ class PonoTarget(VerilogTarget):
                 sort = solver.make_sort(ss.sortkinds.BV, width)
             rts.constrain_inputs(assumption.value(solver, ports[name], sort))
 
-    def process_guarantees(self, solver, rts, at_end_state_flag, ports):
-        for i, guarantee in enumerate(self.guarantees):
-            prop = pono.Property(
-                rts,
-                solver.make_term(
-                    Implies,
-                    at_end_state_flag,
-                    guarantee.value(solver, ports)
-                )
+    def check_guarantee(self, i, solver, rts, at_end_state_flag, ports):
+        start = time.perf_counter()
+        solver.push()
+        prop = pono.Property(
+            rts,
+            solver.make_term(
+                Implies,
+                at_end_state_flag,
+                self.guarantees[i].value(solver, ports)
             )
-            interp = pono.KInduction(prop, solver)
-            assert interp.check_until(10), interp.witness()
+        )
+        prover = ENGINES[self.engine](prop, solver)
+        # True if the guarantee was proven, False if a counterexample was
+        # found, and None (unknown) otherwise
+        result = prover.check_until(self.bound)
+        counterexample = result is not None and not result
+        if self.engine == "bmc":
+            # bmc reports unknown (not false) when there is no counterexample
+            # within the bound, which is all it can check
+            passed = not counterexample
+        else:
+            passed = bool(result)
+        # there is only a witness for counterexamples
+        witness = str(prover.witness()) if counterexample else None
+        solver.pop()
+        return PropertyResult(i, passed, result, time.perf_counter() - start,
+                              witness)
+
+    def process_guarantees(self, solver, rts, at_end_state_flag, ports):
+        global _worker_state
+        indices = range(len(self.guarantees))
+        if self.processes is not None and len(self.guarantees) > 1:
+            _worker_state = (self, solver, rts, at_end_state_flag, ports)
+            try:
+                context = multiprocessing.get_context("fork")
+                with context.Pool(self.processes) as pool:
+                    results = pool.map(_check_guarantee, indices)
+            finally:
+                _worker_state = None
+        else:
+            results = [self.check_guarantee(i, solver, rts, at_end_state_flag,
+                                            ports)
+                       for i in indices]
+        self.property_results = results
+        failed = [result for result in results if not result.passed]
+        if failed:
+            raise AssertionError("\n".join(
+                f"Guarantee {result.index} failed, witness: {result.witness}"
+                if result.witness is not None else
+                f"Guarantee {result.index} could not be proven within bound "
+                f"{self.bound}"
+                for result in failed))
 
     def generate_code(self, actions, solver, rts, ports):
         for i, action in enumerate(actions):
@@ -194,7 +282,17 @@ class PonoTarget(VerilogTarget):
         at_end_state_flag = solver.make_term(Equal, test_state, n)
         return at_end_state_flag
 
+    def load_module(self):
+        if self.top_mod is None:
+            self.context = coreir.Context()
+            self.context.load_library("commonlib")
+            self.top_mod = self.context.load_from_file(
+                str(self.directory / Path(f"{self.circuit_name}.json")))
+        return self.top_mod
+
     def run(self, actions):
+        self.reset()
+
         # Create solver/interpolator
         solver = ss.create_btor_solver(False)
 
@@ -203,10 +301,7 @@ class PonoTarget(VerilogTarget):
         solver.set_opt('incremental', 'true')
 
         # Load compile result
-        context = coreir.Context()
-        context.load_library("commonlib")
-        top_mod = context.load_from_file(str(self.directory /
-                                             Path(f"{self.circuit_name}.json")))
+        top_mod = self.load_module()
 
         rts = pono.RelationalTransitionSystem(solver)
         pono.CoreIREncoder(top_mod, rts)
@@ -2,6 +2,8 @@
 import typing as tp
 import random
 import itertools as it
+import multiprocessing
+from collections import OrderedDict
 from hwtypes import AbstractBitVector, AbstractBit
 from hwtypes import BitVector, Bit, SIntVector
 from hwtypes import z3BitVector, z3Bit
@@ -77,12 +79,48 @@ def _model_to_frozendict(v_map, model):
     return FrozenDict(d)
 
 
+class _LRUCache:
+    """
+    Keeps the `maxsize` most recently used entries, `on_evict` is called with
+    the values that are dropped
+    """
+    def __init__(self, maxsize, on_evict=None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._d = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._d
+
+    def __len__(self):
+        return len(self._d)
+
+    def __getitem__(self, key):
+        self._d.move_to_end(key)
+        return self._d[key]
+
+    def __setitem__(self, key, value):
+        self._d[key] = value
+        self._d.move_to_end(key)
+        while len(self._d) > self.maxsize:
+            _, evicted = self._d.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(evicted)
+
+    def clear(self):
+        while self._d:
+            _, evicted = self._d.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(evicted)
+
+
 class ConstrainedRandomGenerator:
     def __init__(self,
                  alpha_min: float = 0.1,
                  epoch_length: int = 6,
                  max_epochs: int = 100,
                  call_timeout: int = 10,
+                 cache_size: int = 16,
                  ):
         '''
         alpha_min : Min hit rate before beginning a new epoch,
@@ -90,6 +128,7 @@ class ConstrainedRandomGenerator:
         random outputs but be slower
         max_epochs : maximum number of epochs to run for
         call_timout : per call timeout
+        cache_size : number of solvers kept for the most recent predicates
         for full details see:
         https://people.eecs.berkeley.edu/~ksen/papers/smtsampler.pdf
         '''
@@ -97,10 +136,21 @@ class ConstrainedRandomGenerator:
         self.epoch_length = epoch_length
         self.max_epochs = max_epochs
         self.call_timeout = call_timeout
-
-    def _init_solver(self):
-        self.solver = z3.Optimize()
-        self.solver.set('timeout', self.call_timeout)
+        # (pred, v_map) -> (symbolic variables, solver asserting pred), so
+        # that calls with the same predicate reuse the solver
+        self._cache = _LRUCache(cache_size)
+
+    def _init_solver(self, v_map, pred):
+        key = (pred, tuple(v_map.items()))
+        if key not in self._cache:
+            v_map = {k: z3BitVector[w]() if w is not None else z3Bit()
+                     for k, w in v_map.items()}
+            solver = z3.Optimize()
+            solver.set('timeout', self.call_timeout)
+            solver.add(pred(**v_map).value)
+            self._cache[key] = v_map, solver
+        v_map, self.solver = self._cache[key]
+        return v_map
 
     def __call__(self,
                  v_map: tp.Mapping[str, tp.Optional[int]],
@@ -113,12 +163,10 @@ class ConstrainedRandomGenerator:
             (v : AbstractBitVector[w] for v,w in v_map.items()) -> AbstractBit
         N: Numbers of samples
         '''
-        self._init_solver()
+        v_map = self._init_solver(v_map, pred)
         alpha_min = self.alpha_min
         epoch_length = self.epoch_length
 
-        v_map = {k: z3BitVector[w]() if w is not None else z3Bit()
-                 for k, w in v_map.items()}
         solutions = set()
 
         for _ in range(self.max_epochs):
@@ -179,7 +227,6 @@ class ConstrainedRandomGenerator:
         solver = self.solver
         solver.push()
         solver.set('timeout', self.call_timeout * 4)
-        solver.add(pred(**v_map).value)
         for k, v in v_map.items():
             assignment = seed[k]
             if isinstance(v, AbstractBitVector):
@@ -194,6 +241,7 @@ class ConstrainedRandomGenerator:
             solver.pop()
             return _model_to_frozendict(v_map, model)
         else:
+            solver.pop()
             return None
 
     def _compute_neighbors(self, v_map, pred, init, seen):
@@ -207,7 +255,7 @@ class ConstrainedRandomGenerator:
                 for i in range(v.size):
                     conditions.append(v[i] == init[k][i])
             elif isinstance(v, AbstractBit):
-                conditions.apppend(v == init[k])
+                conditions.append(v == init[k])
             else:
                 raise TypeError()
         S1 = set()
@@ -224,7 +272,6 @@ class ConstrainedRandomGenerator:
         solver = self.solver
         solver.push()
         solver.set('timeout', self.call_timeout)
-        solver.add(pred(**v_map).value)
         solver.add((~c).value)
         solver.push()
         for c_ in conditions:
@@ -287,3 +334,179 @@ class ConstrainedRandomGenerator:
         for k, v in init.items():
             assignment[k] = v ^ ((v ^ sa[k]) | (v ^ sb[k]))
         return FrozenDict(assignment)
+
+
+def _random_assignment(v_map):
+    return {k: random_bv(w) if w is not None else random_bit()
+            for k, w in v_map.items()}
+
+
+def _rejection_batch(args):
+    '''
+    Draws `n` random assignments and returns the ones satisfying `pred` as
+    dicts of ints (run in the worker processes of `ConstrainedRandomSampler`)
+    '''
+    v_map, pred, n, seed = args
+    random.seed(seed)
+    hits = []
+    for _ in range(n):
+        assignment = _random_assignment(v_map)
+        if pred(**assignment):
+            hits.append({k: int(v) for k, v in assignment.items()})
+    return hits
+
+
+class ConstrainedRandomSampler:
+    def __init__(self,
+                 v_map: tp.Mapping[str, tp.Optional[int]],
+                 pred: tp.Callable[..., AbstractBit],
+                 batch_size: int = 256,
+                 min_hit_rate: float = 0.01,
+                 min_trials: int = 1024,
+                 processes: tp.Optional[int] = None,
+                 call_timeout: int = 1000,
+                 ):
+        '''
+        Draws samples of `v_map` (same format as ConstrainedRandomGenerator)
+        satisfying `pred`, `batch_size` at a time.
+
+        Samples are drawn by rejection sampling until at least `min_trials`
+        random assignments were checked with a hit rate below `min_hit_rate`,
+        then the sampler switches to a z3 solver.  The predicate is compiled
+        once and the solver is kept between calls, along with blocking
+        clauses so that the solver returns distinct samples until the
+        solution space is exhausted.
+
+        processes : if set, rejection sampling is split across a pool of
+        worker processes (`pred` has to be picklable)
+        call_timeout : timeout of each solver call in milliseconds
+        '''
+        self.v_map = dict(v_map)
+        self.pred = pred
+        self.batch_size = batch_size
+        self.min_hit_rate = min_hit_rate
+        self.min_trials = min_trials
+        self.processes = processes
+        self.call_timeout = call_timeout
+        self.trials = 0
+        self.hits = 0
+        self.use_smt = False
+        self.solver = None
+        self.pool = None
+        self.samples = []
+
+    @property
+    def hit_rate(self):
+        if self.trials == 0:
+            return 1.0
+        return self.hits / self.trials
+
+    def _convert(self, assignment):
+        d = {}
+        for k, v in assignment.items():
+            w = self.v_map[k]
+            d[k] = Bit(v) if w is None else BitVector[w](v)
+        return FrozenDict(d)
+
+    def _rejection(self, n):
+        if self.processes is None:
+            hits = _rejection_batch((self.v_map, self.pred, n,
+                                     random.getrandbits(32)))
+        else:
+            if self.pool is None:
+                self.pool = multiprocessing.Pool(self.processes)
+            size = -(-n // self.processes)
+            args = [(self.v_map, self.pred, size, random.getrandbits(32))
+                    for _ in range(self.processes)]
+            hits = [hit for batch in self.pool.map(_rejection_batch, args)
+                    for hit in batch]
+            n = size * self.processes
+        self.trials += n
+        self.hits += len(hits)
+        if self.trials >= self.min_trials and \
+                self.hit_rate < self.min_hit_rate:
+            self.use_smt = True
+        return [self._convert(hit) for hit in hits]
+
+    def _init_solver(self):
+        self.vars = {k: z3BitVector[w]() if w is not None else z3Bit()
+                     for k, w in self.v_map.items()}
+        self.solver = z3.Solver()
+        self.solver.set('timeout', self.call_timeout)
+        # randomize the solutions found by the solver
+        self.solver.set('phase_selection', 5)
+        self.solver.add(self.pred(**self.vars).value)
+
+    def _smt(self, n):
+        if self.solver is None:
+            self._init_solver()
+        samples = []
+        while len(samples) < n:
+            self.solver.set('random_seed', random.getrandbits(31))
+            result = self.solver.check()
+            if result == z3.unsat and samples:
+                break
+            elif result == z3.unsat:
+                if len(self.solver.assertions()) > 1:
+                    # every solution was returned, start over
+                    self._init_solver()
+                    continue
+                raise ValueError("Constraint is unsatisfiable")
+            elif result == z3.unknown:
+                raise TimeoutError("Could not find a sample satisfying the "
+                                   "constraint")
+            sample = _model_to_frozendict(self.vars, self.solver.model())
+            samples.append(sample)
+            # block the sample
+            self.solver.add(z3.Or([(self.vars[k] != v).value
+                                   for k, v in sample.items()]))
+        return samples
+
+    def sample(self, n: int) -> tp.List[tp.Mapping[str, BitVector]]:
+        '''
+        Returns `n` samples
+        '''
+        while len(self.samples) < n:
+            if self.use_smt:
+                self.samples += self._smt(self.batch_size)
+            else:
+                self.samples += self._rejection(self.batch_size)
+        samples, self.samples = self.samples[:n], self.samples[n:]
+        return samples
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.sample(1)[0]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+
+# the most recently used samplers, evicted samplers are closed so that their
+# worker processes exit
+MAX_SAMPLERS = 32
+_samplers = _LRUCache(MAX_SAMPLERS, on_evict=ConstrainedRandomSampler.close)
+
+
+def constrained_random_sampler(v_map, pred, **kwargs):
+    '''
+    Returns the `ConstrainedRandomSampler` for `v_map` and `pred`, samplers
+    are cached so that later calls keep the state (hit rate, solver and
+    blocking clauses) of earlier ones.  Only the `MAX_SAMPLERS` most recently
+    used samplers are kept.
+    '''
+    key = (pred, tuple(v_map.items()), tuple(sorted(kwargs.items())))
+    if key not in _samplers:
+        _samplers[key] = ConstrainedRandomSampler(v_map, pred, **kwargs)
+    return _samplers[key]
+
+
+def close_samplers():
+    '''
+    Close and drop all of the cached samplers
+    '''
+    _samplers.clear()
@@ -1,3 +1,6 @@
+import os
+import re
+from collections.abc import Mapping
 try:
     import numpy as np
     from scipy.interpolate import interp1d
@@ -7,13 +10,121 @@ except ModuleNotFoundError:
 
 
 class SpiceResult:
-    def __init__(self, t, v):
+    """
+    Interpolates the waveform (t, v) at arbitrary times, holding the first and
+    last values outside of the simulated time range.
+
+    mode: 'scipy' uses scipy's interp1d (linear interpolation), 'numpy' uses
+          np.interp (also linear, but with much lower setup cost), and 'step'
+          returns the most recent sample at or before each time, which is
+          appropriate for digital signals.
+    """
+    def __init__(self, t, v, mode='scipy'):
         self.t = t
         self.v = v
-        self.func = interp1d(t, v, bounds_error=False, fill_value=(v[0], v[-1]))
+        self.mode = mode
+        if mode == 'scipy':
+            self.func = interp1d(t, v, bounds_error=False,
+                                 fill_value=(v[0], v[-1]))
+        elif mode in {'numpy', 'step'}:
+            self.func = None
+        else:
+            raise ValueError(f'Unknown interpolation mode: {mode}')
 
     def __call__(self, t):
-        return self.func(t)
+        if self.mode == 'scipy':
+            return self.func(t)
+        elif self.mode == 'numpy':
+            return np.interp(t, self.t, self.v)
+        else:
+            idx = np.searchsorted(self.t, t, side='right') - 1
+            return np.asarray(self.v)[np.clip(idx, 0, len(self.v) - 1)]
+
+
+class SpiceResults(Mapping):
+    """
+    Read-only mapping from signal names to SpiceResults.  The waveform of each
+    signal is only read in, and its interpolator built, when the signal is
+    first accessed.
+    """
+    def __init__(self, data, time_vec, raw_names, mode='scipy'):
+        self._data = data
+        self._time_vec = time_vec
+        self._raw_names = raw_names
+        self._mode = mode
+        self._results = {}
+
+    def __getitem__(self, name):
+        if name not in self._results:
+            value_vec = self._data.get(self._raw_names[name])
+            self._results[name] = SpiceResult(t=self._time_vec, v=value_vec,
+                                              mode=self._mode)
+        return self._results[name]
+
+    def __iter__(self):
+        return iter(self._raw_names)
+
+    def __len__(self):
+        return len(self._raw_names)
+
+
+class NutmegData:
+    """
+    Reader for ngspice binary rawfiles.  The file is memory-mapped and each
+    signal is exposed as a view of the mapped data, so signals are only
+    read from disk when they are actually used.
+    """
+    def __init__(self):
+        self._names = {}
+        self._data = None
+
+    def names(self):
+        return list(self._names.keys())
+
+    def get(self, name):
+        return self._data[:, self._names[name]]
+
+    def read(self, file):
+        # parse the ASCII header, which ends with a "Binary:" line
+        header = {}
+        var_lines = []
+        offset = None
+        with open(file, 'rb') as f:
+            for line in f:
+                line = line.decode('ascii', errors='replace')
+                if line.startswith('Binary:'):
+                    offset = f.tell()
+                    break
+                elif line.startswith('Values:'):
+                    raise ValueError(f'{file} is not a binary rawfile.')
+                elif line[:1].isspace() and 'Variables' in header:
+                    var_lines.append(line.split())
+                elif ':' in line:
+                    key, value = line.split(':', 1)
+                    header[key.strip()] = value.strip()
+        if offset is None:
+            raise ValueError(f'Could not find data in {file}.')
+
+        # determine the shape of the data
+        num_vars = int(header['No. Variables'])
+        num_points = int(header['No. Points'])
+        if 'complex' in header.get('Flags', '').lower():
+            dtype = np.dtype('<c16')
+        else:
+            dtype = np.dtype('<f8')
+        # the point count in the header may be too large if the simulation
+        # was interrupted
+        file_size = os.path.getsize(file)
+        row_size = num_vars * dtype.itemsize
+        num_points = min(num_points, (file_size - offset) // row_size)
+
+        # read in the variable names
+        for line in var_lines[:num_vars]:
+            self._names[line[1]] = int(line[0])
+
+        # map the data into memory
+        self._data = np.memmap(file, dtype=dtype, mode='r', offset=offset,
+                               shape=(num_points, num_vars))
 
 
 # temporary measure -- CSDF parsing is broken in
@@ -31,88 +142,90 @@ class CSDFData:
         return self._data[:, self._names[name]]
 
     def read(self, file):
-        # read in flat data vector
-        mode = None
-        data = []
         with open(file, 'r') as f:
-            for line in f:
-                # determine mode
-                line = line.strip().split()
-                if not line:
-                    continue
-                elif line[0] == '#N':
-                    mode = '#N'
-                    line.pop(0)
-                elif line[0] == '#C':
-                    mode = '#C'
-                    line.pop(0)
-                    data.append(float(line.pop(0)))
-                    line.pop(0)
-                elif line[0] == '#;':
-                    break
-                # parse depending on mode
-                if mode == '#N':
-                    for tok in line:
-                        tok = tok[1:-1]
-                        self._names[tok] = len(self._names)
-                elif mode == '#C':
-                    for tok in line:
-                        data.append(float(tok))
+            text = f.read()
+
+        # split the file into the header (containing the signal names) and
+        # the data, which ends with "#;"
+        start = text.find('#C')
+        if start == -1:
+            header, body = text, ''
+        else:
+            header, body = text[:start], text[start:]
+        body = body.split('#;', 1)[0]
+
+        # read in names
+        names_start = header.find('#N')
+        if names_start != -1:
+            for tok in header[names_start + 2:].split():
+                tok = tok[1:-1]
+                self._names[tok] = len(self._names)
+
+        # each data block starts with "#C <time> <count>", keep the time
+        # but not the count, then convert all values at once
+        body = _CSDF_BLOCK.sub(r' \1 ', body)
+        data = np.array(body.split(), dtype=float)
 
         # reshape into numpy array
         nv = len(self._names)
         ns = len(data) // nv
-        data = np.array(data, dtype=float)
-        data = np.reshape(data, (ns, nv))
+        data = np.reshape(data[:ns * nv], (ns, nv))
 
         # store using internal numpy array
         self._data = data
 
 
-def nut_parse(nut_file, time='time'):
-    data = decida.Data.Data()
-    data.read_nutmeg(f'{nut_file}')
-    return data_to_interp(data=data, time=time)
+_CSDF_BLOCK = re.compile(r'#C\s+(\S+)\s+\S+')
+
+
+def nut_parse(nut_file, time='time', signals=None, interp_mode='scipy'):
+    try:
+        data = NutmegData()
+        data.read(f'{nut_file}')
+    except ValueError:
+        # ASCII rawfiles are handled by DeCiDa
+        data = decida.Data.Data()
+        data.read_nutmeg(f'{nut_file}')
+    return data_to_interp(data=data, time=time, signals=signals,
+                          interp_mode=interp_mode)
 
 
-def psf_parse(psf_file, time='time'):
+def psf_parse(psf_file, time='time', signals=None, interp_mode='scipy'):
     data = decida.Data.Data()
     data.read_psf(f'{psf_file}')
-    return data_to_interp(data=data, time=time)
+    return data_to_interp(data=data, time=time, signals=signals,
+                          interp_mode=interp_mode)
 
 
-def hspice_parse(tr0_file, time='time'):
+def hspice_parse(tr0_file, time='time', signals=None, interp_mode='scipy'):
     data = CSDFData()
     data.read(f'{tr0_file}')
-    return data_to_interp(data=data, time=time)
+    return data_to_interp(data=data, time=time, signals=signals,
+                          interp_mode=interp_mode)
 
 
-def data_to_interp(data, time, strip_vi=True):
-    retval = {}
+def data_to_interp(data, time, strip_vi=True, signals=None,
+                   interp_mode='scipy'):
+    # returns a mapping from signal names to interpolators, which are only
+    # created when first accessed.  if "signals" is not None, the mapping
+    # only contains the signals listed in it.
 
-    # preprocess results as needed
-    rdict = {}
-    for name in data.names():
-        value = data.get(name)
+    # map the (optionally stripped) names to the names used in the data
+    raw_names = {}
+    for raw_name in data.names():
+        name = raw_name
         if strip_vi:
             if name.lower().startswith('v(') and name.lower().endswith(')'):
                 name = name[2:-1]
             elif name.lower().startswith('i(') and name.lower().endswith(')'):
                 name = name[2:-1]
-        rdict[name] = value
-
-    # prepare dictionary of interpolators
-    time_vec = rdict[time]
-    for name, value_vec in rdict.items():
-        # skip time variable -- no need to interpolate time to itself
-        if name == time:
-            continue
-
-        # create interpolator
-        result = SpiceResult(t=time_vec, v=value_vec)
+        raw_names[name] = raw_name
+    time_vec = data.get(raw_names.pop(time))
 
-        # add interpolator to dictionary
-        retval[name] = result
+    # skip any signals that were not requested
+    if signals is not None:
+        raw_names = {name: raw_name for name, raw_name in raw_names.items()
+                     if name in signals}
 
-    # return results
-    return retval
+    return SpiceResults(data=data, time_vec=time_vec, raw_names=raw_names,
+                        mode=interp_mode)
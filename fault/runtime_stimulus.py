@@ -0,0 +1,806 @@
+"""
+Runtime stimulus support for the Verilator target.
+
+Instead of baking every action into the generated C++ driver, the actions are
+lowered into a compact binary stream that a generic, circuit-specific driver
+interprets at runtime.  The driver only depends on the circuit's port list, so
+it is compiled once and can then replay any number of action sequences.
+The same port table is used for the shared library that lets
+fault.VerilatorTester drive the model in-process.
+
+Stream format (all integers are little-endian):
+
+    header  : b"FLTS", u32 version, u32 number of ports
+    ref     : u32 port id, u8 shift, u64 mask
+    string  : u32 length, bytes
+    chunks  : u32 count, count * (string fmt, u8 has_arg, [ref])
+    POKE    : ref, u64 value
+    EXPECT  : ref, u8 kind, (u64 value if kind == 0 else ref), u32 action
+              index, string port name, chunks message
+    EVAL    : (no payload)
+    STEP    : ref, u32 steps
+    PRINT   : chunks
+    GETVALUE: ref, string fmt
+    END     : (no payload)
+    SAVE_STATE, RESTORE_STATE: string file name (only supported by drivers
+              for models built with --savable)
+    TRACE_CONTROL: u8 enable
+"""
+import re
+import struct
+import magma as m
+from hwtypes import BitVector, Bit
+import fault
+import fault.actions as actions
+import fault.value_utils as value_utils
+from fault.ms_types import RealType
+from fault.select_path import SelectPath
+from fault.verilog_utils import verilator_name
+from fault.verilator_utils import VerilatorTrace
+from fault.wrapper import PortWrapper
+
+
+MAGIC = b"FLTS"
+VERSION = 3
+
+OPCODES = {
+    "POKE": 1,
+    "EXPECT": 2,
+    "EVAL": 3,
+    "STEP": 4,
+    "PRINT": 5,
+    "GETVALUE": 6,
+    "END": 7,
+    "SAVE_STATE": 8,
+    "RESTORE_STATE": 9,
+    "TRACE_CONTROL": 10,
+}
+
+# widest port that fits in the uint64_t used by the driver
+MAX_PORT_WIDTH = 64
+
+_FORMAT_SPEC = re.compile(
+    r"%(%|[-+ #0]*\d*(?:\.\d+)?(?:hh|h|ll|l|j|z|t)?([a-zA-Z]))")
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "\\": "\\", '"': '"', "'": "'"}
+
+
+def _unescape(format_str):
+    # Print stores C-escaped format strings since they are normally pasted
+    # into the generated source.  Here they are passed as data instead.
+    return re.sub(r"\\(.)", lambda match: _ESCAPES.get(match.group(1),
+                                                       match.group(0)),
+                  format_str)
+
+
+driver_tpl = """\
+{includes}
+
+// Generic driver for V{circuit_name}.  The actions to run are read at runtime
+// from the stimulus file given as the first argument, see
+// fault/runtime_stimulus.py for the format.
+vluint64_t main_time = 0;       // Current simulation time
+
+double sc_time_stamp () {{       // Called by $time in Verilog
+    return main_time;
+}}
+
+#if VM_COVERAGE
+void write_coverage() {{
+     VerilatedCov::write("logs/coverage.dat");
+}}
+#endif
+
+{trace_declarations}
+
+enum Opcode {{
+{opcodes}
+}};
+
+struct Port {{
+    const char *name;
+    void *ptr;
+    size_t size;
+}};
+
+struct Ref {{
+    uint32_t port;
+    uint8_t shift;
+    uint64_t mask;
+}};
+
+struct Chunk {{
+    std::string fmt;
+    bool has_arg;
+    Ref arg;
+}};
+
+static const uint32_t num_ports = {num_ports};
+static Port *ports;
+static std::vector<unsigned char> stimulus;
+static size_t pos = 0;
+
+static void check_available(size_t n) {{
+    if (pos + n > stimulus.size()) {{
+        std::cerr << "Truncated stimulus file" << std::endl;
+        exit(2);
+    }}
+}}
+
+template <typename T>
+static T read_scalar() {{
+    T value;
+    check_available(sizeof(T));
+    memcpy(&value, &stimulus[pos], sizeof(T));
+    pos += sizeof(T);
+    return value;
+}}
+
+static std::string read_string() {{
+    uint32_t len = read_scalar<uint32_t>();
+    check_available(len);
+    std::string value((const char *) &stimulus[pos], len);
+    pos += len;
+    return value;
+}}
+
+static Ref read_ref() {{
+    Ref ref;
+    ref.port = read_scalar<uint32_t>();
+    ref.shift = read_scalar<uint8_t>();
+    ref.mask = read_scalar<uint64_t>();
+    if (ref.port >= num_ports) {{
+        std::cerr << "Invalid port id " << ref.port << std::endl;
+        exit(2);
+    }}
+    return ref;
+}}
+
+static std::vector<Chunk> read_chunks() {{
+    std::vector<Chunk> chunks(read_scalar<uint32_t>());
+    for (Chunk &chunk : chunks) {{
+        chunk.fmt = read_string();
+        chunk.has_arg = read_scalar<uint8_t>();
+        if (chunk.has_arg) {{
+            chunk.arg = read_ref();
+        }}
+    }}
+    return chunks;
+}}
+
+static uint64_t get_port(const Port &port) {{
+    switch (port.size) {{
+        case 1: return *(uint8_t *) port.ptr;
+        case 2: return *(uint16_t *) port.ptr;
+        case 4: return *(uint32_t *) port.ptr;
+        default: return *(uint64_t *) port.ptr;
+    }}
+}}
+
+static void set_port(const Port &port, uint64_t value) {{
+    switch (port.size) {{
+        case 1: *(uint8_t *) port.ptr = value; break;
+        case 2: *(uint16_t *) port.ptr = value; break;
+        case 4: *(uint32_t *) port.ptr = value; break;
+        default: *(uint64_t *) port.ptr = value; break;
+    }}
+}}
+
+static uint64_t get_ref(const Ref &ref) {{
+    return (get_port(ports[ref.port]) >> ref.shift) & ref.mask;
+}}
+
+static void set_ref(const Ref &ref, uint64_t value) {{
+    const Port &port = ports[ref.port];
+    uint64_t mask = ref.mask << ref.shift;
+    set_port(port, (get_port(port) & ~mask) | ((value << ref.shift) & mask));
+}}
+
+static void print_chunks(FILE *file, const std::vector<Chunk> &chunks) {{
+    for (const Chunk &chunk : chunks) {{
+        if (chunk.has_arg) {{
+            fprintf(file, chunk.fmt.c_str(),
+                    (unsigned long long) get_ref(chunk.arg));
+        }} else {{
+            fputs(chunk.fmt.c_str(), file);
+        }}
+    }}
+}}
+
+int main(int argc, char **argv) {{
+  Verilated::commandArgs(argc, argv);
+  if (argc < 2) {{
+    std::cerr << "Usage: " << argv[0] << " <stimulus file> [<value file>]"
+              << std::endl;
+    return 2;
+  }}
+  FILE *stimulus_file = fopen(argv[1], "rb");
+  if (stimulus_file == NULL) {{
+    std::cerr << "Could not open file " << argv[1] << std::endl;
+    return 2;
+  }}
+  unsigned char buf[65536];
+  size_t n;
+  while ((n = fread(buf, 1, sizeof(buf), stimulus_file)) > 0) {{
+    stimulus.insert(stimulus.end(), buf, buf + n);
+  }}
+  fclose(stimulus_file);
+  check_available(12);
+  if (memcmp(&stimulus[0], "{magic}", 4) != 0) {{
+    std::cerr << "Invalid stimulus file " << argv[1] << std::endl;
+    return 2;
+  }}
+  pos = 4;
+  if (read_scalar<uint32_t>() != {version} ||
+      read_scalar<uint32_t>() != num_ports) {{
+    std::cerr << "Stimulus file " << argv[1]
+              << " does not match this driver" << std::endl;
+    return 2;
+  }}
+
+  V{circuit_name}* top = new V{circuit_name};
+  Port port_table[] = {{
+{port_table}
+    {{NULL, NULL, 0}}
+  }};
+  ports = port_table;
+  FILE *value_file = NULL;
+
+{trace_open}
+
+  bool done = false;
+  while (!done) {{
+    switch (read_scalar<uint8_t>()) {{
+      case POKE: {{
+        Ref ref = read_ref();
+        set_ref(ref, read_scalar<uint64_t>());
+        break;
+      }}
+      case EXPECT: {{
+        Ref ref = read_ref();
+        uint64_t expected;
+        if (read_scalar<uint8_t>()) {{
+          expected = get_ref(read_ref());
+        }} else {{
+          expected = read_scalar<uint64_t>();
+        }}
+        uint32_t i = read_scalar<uint32_t>();
+        std::string name = read_string();
+        std::vector<Chunk> msg = read_chunks();
+        uint64_t got = get_ref(ref);
+        if (got != expected) {{
+          std::cerr << std::endl;  // end the current line
+          std::cerr << "Got      : 0x" << std::hex << got << std::endl;
+          std::cerr << "Expected : 0x" << std::hex << expected << std::endl;
+          std::cerr << "i        : " << std::dec << i << std::endl;
+          std::cerr << "Port     : " << name << std::endl;
+          print_chunks(stdout, msg);
+#if VM_TRACE
+          // Dump one more timestep so we see the current values
+          tracer->dump(main_time);
+          tracer->close();
+#endif
+          exit(1);
+        }}
+        break;
+      }}
+      case EVAL: {{
+        top->eval();
+#if VM_TRACE
+        fault_trace_dump();
+        main_time++;
+#endif
+        break;
+      }}
+      case STEP: {{
+        const Port &clock = ports[read_ref().port];
+        uint32_t steps = read_scalar<uint32_t>();
+        top->eval();
+        for (uint32_t step = 0; step < steps; step++) {{
+#if VM_TRACE
+          fault_trace_dump();
+#endif
+          set_port(clock, get_port(clock) ^ 1);
+          top->eval();
+          main_time += 5;
+        }}
+        break;
+      }}
+      case PRINT: {{
+        print_chunks(stdout, read_chunks());
+        break;
+      }}
+      case GETVALUE: {{
+        Ref ref = read_ref();
+        std::string fmt = read_string();
+        if (value_file == NULL) {{
+          if (argc < 3) {{
+            std::cerr << "No value file given" << std::endl;
+            return 2;
+          }}
+          value_file = fopen(argv[2], "w");
+          if (value_file == NULL) {{
+            std::cerr << "Could not open file " << argv[2] << std::endl;
+            return 2;
+          }}
+        }}
+        fprintf(value_file, fmt.c_str(), (unsigned long long) get_ref(ref));
+        break;
+      }}
+      case END: {{
+        done = true;
+        break;
+      }}
+      case TRACE_CONTROL: {{
+        uint8_t enable = read_scalar<uint8_t>();
+#if VM_TRACE
+        fault_trace_enabled = enable != 0;
+#else
+        (void) enable;
+#endif
+        break;
+      }}
+{state_cases}
+      default: {{
+        std::cerr << "Invalid opcode in stimulus file" << std::endl;
+        return 2;
+      }}
+    }}
+  }}
+  if (value_file != NULL) {{
+    fclose(value_file);
+  }}
+
+#if VM_TRACE
+  tracer->dump(main_time);
+  tracer->close();
+#endif
+
+#if VM_COVERAGE
+    write_coverage();
+#endif
+  top->final();
+
+}}
+"""  # nopep8
+
+
+library_tpl = """\
+{includes}
+
+// In-process interface to V{circuit_name}, loaded with ctypes by
+// fault.VerilatorTester.  Ports are addressed by their index in the port
+// table, see fault/runtime_stimulus.py.
+vluint64_t main_time = 0;       // Current simulation time
+
+double sc_time_stamp () {{       // Called by $time in Verilog
+    return main_time;
+}}
+
+struct Port {{
+    const char *name;
+    void *ptr;
+    size_t size;
+}};
+
+struct Model {{
+    V{circuit_name} *top;
+    std::vector<Port> ports;
+#if VM_TRACE
+    {tracer_class} *tracer;
+#endif
+}};
+
+static uint64_t get_port(const Port &port) {{
+    switch (port.size) {{
+        case 1: return *(uint8_t *) port.ptr;
+        case 2: return *(uint16_t *) port.ptr;
+        case 4: return *(uint32_t *) port.ptr;
+        default: return *(uint64_t *) port.ptr;
+    }}
+}}
+
+static void set_port(const Port &port, uint64_t value) {{
+    switch (port.size) {{
+        case 1: *(uint8_t *) port.ptr = value; break;
+        case 2: *(uint16_t *) port.ptr = value; break;
+        case 4: *(uint32_t *) port.ptr = value; break;
+        default: *(uint64_t *) port.ptr = value; break;
+    }}
+}}
+
+static void dump(Model *model) {{
+#if VM_TRACE
+    if (model->tracer != NULL) {{
+        model->tracer->dump(main_time);
+    }}
+#endif
+}}
+
+extern "C" {{
+
+uint32_t fault_num_ports() {{
+    return {num_ports};
+}}
+
+void *fault_open(const char *trace_file) {{
+    Model *model = new Model;
+    V{circuit_name} *top = new V{circuit_name};
+    model->top = top;
+    model->ports = std::vector<Port>{{
+{port_table}
+    }};
+#if VM_TRACE
+    model->tracer = NULL;
+    if (trace_file != NULL) {{
+        Verilated::traceEverOn(true);
+        model->tracer = new {tracer_class};
+        top->trace(model->tracer, {trace_levels});
+        model->tracer->open(trace_file);
+    }}
+#endif
+    return model;
+}}
+
+void fault_close(void *handle) {{
+    Model *model = (Model *) handle;
+#if VM_TRACE
+    if (model->tracer != NULL) {{
+        model->tracer->dump(main_time);
+        model->tracer->close();
+        delete model->tracer;
+    }}
+#endif
+    model->top->final();
+    delete model->top;
+    delete model;
+}}
+
+void fault_eval(void *handle) {{
+    Model *model = (Model *) handle;
+    model->top->eval();
+#if VM_TRACE
+    dump(model);
+    main_time++;
+#endif
+}}
+
+void fault_step(void *handle, uint32_t clock, uint32_t steps) {{
+    Model *model = (Model *) handle;
+    const Port &port = model->ports[clock];
+    model->top->eval();
+    for (uint32_t step = 0; step < steps; step++) {{
+        dump(model);
+        set_port(port, get_port(port) ^ 1);
+        model->top->eval();
+        main_time += 5;
+    }}
+}}
+
+uint64_t fault_get(void *handle, uint32_t index, uint8_t shift,
+                   uint64_t mask) {{
+    Model *model = (Model *) handle;
+    return (get_port(model->ports[index]) >> shift) & mask;
+}}
+
+void fault_set(void *handle, uint32_t index, uint8_t shift, uint64_t mask,
+               uint64_t value) {{
+    Model *model = (Model *) handle;
+    const Port &port = model->ports[index];
+    mask <<= shift;
+    set_port(port, (get_port(port) & ~mask) | ((value << shift) & mask));
+}}
+
+}}
+"""  # nopep8
+
+
+# cases of the driver for models built with --savable, which checkpoint the
+# model along with the simulation time
+state_cases = """\
+      case SAVE_STATE: {
+        VerilatedSave os;
+        os.open(read_string().c_str());
+        os << main_time;
+        os << *top;
+        break;
+      }
+      case RESTORE_STATE: {
+        VerilatedRestore os;
+        os.open(read_string().c_str());
+        os >> main_time;
+        os >> *top;
+        break;
+      }"""
+
+
+class StimulusPort:
+    def __init__(self, index, name, width):
+        self.index = index
+        self.name = name
+        self.width = width
+
+    def __repr__(self):
+        return f"StimulusPort({self.index}, {self.name}, {self.width})"
+
+
+class RuntimeStimulus:
+    """
+    Port table for `circuit` along with the logic for encoding actions into a
+    stimulus stream that can be interpreted by the generic driver.  With
+    `savable`, the driver can save and restore the state of the model (see
+    `SaveState` and `RestoreState`).
+    """
+    def __init__(self, circuit, savable=False):
+        self.circuit = circuit
+        self.savable = savable
+        self.ports = []
+        self.port_map = {}
+        for port in circuit.interface.ports.values():
+            self._add_ports(port)
+
+    def _add_ports(self, port):
+        if isinstance(port, m.Tuple) or (isinstance(port, m.Array) and
+                                         not issubclass(port.T, m.Digital)):
+            for elem in port:
+                self._add_ports(elem)
+        elif isinstance(port, RealType):
+            # real-valued ports are not supported by the generic driver
+            pass
+        else:
+            width = 1 if isinstance(port, m.Digital) else len(port)
+            if width > MAX_PORT_WIDTH:
+                return
+            name = verilator_name(port.name)
+            stim_port = StimulusPort(len(self.ports), name, width)
+            self.ports.append(stim_port)
+            self.port_map[name] = stim_port
+
+    def generate_driver(self, circuit_name, includes, tracing=None):
+        """
+        Returns the source of the generic C++ driver for this port table.
+        `tracing` (a VerilatorTrace) sets the waveform tracing options.
+        """
+        if tracing is None:
+            tracing = VerilatorTrace()
+        opcodes = ",\n".join(f"    {name} = {code}"
+                             for name, code in OPCODES.items())
+        names = [port.name for port in self.ports]
+        port_table = "\n".join(
+            f'    {{"{name}", &top->{name}, sizeof(top->{name})}},'
+            for name in names)
+        includes = "\n".join(f"#include {include}" for include in includes)
+        return driver_tpl.format(
+            includes=includes,
+            circuit_name=circuit_name,
+            opcodes=opcodes,
+            num_ports=len(self.ports),
+            port_table=port_table,
+            magic=MAGIC.decode(),
+            version=VERSION,
+            state_cases=state_cases if self.savable else "",
+            trace_declarations=tracing.declarations(),
+            trace_open=tracing.open_code(circuit_name)
+        )
+
+    def generate_library(self, circuit_name, includes, tracing=None):
+        """
+        Returns the source of a shared library exposing the model and this
+        port table through a C interface (see `library_tpl`).  Only the
+        format and depth of the `tracing` options apply, the trace file is
+        given when opening the model.
+        """
+        if tracing is None:
+            tracing = VerilatorTrace()
+        port_table = "\n".join(
+            f'        {{"{port.name}", &top->{port.name}, '
+            f'sizeof(top->{port.name})}},'
+            for port in self.ports)
+        includes = "\n".join(f"#include {include}" for include in includes)
+        return library_tpl.format(
+            includes=includes,
+            circuit_name=circuit_name,
+            num_ports=len(self.ports),
+            port_table=port_table,
+            tracer_class=tracing.tracer_class,
+            trace_levels=tracing.levels
+        )
+
+    def _get_port(self, port):
+        if isinstance(port, PortWrapper):
+            port = port.select_path
+        if isinstance(port, SelectPath):
+            if len(port) > 2:
+                raise NotImplementedError(
+                    f"Internal signal {port.debug_name} is not supported by "
+                    f"runtime stimulus")
+            port = port[-1]
+        if isinstance(port, (fault.WrappedVerilogInternalPort, actions.Var)):
+            raise NotImplementedError(
+                f"{port} is not supported by runtime stimulus")
+        return port
+
+    def _make_ref(self, port):
+        port = self._get_port(port)
+        name = verilator_name(port.name)
+        if name not in self.port_map:
+            raise NotImplementedError(
+                f"Port {port.debug_name} is not supported by runtime stimulus"
+                f" (only digital ports of at most {MAX_PORT_WIDTH} bits are)")
+        stim_port = self.port_map[name]
+        shift, width = 0, stim_port.width
+        if isinstance(port.name, m.ref.ArrayRef) and \
+                issubclass(port.name.array.T, m.Digital):
+            index = port.name.index
+            if isinstance(index, int):
+                shift, width = index, 1
+            else:
+                shift, width = index.start, index.stop - index.start
+        return stim_port.index, shift, width
+
+    @staticmethod
+    def _pack_ref(ref):
+        index, shift, width = ref
+        return struct.pack("<IBQ", index, shift, (1 << width) - 1)
+
+    @staticmethod
+    def _pack_str(value):
+        value = value.encode()
+        return struct.pack("<I", len(value)) + value
+
+    @staticmethod
+    def _to_int(value, width):
+        if isinstance(value, (Bit, bool)):
+            value = int(value)
+        elif isinstance(value, BitVector):
+            value = value.as_uint()
+        if not isinstance(value, int):
+            raise NotImplementedError(
+                f"Value {value} is not supported by runtime stimulus")
+        # negative values wrap around as in the generated C++
+        return value & ((1 << width) - 1)
+
+    def _pack_chunks(self, format_str, ports):
+        """
+        Split a printf format string into chunks containing at most one
+        conversion each, so the driver can pass one uint64_t per call.
+        """
+        chunks = []
+        ports = list(ports)
+        text = ""
+        pos = 0
+        for match in _FORMAT_SPEC.finditer(format_str):
+            text += format_str[pos:match.start()]
+            pos = match.end()
+            if match.group(1) == "%":
+                text += "%%"
+                continue
+            conv = match.group(2)
+            if conv not in "diouxX":
+                raise NotImplementedError(
+                    f"Format {match.group(0)} is not supported by runtime "
+                    f"stimulus")
+            if not ports:
+                raise ValueError(f"Not enough arguments for {format_str}")
+            # widen the conversion to match the uint64_t argument
+            spec = match.group(0)
+            spec = re.sub(r"(hh|h|ll|l|j|z|t)?[a-zA-Z]$", "ll" + conv, spec)
+            chunks.append((text + spec, self._make_ref(ports.pop(0))))
+            text = ""
+        text += format_str[pos:]
+        if text:
+            # printed with fputs, so undo the escaping of "%"
+            chunks.append((text.replace("%%", "%"), None))
+
+        result = struct.pack("<I", len(chunks))
+        for fmt, ref in chunks:
+            result += self._pack_str(fmt)
+            if ref is None:
+                result += struct.pack("<B", 0)
+            else:
+                result += struct.pack("<B", 1) + self._pack_ref(ref)
+        return result
+
+    def _encode_msg(self, msg):
+        if msg is None:
+            return struct.pack("<I", 0)
+        if isinstance(msg, str):
+            return self._pack_chunks(_unescape(msg), ())
+        return self._pack_chunks(_unescape(msg[0]), msg[1:])
+
+    def _is_array(self, port):
+        if isinstance(port, SelectPath):
+            port = port[-1]
+        return isinstance(port, m.Array) and \
+            not issubclass(port.T, m.Digital)
+
+    def encode_action(self, i, action):
+        """
+        Returns the encoded bytes for `action`, which has index `i` in the
+        list of actions.
+        """
+        if isinstance(action, actions.PortAction) and \
+                self._is_array(action.port):
+            port = self._get_port(action.port)
+            return b"".join(
+                self.encode_action(i, type(action)(port[j], action.value[j]))
+                for j in range(len(port)))
+        if isinstance(action, actions.Poke):
+            if action.delay is not None:
+                raise NotImplementedError(
+                    "Poke with delay is not supported by runtime stimulus")
+            ref = self._make_ref(action.port)
+            value = self._to_int(action.value, ref[2])
+            return (struct.pack("<B", OPCODES["POKE"]) + self._pack_ref(ref) +
+                    struct.pack("<Q", value))
+        elif isinstance(action, actions.Expect):
+            if value_utils.is_any(action.value):
+                return b""
+            if action.above is not None or action.below is not None:
+                raise NotImplementedError(
+                    "Expect with bounds is not supported by runtime stimulus")
+            ref = self._make_ref(action.port)
+            result = struct.pack("<B", OPCODES["EXPECT"]) + self._pack_ref(ref)
+            value = action.value
+            if isinstance(value, (actions.Peek, PortWrapper)):
+                if isinstance(value, actions.Peek):
+                    value = value.port
+                result += struct.pack("<B", 1)
+                result += self._pack_ref(self._make_ref(value))
+            else:
+                result += struct.pack("<BQ", 0, self._to_int(value, ref[2]))
+            port = self._get_port(action.port)
+            result += struct.pack("<I", i)
+            result += self._pack_str(port.debug_name)
+            result += self._encode_msg(action.msg)
+            return result
+        elif isinstance(action, actions.Eval):
+            return struct.pack("<B", OPCODES["EVAL"])
+        elif isinstance(action, actions.Step):
+            if action.until is not None:
+                raise NotImplementedError(
+                    "Step with until is not supported by runtime stimulus")
+            return (struct.pack("<B", OPCODES["STEP"]) +
+                    self._pack_ref(self._make_ref(action.clock)) +
+                    struct.pack("<I", action.steps))
+        elif isinstance(action, actions.Print):
+            return (struct.pack("<B", OPCODES["PRINT"]) +
+                    self._pack_chunks(_unescape(action.format_str),
+                                      action.ports))
+        elif isinstance(action, actions.GetValue):
+            ref = self._make_ref(action.port)
+            # the driver prints the value as an unsigned long long
+            fmt = action.get_format().replace("d", "llu") + "\n"
+            return (struct.pack("<B", OPCODES["GETVALUE"]) +
+                    self._pack_ref(ref) + self._pack_str(fmt))
+        elif isinstance(action, (actions.SaveState, actions.RestoreState)):
+            if not self.savable:
+                raise NotImplementedError(
+                    f"{action} requires a model built with savable=True")
+            if isinstance(action, actions.SaveState):
+                opcode = OPCODES["SAVE_STATE"]
+            else:
+                opcode = OPCODES["RESTORE_STATE"]
+            return struct.pack("<B", opcode) + \
+                self._pack_str(action.file_name)
+        elif isinstance(action, actions.TraceControl):
+            return struct.pack("<BB", OPCODES["TRACE_CONTROL"],
+                               int(action.enable))
+        elif isinstance(action, list):
+            return b"".join(self.encode_action(i, elem) for elem in action)
+        raise NotImplementedError(
+            f"{action} is not supported by runtime stimulus")
+
+    def encode(self, actions, start=0):
+        """
+        Encode `actions` into a complete stimulus stream.  `start` is the
+        index reported for the first action in failure messages.
+        """
+        parts = [MAGIC + struct.pack("<II", VERSION, len(self.ports))]
+        for i, action in enumerate(actions):
+            parts.append(self.encode_action(start + i, action))
+        parts.append(struct.pack("<B", OPCODES["END"]))
+        return b"".join(parts)
+
+    def write(self, actions, filename, start=0):
+        with open(filename, "wb") as f:
+            f.write(self.encode(actions, start))
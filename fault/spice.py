@@ -30,6 +30,16 @@ class SpiceNetlist(CodeGenerator):
                 line += [f'{p}']
         self.println(' '.join(line))
 
+    def temp(self, value):
+        self.println(f'.temp {value}')
+
+    def param(self, **kwargs):
+        line = []
+        line += ['.param']
+        for key, val in kwargs.items():
+            line += [f'{key}={val}']
+        self.println(' '.join(line))
+
     def include(self, file_):
         self.println(f'.include {file_}')
 
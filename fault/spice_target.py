@@ -1,4 +1,6 @@
 import os
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from copy import copy
 import magma as m
@@ -12,7 +14,7 @@ from fault.subprocess_run import subprocess_run
 from fault.pwl import pwc_to_pwl
 from fault.actions import Poke, Expect, Delay, Print, GetValue, Eval
 from fault.select_path import SelectPath
-from .fault_errors import A2DError, ExpectError
+from .fault_errors import A2DError, ExpectError, FaultError
 
 try:
     from decida.SimulatorNetlist import SimulatorNetlist
@@ -22,13 +24,30 @@ except ModuleNotFoundError:
 
 
 class CompiledSpiceActions:
-    def __init__(self, pwls, checks, prints, stop_time, saves, gets):
+    def __init__(self, pwls, checks, prints, stop_time, saves, gets,
+                 digital=None):
         self.pwls = pwls
         self.checks = checks
         self.prints = prints
         self.stop_time = stop_time
         self.saves = saves
         self.gets = gets
+        # names of the stimuli whose voltages are derived from vsup
+        self.digital = digital if digital is not None else set()
+
+
+def corner_grid(**axes):
+    """
+    Returns the list of corners (for SpiceTarget.sweep) formed by all
+    combinations of the values given for each corner setting, e.g.
+
+        corner_grid(vsup=[0.9, 1.0, 1.1], temp=[-40, 25, 125])
+
+    returns nine corners.
+    """
+    keys = list(axes.keys())
+    return [dict(zip(keys, values))
+            for values in itertools.product(*axes.values())]
 
 
 def DeclareFromSpice(file_name, subckt_name=None, mode='digital'):
@@ -82,7 +101,8 @@ class SpiceTarget(Target):
                  vih_rel=0.6, rz=1e9, conn_order='parse', bus_delim='<>',
                  bus_order='descend', flags=None, ic=None, cap_loads=None,
                  disp_type='on_error', mc_runs=0, mc_variations='all',
-                 vol_rel=0.1, voh_rel=0.9, no_run=False, uic=None):
+                 vol_rel=0.1, voh_rel=0.9, no_run=False, uic=None,
+                 interp_mode='scipy', temp=None, params=None):
         """
         circuit: a magma circuit
 
@@ -150,6 +170,16 @@ class SpiceTarget(Target):
 
         uic: If True, use initial conditions.  If not specified, "uic" is True
              if any initial conditions are specified, and is false otherwise.
+
+        interp_mode: How simulation results are interpolated at the times of
+                     checks, prints, and gets.  'scipy' (default) and 'numpy'
+                     interpolate linearly, with 'numpy' being cheaper to set
+                     up.  'step' uses the most recent simulated value.
+
+        temp: Simulation temperature (in degrees C).  If not specified, the
+              simulator default is used.
+
+        params: Dictionary of parameter values to define with ".param".
         """
         # call the super constructor
         super().__init__(circuit)
@@ -192,6 +222,9 @@ class SpiceTarget(Target):
         self.vol_rel = vol_rel
         self.voh_rel = voh_rel
         self.no_run = no_run
+        self.interp_mode = interp_mode
+        self.temp = temp
+        self.params = params if params is not None else {}
 
         # set default for "uic"
         if uic is None:
@@ -214,6 +247,18 @@ class SpiceTarget(Target):
         # compile the actions
         comp = self.compile_actions(actions)
 
+        # run the simulation and process the results
+        for results in self.simulate(comp):
+            # print results
+            self.print_results(results=results, prints=comp.prints)
+
+            # implement all of the gets
+            self.impl_all_gets(results=results, gets=comp.gets)
+
+            # check results
+            self.check_results(results=results, checks=comp.checks)
+
+    def simulate(self, comp):
         # write the testbench
         tb_file = self.write_test_bench(comp)
 
@@ -232,37 +277,137 @@ class SpiceTarget(Target):
             subprocess_run(cmd, cwd=self.directory, env=self.sim_env,
                            disp_type=self.disp_type)
 
-        # process the results
+        # parse the results, only reading in the signals that are needed.
+        # there is one set of results per raw file (i.e., per Monte-Carlo run)
+        signals = self.result_signals(comp)
+        retval = []
         for raw_file in raw_files:
             if self.simulator in {'ngspice'}:
-                results = nut_parse(raw_file)
+                results = nut_parse(raw_file, signals=signals,
+                                    interp_mode=self.interp_mode)
             elif self.simulator in {'spectre'}:
-                results = psf_parse(raw_file)
+                results = psf_parse(raw_file, signals=signals,
+                                    interp_mode=self.interp_mode)
             elif self.simulator in {'hspice'}:
-                results = hspice_parse(raw_file)
+                results = hspice_parse(raw_file, signals=signals,
+                                       interp_mode=self.interp_mode)
             else:
                 raise NotImplementedError(self.simulator)
+            retval.append(results)
+        return retval
 
-            # print results
-            self.print_results(results=results, prints=comp.prints)
+    def sweep(self, actions, corners, processes=None):
+        """
+        Runs `actions` at each of the given corners, returning one row per
+        corner (and per Monte-Carlo run) instead of raising an exception
+        when a check fails.
 
-            # implement all of the gets
-            self.impl_all_gets(results=results, gets=comp.gets)
+        actions: the actions to run; they are compiled only once.
 
-            # check results
-            self.check_results(results=results, checks=comp.checks)
+        corners: list of dictionaries, each of which can set "vsup", "temp",
+                 "params" (a dictionary of ".param" values), and
+                 "model_paths" (replacing the model files given to the
+                 target), as well as a "name" for the corner.  corner_grid
+                 can be used to build the list.
+
+        processes: maximum number of simulations to run at the same time
+                   (defaults to the number of CPUs).
+
+        Each row is a dictionary with keys "corner" (the corner dictionary),
+        "run" (the Monte-Carlo run index), "passed", "errors" (list of
+        check failure messages), and "values" (list of values for each
+        GetValue, in order).  Prints are not displayed during sweeps.
+        """
+        comp = self.compile_actions(actions)
+        processes = processes or os.cpu_count()
+
+        def run_corner(k):
+            corner_target = self.corner_target(corners[k], k)
+            corner_comp = corner_target.corner_actions(comp, self.vsup)
+            rows = []
+            for run, results in enumerate(
+                    corner_target.simulate(corner_comp)):
+                values = [float(results[f'{action.port.name}'](time))
+                          for time, action in comp.gets]
+                try:
+                    corner_target.check_results(results=results,
+                                                checks=corner_comp.checks)
+                    errors = []
+                except FaultError as err:
+                    errors = [f'{err}']
+                rows.append(dict(corner=corners[k], run=run,
+                                 passed=len(errors) == 0, errors=errors,
+                                 values=values))
+            return rows
+
+        # the simulations are run as subprocesses, so a thread pool is
+        # enough to run them in parallel
+        with ThreadPoolExecutor(max_workers=processes) as executor:
+            rows = executor.map(run_corner, range(len(corners)))
+        return [row for corner_rows in rows for row in corner_rows]
+
+    def corner_target(self, corner, k):
+        # returns a copy of this target with the settings of "corner"
+        # applied, which runs in its own subdirectory
+        unknown = set(corner) - {'name', 'vsup', 'temp', 'params',
+                                 'model_paths'}
+        if unknown:
+            raise ValueError(f'Unknown corner settings: {unknown}')
+        target = copy(self)
+        name = corner.get('name', f'corner_{k}')
+        target.directory = os.path.join(self.directory, name)
+        os.makedirs(target.directory, exist_ok=True)
+        if 'vsup' in corner:
+            target.vsup = corner['vsup']
+        if 'temp' in corner:
+            target.temp = corner['temp']
+        if 'params' in corner:
+            target.params = dict(self.params, **corner['params'])
+        if 'model_paths' in corner:
+            model_paths = list(corner['model_paths'])
+            if hasattr(self.circuit, 'spice_model_path'):
+                model_paths = [f'{self.circuit.spice_model_path}'] + \
+                    model_paths
+            target.model_paths = model_paths
+        return target
+
+    def corner_actions(self, comp, vsup):
+        # rescale digital stimuli that were compiled for supply "vsup"
+        if self.vsup == vsup:
+            return comp
+        scale = self.vsup / vsup
+        comp = copy(comp)
+        comp.pwls = {
+            name: (([(t, v * scale) for t, v in pwl_v], pwl_s)
+                   if name in comp.digital else (pwl_v, pwl_s))
+            for name, (pwl_v, pwl_s) in comp.pwls.items()
+        }
+        return comp
+
+    def result_signals(self, comp):
+        # names of the signals referenced by checks, prints, and gets
+        signals = set()
+        for _, action in comp.checks:
+            signals.update(check[0] for check in self.expand_check(action))
+        for _, action in comp.prints:
+            signals.update(f'{port.name}' for port in action.ports)
+        for _, action in comp.gets:
+            signals.add(f'{action.port.name}')
+        return signals
 
     def expand_bus(self, action):
         # define bit-access function for the action's value
         # this is needed at the moment because fault.HiZ cannot
         # be used in a BitVector -- but it is still a common
         # use case to set a whole bus to HiZ
+        if action.value is not fault.HiZ:
+            # this should work both for BitVectors and integers
+            value = hwtypes.BitVector[len(action.port)](action.value)
+
         def get_value_at_bit(k):
             if action.value is fault.HiZ:
                 return fault.HiZ
             else:
-                # this should work both for BitVectors and integers
-                value = hwtypes.BitVector[len(action.port)](action.value)
                 return value[k]
 
         # return a list of single-bit pokes
@@ -290,12 +435,13 @@ class SpiceTarget(Target):
         checks = []
         prints = []
         gets = []
+        digital = set()
 
-        # expand buses as needed
+        # expand buses as needed (expects on buses are expanded when checking
+        # the results)
         _actions = []
         for action in actions:
-            if isinstance(action, (Poke, Expect)) \
-               and isinstance(action.port, m.Bits):
+            if isinstance(action, Poke) and isinstance(action.port, m.Bits):
                 _actions += self.expand_bus(action)
             else:
                 _actions.append(action)
@@ -317,6 +463,7 @@ class SpiceTarget(Target):
                 elif isinstance(action.port, m.Bit):
                     stim_v = self.vsup if action.value else 0
                     stim_s = 1
+                    digital.add(action_port_name)
                 else:
                     stim_v = action.value
                     stim_s = 1
@@ -356,7 +503,8 @@ class SpiceTarget(Target):
             prints=prints,
             gets=gets,
             stop_time=t,
-            saves=self.saves
+            saves=self.saves,
+            digital=digital
         )
 
     @staticmethod
@@ -419,6 +567,12 @@ class SpiceTarget(Target):
         netlist = SpiceNetlist()
         netlist.comment('Automatically generated file.')
 
+        # set parameters and temperature if needed
+        if len(self.params) > 0:
+            netlist.param(**self.params)
+        if self.temp is not None:
+            netlist.temp(self.temp)
+
         # add include files
         for file_ in self.model_paths:
             netlist.include(Path(file_).resolve())
@@ -509,52 +663,122 @@ class SpiceTarget(Target):
         # return name of the file written
         return tb_file
 
-    def impl_expect(self, results, time, action):
-        # get value
-        name = f'{action.port.name}'.split('.')[-1]
-
-        # get value, performing analog to digital conversion
-        # if necessary
-        value = results[name](time)
-        if isinstance(action.port, m.Bit):
-            if value <= self.vil_rel * self.vsup:
-                value = 0
-            elif value >= self.vih_rel * self.vsup:
-                value = 1
-            else:
-                raise A2DError(f'Invalid logic level: {value}.')
-
-        # determine the condition and error body
-        err_hdr = ''
-        err_hdr += f'Failed checking port {action.port.name}'
-        err_hdr += f' at time {time:0.3e}'
-        if action.traceback is not None:
-            err_hdr += f' with traceback {action.traceback}'
-
-        # implement the requested check
-        err_msg = None
-        if action.above is not None:
-            if action.below is not None:
-                if not (action.above <= value <= action.below):
-                    err_msg = f'Expected {action.above} to {action.below}, got {value}'  # noqa
+    def expand_check(self, action):
+        # returns (signal name, display name, is digital, expected value)
+        # tuples for each signal checked by an Expect action, expanding buses
+        # into their individual bits
+        if isinstance(action.port, m.Bits):
+            if action.value is fault.HiZ:
+                bits = [fault.HiZ] * len(action.port)
             else:
-                if not (action.above <= value):
-                    err_msg = f'Expected above {action.above}, got {value}.'
+                bits = hwtypes.BitVector[len(action.port)](action.value)
+            retval = []
+            for k in range(len(action.port)):
+                name = self.bit_from_bus(action.port, k)
+                retval.append((name.split('.')[-1], name, True, bits[k]))
+            return retval
         else:
-            if action.below is not None:
-                if not (value <= action.below):
-                    err_msg = f'Expected below {action.below}, got {value}.'
-            else:
-                if not (value == action.value):
-                    err_msg = f'Expected {action.value}, got {value}.'
+            name = f'{action.port.name}'
+            return [(name.split('.')[-1], name,
+                     isinstance(action.port, m.Bit), action.value)]
 
-        # raise exception if there was an error
-        if err_msg is not None:
-            raise ExpectError(f'{err_hdr}.  {err_msg}.')
+    @staticmethod
+    def _to_float(value):
+        if isinstance(value, (hwtypes.AbstractBit, hwtypes.AbstractBitVector)):
+            return float(int(value))
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            # never equal to a simulated value, so the check fails
+            return np.nan
+
+    def check_signal(self, result, checks):
+        # evaluate all "checks" of a single signal at once.  each check is a
+        # (index, time, action, display name, is digital, expected) tuple.
+        # returns a list of (index, message, is A2D error) failures.
+        times = np.array([check[1] for check in checks], dtype=float)
+        is_bit = np.array([check[4] for check in checks], dtype=bool)
+        above = np.array([np.nan if check[2].above is None
+                          else check[2].above for check in checks],
+                         dtype=float)
+        below = np.array([np.nan if check[2].below is None
+                          else check[2].below for check in checks],
+                         dtype=float)
+        expected = np.array([self._to_float(check[5]) for check in checks],
+                            dtype=float)
+
+        # get values, performing analog to digital conversion if necessary
+        values = np.asarray(result(times), dtype=float)
+        lo = values <= self.vil_rel * self.vsup
+        hi = values >= self.vih_rel * self.vsup
+        invalid = is_bit & ~(lo | hi)
+        values = np.where(is_bit, hi.astype(float), values)
+
+        # implement the requested checks
+        has_above = ~np.isnan(above)
+        has_below = ~np.isnan(below)
+        with np.errstate(invalid='ignore'):
+            ok = np.where(has_above, above <= values, True)
+            ok &= np.where(has_below, values <= below, True)
+            ok &= np.where(has_above | has_below, True, values == expected)
+
+        failures = []
+        for j in np.flatnonzero(invalid | ~ok):
+            index, time, action, name, _, value = checks[j]
+
+            # determine the error header
+            err_hdr = ''
+            err_hdr += f'Failed checking port {name}'
+            err_hdr += f' at time {time:0.3e}'
+            if action.traceback is not None:
+                err_hdr += f' with traceback {action.traceback}'
+
+            # determine the error body
+            if invalid[j]:
+                got = result(time)
+                failures.append(
+                    (index, f'{err_hdr}.  Invalid logic level: {got}.', True))
+                continue
+            got = int(values[j]) if is_bit[j] else values[j]
+            if has_above[j]:
+                if has_below[j]:
+                    err_msg = f'Expected {action.above} to {action.below}, got {got}'  # noqa
+                else:
+                    err_msg = f'Expected above {action.above}, got {got}.'
+            else:
+                if has_below[j]:
+                    err_msg = f'Expected below {action.below}, got {got}.'
+                else:
+                    err_msg = f'Expected {value}, got {got}.'
+            failures.append((index, f'{err_hdr}.  {err_msg}.', False))
+        return failures
 
     def check_results(self, results, checks):
-        for check in checks:
-            self.impl_expect(results=results, time=check[0], action=check[1])
+        # group the checks by signal, so that each signal is interpolated
+        # only once for all of its check times
+        groups = {}
+        for index, (time, action) in enumerate(checks):
+            for name, disp_name, is_bit, value in self.expand_check(action):
+                groups.setdefault(name, []).append(
+                    (index, time, action, disp_name, is_bit, value))
+
+        failures = []
+        for name, group in groups.items():
+            failures += self.check_signal(results[name], group)
+        if len(failures) == 0:
+            return
+
+        # report all of the failures at once, in the order of the checks
+        failures.sort(key=lambda failure: failure[0])
+        if len(failures) == 1:
+            msg = failures[0][1]
+        else:
+            msg = f'{len(failures)} checks failed:\n'
+            msg += '\n'.join(failure[1] for failure in failures)
+        if any(failure[2] for failure in failures):
+            raise A2DError(msg)
+        else:
+            raise ExpectError(msg)
 
     def impl_print(self, results, time, action):
         # get port values
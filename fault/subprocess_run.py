@@ -1,5 +1,7 @@
 import shlex
 import re
+import tempfile
+from collections import deque
 from subprocess import Popen, PIPE, CompletedProcess
 from fault.user_cfg import FaultConfig
 
@@ -13,9 +15,12 @@ RESET_ALL = '\x1b[0m'
 
 
 class PrintDisplay:
-    def __init__(self, mode):
+    def __init__(self, mode, max_lines=None):
+        # if max_lines is not None, only the last "max_lines" lines are kept
+        # for display when an error occurs
         self.mode = mode
-        self.lines = []
+        self.lines = deque(maxlen=max_lines)
+        self.num_lines = 0
 
     def print(self, line):
         line = line.rstrip()
@@ -23,11 +28,16 @@ class PrintDisplay:
             print(line)
         elif self.mode == 'on_error':
             self.lines.append(line)
+            self.num_lines += 1
         else:
             raise Exception('Invalid mode.')
 
     def error_printing(self):
         if self.mode == 'on_error':
+            omitted = self.num_lines - len(self.lines)
+            if omitted > 0:
+                print(MAGENTA + BRIGHT + f'... ({omitted} lines omitted)' +
+                      RESET_ALL)
             for line in self.lines:
                 print(line)
 
@@ -35,11 +45,11 @@ class PrintDisplay:
         # generic line-processing function to display lines
         # as they are produced as output in and check for errors.
 
-        retval = ''
+        retval = []
         any_line = False
         for line in ouput_str.splitlines():
             # Add line to value to be returned
-            retval += line
+            retval.append(line)
 
             # Display opening text if needed
             if not any_line:
@@ -54,7 +64,40 @@ class PrintDisplay:
             self.print(MAGENTA + BRIGHT + f'</{name}>' + RESET_ALL)
 
         # Return the full output contents for further processing
-        return retval
+        return ''.join(retval)
+
+    def stream_output(self, stream, log, name, err_str=None, tail_lines=None):
+        # like process_output, but handles lines as they are read from
+        # "stream", writing each one to the file object "log".  only the last
+        # "tail_lines" lines are returned, along with whether "err_str" was
+        # found in any line.
+
+        tail = deque(maxlen=tail_lines)
+        found = False
+        any_line = False
+        for line in stream:
+            log.write(line)
+            line = line.rstrip('\n')
+            tail.append(line)
+
+            # check for errors
+            if err_str is not None and not found:
+                found = error_detected(line, err_str)
+
+            # Display opening text if needed
+            if not any_line:
+                any_line = True
+                self.print(MAGENTA + BRIGHT + f'<{name}>' + RESET_ALL)
+
+            # display if desired
+            self.print(line)
+
+        # Display closing text if needed
+        if any_line:
+            self.print(MAGENTA + BRIGHT + f'</{name}>' + RESET_ALL)
+
+        # joined like the output of process_output
+        return ''.join(tail), found
 
 
 def error_detected(text, err_str):
@@ -81,7 +124,8 @@ def _throw(args, cwd, env, disp_type, err_str,
 
 
 def subprocess_run(args, cwd=None, env=None, disp_type='on_error', err_str=None,
-                   chk_ret_code=True, shell=False, use_fault_cfg=True):
+                   chk_ret_code=True, shell=False, use_fault_cfg=True,
+                   log_file=None, tail_lines=1000):
     # "Deluxe" version of subprocess.run that can display STDOUT lines as they
     # come in, looks for errors in STDOUT and STDERR (raising an exception if
     # one is found), and can check the return code from the subprocess
@@ -116,13 +160,20 @@ def subprocess_run(args, cwd=None, env=None, disp_type='on_error', err_str=None,
     #        Verilator)
     # use_fault_cfg: If True (default) and env is None, then use FaultConfig
     #                to fill in default environment variables.
+    # log_file: If not None, STDOUT is streamed to this file as it is
+    #           produced instead of being held in memory.  Only the last
+    #           "tail_lines" lines of STDOUT are kept for display on error
+    #           and returned in the "stdout" of the result, and err_str is
+    #           checked line by line.
+    # tail_lines: Number of lines of STDOUT to keep when log_file is used.
 
     # set defaults
     if env is None and use_fault_cfg:
         env = FaultConfig().get_sim_env()
 
     # set up printing
-    display = PrintDisplay(mode=disp_type)
+    display = PrintDisplay(mode=disp_type,
+                           max_lines=tail_lines if log_file else None)
 
     # print out the command in a format that can be copy-pasted
     # directly into a terminal (i.e., with proper quoting of arguments)
@@ -135,27 +186,43 @@ def subprocess_run(args, cwd=None, env=None, disp_type='on_error', err_str=None,
 
     # run the subprocess
     err_msg = []
-    with Popen(args, cwd=cwd, env=env, stdout=PIPE, stderr=PIPE, bufsize=1,
-               universal_newlines=True, shell=shell) as p:
-
-        # print out STDOUT, then STDERR
-        # threads could be used here but pytest does not detect exceptions
-        # in child threads, so for now the outputs are printed sequentially
-        stdout, stderr = p.communicate()
-        stdout = display.process_output(stdout, name='STDOUT')
-        stderr = display.process_output(stderr, name='STDERR')
-
-        # get return code and check result if desired
-
-        if chk_ret_code and p.returncode:
-            err_msg += [f'Got return code {p.returncode}.']
-
-        # look for errors in STDOUT or STDERR
-        if err_str is not None:
-            if error_detected(stdout, err_str):
-                err_msg += [f'Found error pattern "{err_str}" in STDOUT.']
-            if error_detected(stderr, err_str):
-                err_msg += [f'Found error pattern "{err_str}" in STDERR.']
+    if log_file is None:
+        with Popen(args, cwd=cwd, env=env, stdout=PIPE, stderr=PIPE,
+                   bufsize=1, universal_newlines=True, shell=shell) as p:
+
+            # print out STDOUT, then STDERR
+            # threads could be used here but pytest does not detect exceptions
+            # in child threads, so for now the outputs are printed sequentially
+            stdout, stderr = p.communicate()
+            stdout = display.process_output(stdout, name='STDOUT')
+            stderr = display.process_output(stderr, name='STDERR')
+            stdout_err = err_str is not None and \
+                error_detected(stdout, err_str)
+    else:
+        # STDERR goes to a temporary file so that the subprocess cannot block
+        # on a full STDERR pipe while STDOUT is being streamed
+        with open(log_file, 'w') as log, \
+                tempfile.TemporaryFile(mode='w+') as stderr_file:
+            with Popen(args, cwd=cwd, env=env, stdout=PIPE,
+                       stderr=stderr_file, bufsize=1, universal_newlines=True,
+                       shell=shell) as p:
+                stdout, stdout_err = display.stream_output(
+                    p.stdout, log, name='STDOUT', err_str=err_str,
+                    tail_lines=tail_lines)
+            stderr_file.seek(0)
+            stderr = display.process_output(stderr_file.read(),
+                                            name='STDERR')
+
+    # get return code and check result if desired
+    if chk_ret_code and p.returncode:
+        err_msg += [f'Got return code {p.returncode}.']
+
+    # look for errors in STDOUT or STDERR
+    if err_str is not None:
+        if stdout_err:
+            err_msg += [f'Found error pattern "{err_str}" in STDOUT.']
+        if error_detected(stderr, err_str):
+            err_msg += [f'Found error pattern "{err_str}" in STDERR.']
 
     # if any errors were found, print out STDOUT and STDERR if they haven't
     # already been printed, then print out what the error(s) were and
@@ -0,0 +1,329 @@
+"""
+Runtime stimulus support for the SystemVerilog target.
+
+With `runtime_stimulus`, the test bench does not contain the actions of the
+test.  Instead, it reads them from a text file given with the
+`+STIMULUS=<file>` plusarg, so the test bench only depends on the port list
+of the circuit.  The DUT and test bench are compiled once and every test only
+runs the simulator.  GetValue results are written to the file given with
+`+VALUES=<file>`.
+
+Each line of the stimulus file is one command:
+
+    <opcode> <port id> <shift> <mask (hex)> <value (hex)> <action index>
+
+POKE, EXPECT and GETVALUE address the bits [shift +: width] of the port, where
+`mask` is (1 << width) - 1.  STEP toggles the port `value` times, EVAL and END
+ignore their operands.
+"""
+import magma as m
+from hwtypes import BitVector, Bit
+import fault
+import fault.actions as actions
+import fault.value_utils as value_utils
+from fault.ms_types import RealType
+from fault.select_path import SelectPath
+from fault.verilog_utils import verilog_name
+from fault.wrapper import PortWrapper
+
+
+OPCODES = {
+    "POKE": 1,
+    "EXPECT": 2,
+    "EXPECT_NONSTRICT": 3,
+    "EVAL": 4,
+    "STEP": 5,
+    "GETVALUE": 6,
+    "END": 7,
+}
+
+PREFIX = "fault_stim"
+
+
+class SVStimulusPort:
+    def __init__(self, index, name, width, is_input):
+        self.index = index
+        self.name = name
+        self.width = width
+        self.is_input = is_input
+
+    def __repr__(self):
+        return (f"SVStimulusPort({self.index}, {self.name}, {self.width}, "
+                f"{self.is_input})")
+
+
+class SVStimulus:
+    """
+    Port table for `circuit`, along with the code of the test bench that
+    interprets stimulus files and the logic for encoding actions into them.
+
+    Only top-level digital ports (bits or arrays of bits) are supported, and
+    only circuit inputs can be poked or stepped.
+    """
+    def __init__(self, circuit, disable_ndarray=False):
+        self.circuit = circuit
+        self.disable_ndarray = disable_ndarray
+        self.ports = []
+        self.port_map = {}
+        for name, type_ in circuit.IO.ports.items():
+            if issubclass(type_, RealType) or type_.is_inout():
+                continue
+            if issubclass(type_, m.Digital):
+                width = 1
+            elif issubclass(type_, m.Array) and \
+                    issubclass(type_.T, m.Digital):
+                width = len(type_)
+            else:
+                continue
+            port = SVStimulusPort(len(self.ports), name, width,
+                                  type_.is_input())
+            self.ports.append(port)
+            self.port_map[name] = port
+
+    @property
+    def width(self):
+        """
+        Width of the registers holding values in the test bench (at least 32
+        bits, so that they can hold the number of steps)
+        """
+        return max([port.width for port in self.ports] + [32])
+
+    def declarations(self):
+        """
+        Returns a list of (type, name) pairs declared by the test bench
+        """
+        width = self.width
+        decls = [(f'reg [{width - 1}:0]', f'{PREFIX}_{name}')
+                 for name in ('mask', 'value', 'got')]
+        decls += [('integer', f'{PREFIX}_{name}')
+                  for name in ('fd', 'values_fd', 'n', 'op', 'port', 'shift',
+                               'index', 'k')]
+        decls += [('string', f'{PREFIX}_{name}')
+                  for name in ('file', 'values', 'name')]
+        return decls
+
+    def _case(self, ports, body):
+        code = [f'case ({PREFIX}_port)']
+        for port in ports:
+            code += [f'    {port.index}: begin']
+            code += [f'        {line}' for line in body(port)]
+            code += ['    end']
+        code += ['    default: ;', 'endcase']
+        return code
+
+    def _poke(self, port):
+        if port.width == 1:
+            return [f'{port.name} <= {PREFIX}_value[0];']
+        k = f'{PREFIX}_k'
+        return [
+            f'for ({k} = 0; {k} < {port.width}; {k} = {k} + 1)',
+            f'    if ({PREFIX}_mask[{k}])',
+            f'        {port.name}[{k}] <= {PREFIX}_value[{k}];'
+        ]
+
+    def _read(self, port):
+        return [f'{PREFIX}_got = {port.name};',
+                f'{PREFIX}_name = "{port.name}";']
+
+    def _block(self, code):
+        return ['begin'] + [f'    {line}' for line in code] + ['end']
+
+    def generate_reader(self, clock_step_delay):
+        """
+        Returns the lines of the initial block of the test bench that reads
+        and runs the stimulus file.
+        """
+        inputs = [port for port in self.ports if port.is_input]
+        got = f'({PREFIX}_got & {PREFIX}_mask)'
+        err_args = (f'{PREFIX}_index, {PREFIX}_name, '
+                    f'{PREFIX}_value >> {PREFIX}_shift, '
+                    f'{got} >> {PREFIX}_shift')
+        err_msg = ('"Failed on action=%0d checking port %0s.  '
+                   'Expected %x, got %x."')
+        expect = {}
+        for op, cmp in (('EXPECT', '!=='), ('EXPECT_NONSTRICT', '!=')):
+            expect[op] = self._block(
+                self._case(self.ports, self._read) + [
+                    f'if ({got} {cmp} {PREFIX}_value)',
+                    f'    $error({err_msg}, {err_args});'
+                ])
+        step = self._block(
+            [f'repeat ({PREFIX}_value) begin',
+             f'    #{clock_step_delay};'] +
+            [f'    {line}' for line in
+             self._case(inputs, lambda port: [f'{port.name} ^= 1;'])] +
+            ['end'])
+        get_value = self._block(
+            self._case(self.ports, self._read) +
+            [f'$fwrite({PREFIX}_values_fd, "%0d\\n", '
+             f'{got} >> {PREFIX}_shift);'])
+        commands = {
+            'POKE': self._case(inputs, self._poke),
+            'EXPECT': expect['EXPECT'],
+            'EXPECT_NONSTRICT': expect['EXPECT_NONSTRICT'],
+            'EVAL': ['#1;'],
+            'STEP': step,
+            'GETVALUE': get_value,
+            'END': [';'],
+        }
+
+        code = [
+            f'if (!$value$plusargs("STIMULUS=%s", {PREFIX}_file)) begin',
+            f'    $error("No stimulus file given (+STIMULUS=<file>)");',
+            f'    $finish;',
+            f'end',
+            f'{PREFIX}_fd = $fopen({PREFIX}_file, "r");',
+            f'if ({PREFIX}_fd == 0) begin',
+            f'    $error("Could not open file %0s", {PREFIX}_file);',
+            f'    $finish;',
+            f'end',
+            f'{PREFIX}_values_fd = 0;',
+            f'if ($value$plusargs("VALUES=%s", {PREFIX}_values))',
+            f'    {PREFIX}_values_fd = $fopen({PREFIX}_values, "w");',
+            f'{PREFIX}_op = 0;',
+            f'while ({PREFIX}_op != {OPCODES["END"]}) begin',
+            f'    {PREFIX}_n = $fscanf({PREFIX}_fd, "%d %d %d %h %h %d\\n", '
+            f'{PREFIX}_op, {PREFIX}_port, {PREFIX}_shift, {PREFIX}_mask, '
+            f'{PREFIX}_value, {PREFIX}_index);',
+            f'    if ({PREFIX}_n != 6) begin',
+            f'        $error("Truncated stimulus file %0s", {PREFIX}_file);',
+            f'        {PREFIX}_op = {OPCODES["END"]};',
+            f'    end',
+            f'    {PREFIX}_mask = {PREFIX}_mask << {PREFIX}_shift;',
+            f'    {PREFIX}_value = {PREFIX}_value << {PREFIX}_shift;',
+            f'    case ({PREFIX}_op)',
+        ]
+        for name, body in commands.items():
+            code += [f'        {OPCODES[name]}:  // {name}']
+            code += [f'            {line}' for line in body]
+        code += [
+            f'    endcase',
+            f'end',
+            f'$fclose({PREFIX}_fd);',
+            f'if ({PREFIX}_values_fd != 0)',
+            f'    $fclose({PREFIX}_values_fd);',
+        ]
+        return code
+
+    def _get_port(self, port):
+        if isinstance(port, PortWrapper):
+            port = port.select_path
+        if isinstance(port, SelectPath):
+            if len(port) > 2:
+                raise NotImplementedError(
+                    f"Internal signal {port.debug_name} is not supported by "
+                    f"runtime stimulus")
+            port = port[-1]
+        if isinstance(port, (fault.WrappedVerilogInternalPort, actions.Var)):
+            raise NotImplementedError(
+                f"{port} is not supported by runtime stimulus")
+        return port
+
+    def _make_ref(self, port, is_input=False):
+        port = self._get_port(port)
+        shift = 0
+        width = None
+        if isinstance(port.name, m.ref.ArrayRef) and \
+                issubclass(port.name.array.T, m.Digital):
+            index = port.name.index
+            if isinstance(index, int):
+                shift, width = index, 1
+            else:
+                shift, width = index.start, index.stop - index.start
+            name = verilog_name(port.name.array.name, self.disable_ndarray)
+        else:
+            name = verilog_name(port.name, self.disable_ndarray)
+        if name not in self.port_map or \
+                (is_input and not self.port_map[name].is_input):
+            raise NotImplementedError(
+                f"Port {port.debug_name} is not supported by runtime "
+                f"stimulus")
+        stim_port = self.port_map[name]
+        if width is None:
+            width = stim_port.width
+        return stim_port.index, shift, width
+
+    @staticmethod
+    def _to_int(value, width):
+        if isinstance(value, (Bit, bool)):
+            value = int(value)
+        elif isinstance(value, BitVector):
+            value = value.as_uint()
+        if not isinstance(value, int):
+            raise NotImplementedError(
+                f"Value {value} is not supported by runtime stimulus")
+        return value & ((1 << width) - 1)
+
+    @staticmethod
+    def _line(opcode, ref=(0, 0, 1), value=0, i=0):
+        index, shift, width = ref
+        return (f"{OPCODES[opcode]} {index} {shift} {(1 << width) - 1:x} "
+                f"{value:x} {i}\n")
+
+    def _is_array(self, port):
+        if isinstance(port, SelectPath):
+            port = port[-1]
+        return isinstance(port, m.Array) and \
+            not issubclass(port.T, m.Digital)
+
+    def encode_action(self, i, action):
+        """
+        Returns the lines of the stimulus file for `action`, which has index
+        `i` in the list of actions.
+        """
+        if isinstance(action, actions.PortAction) and \
+                self._is_array(action.port):
+            raise NotImplementedError(
+                "Nested arrays are not supported by runtime stimulus")
+        if isinstance(action, actions.Poke):
+            if action.delay is not None:
+                raise NotImplementedError(
+                    "Poke with delay is not supported by runtime stimulus")
+            ref = self._make_ref(action.port, is_input=True)
+            return self._line("POKE", ref, self._to_int(action.value, ref[2]),
+                              i)
+        elif isinstance(action, actions.Expect):
+            if value_utils.is_any(action.value):
+                return ""
+            if action.above is not None or action.below is not None or \
+                    action.msg is not None or \
+                    isinstance(action.value, (actions.Peek, PortWrapper)):
+                raise NotImplementedError(
+                    "Expect with bounds, messages, or peeked values is not "
+                    "supported by runtime stimulus")
+            ref = self._make_ref(action.port)
+            opcode = "EXPECT" if action.strict else "EXPECT_NONSTRICT"
+            return self._line(opcode, ref, self._to_int(action.value, ref[2]),
+                              i)
+        elif isinstance(action, actions.Eval):
+            return self._line("EVAL", i=i)
+        elif isinstance(action, actions.Step):
+            if action.until is not None:
+                raise NotImplementedError(
+                    "Step with until is not supported by runtime stimulus")
+            ref = self._make_ref(action.clock, is_input=True)
+            return self._line("STEP", ref[:2] + (32, ), action.steps, i)
+        elif isinstance(action, actions.GetValue):
+            if action.real_number_port:
+                raise NotImplementedError(
+                    "GetValue of real ports is not supported by runtime "
+                    "stimulus")
+            return self._line("GETVALUE", self._make_ref(action.port), 0, i)
+        elif isinstance(action, list):
+            return "".join(self.encode_action(i, elem) for elem in action)
+        raise NotImplementedError(
+            f"{action} is not supported by runtime stimulus")
+
+    def encode(self, actions, start=0):
+        """
+        Encode `actions` into a complete stimulus file.  `start` is the index
+        reported for the first action in failure messages.
+        """
+        lines = [self.encode_action(start + i, action)
+                 for i, action in enumerate(actions)]
+        lines.append(self._line("END"))
+        return "".join(lines)
+
+    def write(self, actions, filename, start=0):
+        with open(filename, "w") as f:
+            f.write(self.encode(actions, start))
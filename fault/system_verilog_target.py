@@ -1,5 +1,8 @@
 import warnings
 from fault.verilog_target import VerilogTarget
+from fault.action_stream import ActionStream, MARKER
+from fault.build_cache import hash_parts
+from fault.sv_stimulus import SVStimulus
 from .verilog_utils import verilog_name, is_nd_array
 from .util import (is_valid_file_mode, file_mode_allows_reading,
                    file_mode_allows_writing)
@@ -66,7 +69,9 @@ class SystemVerilogTarget(VerilogTarget):
                  use_kratos=False, use_sva=False, skip_run=False,
                  no_top_module=False, vivado_use_system_verilog=True,
                  disable_ndarray=False, fsdb_dumpvars_args="",
-                 use_packed_arrays=False):
+                 use_packed_arrays=False, loop_compression=False,
+                 runtime_stimulus=False, compile_cache=True,
+                 compile_cache_dir=None):
         """
         circuit: a magma circuit
 
@@ -168,6 +173,30 @@ class SystemVerilogTarget(VerilogTarget):
 
         fsdb_dumpvars_args: (optional) arguments to the `fsdbDumpvars()`
                             function
+
+        loop_compression: If True, emit runs of pokes, expects, evals, and
+                          steps that only differ in the poked/expected values
+                          as loops over data tables (loaded with $readmemh)
+                          instead of unrolling them.
+
+        runtime_stimulus: If True, generate a test bench that reads the
+                          actions from a stimulus file (given with the
+                          +STIMULUS plusarg) at runtime.  The test bench
+                          and DUT are only compiled when their sources
+                          change, so running new action sequences only
+                          runs the simulator.  Only supported for "vcs" and
+                          "iverilog", and only for pokes, expects, evals,
+                          steps, and GetValue on top-level digital ports.
+
+        compile_cache: If True (default), reuse the Verilog generated by magma
+                       for the same circuit and magma_opts by an earlier
+                       target in this process instead of compiling the
+                       circuit again.
+
+        compile_cache_dir: If given, the generated Verilog is also cached in
+                           this directory, keyed by a hash of the circuit
+                           definition, so that it is reused across
+                           processes.
         """
         # set default for list of external sources
         if include_verilog_libraries is None:
@@ -197,7 +226,10 @@ class SystemVerilogTarget(VerilogTarget):
         # call the super constructor
         super().__init__(circuit, circuit_name, directory, skip_compile,
                          include_verilog_libraries, magma_output,
-                         magma_opts, coverage=coverage, use_kratos=use_kratos)
+                         magma_opts, coverage=coverage, use_kratos=use_kratos,
+                         loop_compression=loop_compression,
+                         compile_cache=compile_cache,
+                         compile_cache_dir=compile_cache_dir)
 
         # set default for top_module.  this comes after the super constructor
         # invocation, because that is where the self.circuit_name is assigned
@@ -276,6 +308,18 @@ class SystemVerilogTarget(VerilogTarget):
                                   "to install.")
         self.fsdb_dumpvars_args = fsdb_dumpvars_args
 
+        self.runtime_stimulus = runtime_stimulus
+        if runtime_stimulus:
+            if simulator not in {"vcs", "iverilog"}:
+                raise NotImplementedError(
+                    f"runtime_stimulus is not supported for {simulator}")
+            if ext_test_bench or loop_compression or use_kratos:
+                raise NotImplementedError(
+                    "runtime_stimulus does not support ext_test_bench, "
+                    "loop_compression, or kratos")
+            self.stimulus = SVStimulus(self.circuit, self.disable_ndarray)
+        self.stimulus_src = None
+
         # set up cadence tools command
         self.ncsim_cmd = self.cadence_cmd("irun")
         self.xcelium_cmd = self.cadence_cmd("xrun")
@@ -344,7 +388,8 @@ class SystemVerilogTarget(VerilogTarget):
             value = f"1'b{int(value)}"
         elif isinstance(value, BitVector):
             value = f"{len(value)}'d{value.as_uint()}"
-        elif isinstance(port, m.SInt) and value < 0:
+        elif isinstance(port, m.SInt) and isinstance(value, int) and \
+                value < 0:
             port_len = len(port)
             value = BitVector[port_len](value).as_uint()
             value = f"{port_len}'d{value}"
@@ -446,6 +491,23 @@ class SystemVerilogTarget(VerilogTarget):
         self.add_decl('integer', action.loop_var, exist_ok=True)
         return super().make_loop(i, action)
 
+    def make_table(self, name, table):
+        # the table is flattened into a memory that is loaded from a file,
+        # since initializing large unpacked arrays is poorly supported
+        width = max(max(value.bit_length() for value in row) for row in table)
+        width = max(width, 1)
+        size = len(table) * len(table[0])
+        self.add_decl(f'reg [{width - 1}:0]', f'{name} [0:{size - 1}]')
+        mem_file = (self.directory / f'{name}.mem').resolve()
+        with open(mem_file, 'w') as f:
+            for row in table:
+                for value in row:
+                    f.write(f'{value:x}\n')
+        return [f'$readmemh("{mem_file}", {name});']
+
+    def make_table_entry(self, name, row, n_cols, column):
+        return f'{name}[{row} * {n_cols} + {column}]'
+
     def make_join(self, i, action):
         code = ["fork"]
         for p in action.processes:
@@ -569,7 +631,13 @@ class SystemVerilogTarget(VerilogTarget):
 
         # determine the condition and error body
         err_hdr = ''
-        err_hdr += f'Failed on action={i} checking port {debug_name}'
+        if isinstance(i, str):
+            # the index is computed at runtime (e.g. in a table-driven loop)
+            err_hdr += f'Failed on action=%0d checking port {debug_name}'
+            idx_args = [i]
+        else:
+            err_hdr += f'Failed on action={i} checking port {debug_name}'
+            idx_args = []
         if action.traceback is not None:
             err_hdr += f' with traceback {action.traceback}'
         if action.above is not None:
@@ -607,7 +675,7 @@ class SystemVerilogTarget(VerilogTarget):
 
         # construct the body of the $error call
         err_fmt_str = f'"{err_hdr}.  {err_msg}."'
-        err_body = [err_fmt_str] + err_args
+        err_body = [err_fmt_str] + idx_args + err_args
         err_body = ', '.join([str(elem) for elem in err_body])
 
         if self.use_sva:
@@ -621,6 +689,10 @@ class SystemVerilogTarget(VerilogTarget):
         return ['#1;']
 
     def make_step(self, i, action):
+        if action.until is not None:
+            raise NotImplementedError(
+                "Step with until is not supported by the system-verilog "
+                "target")
         name = verilog_name(action.clock.name, self.disable_ndarray)
         code = []
         for step in range(action.steps):
@@ -743,15 +815,20 @@ class SystemVerilogTarget(VerilogTarget):
             initial_body += [f'$dumpfile("{self.waveform_file}");',
                              f'$dumpvars(0, dut);']
 
-        # if we're using the GetValue feature, then we need to open a file to
-        # which GetValue results will be written
-        if any(isinstance(action, GetValue) for action in actions):
-            actions = [FileOpen(self.value_file)] + actions
-            actions += [FileClose(self.value_file)]
+        if isinstance(actions, ActionStream):
+            # the code was already generated, `write_test_bench` replaces the
+            # marker with it
+            initial_body += [MARKER]
+        else:
+            # if we're using the GetValue feature, then we need to open a file
+            # to which GetValue results will be written
+            if any(isinstance(action, GetValue) for action in actions):
+                actions = [FileOpen(self.value_file)] + actions
+                actions += [FileClose(self.value_file)]
 
-        # handle all of user-specified actions in the testbench
-        for i, action in enumerate(actions):
-            initial_body += self.generate_action_code(i, action)
+            # handle all of user-specified actions in the testbench
+            for i, action in self.enumerate_actions(actions):
+                initial_body += self.generate_action_code(i, action)
 
         # format the paramter list
         param_list = [f'.{name}({value})'
@@ -805,6 +882,12 @@ class SystemVerilogTarget(VerilogTarget):
         # return the string representing the system-verilog testbench
         return src
 
+    def open_stream(self):
+        if self.runtime_stimulus:
+            raise NotImplementedError(
+                "runtime_stimulus does not support action streams")
+        return super().open_stream(indent=2 * self.TAB)
+
     def generate_test_bench(self, actions, power_args=None):
         if self.ext_test_bench:
             raise Exception(
@@ -813,7 +896,96 @@ class SystemVerilogTarget(VerilogTarget):
         power_args = power_args if power_args is not None else {}
         return self.write_test_bench(actions=actions, power_args=power_args)
 
+    def write_stimulus_test_bench(self, power_args=None):
+        """
+        Write the test bench used with `runtime_stimulus`, which only depends
+        on the ports of the circuit, and return its path.  The file is only
+        rewritten when its contents change.
+        """
+        if self.stimulus_src is None:
+            for type_, name in self.stimulus.declarations():
+                self.add_decl(type_, name)
+            reader = self.stimulus.generate_reader(self.clock_step_delay)
+            power_args = power_args if power_args is not None else {}
+            self.stimulus_src = self.generate_code(reader, power_args)
+        tb_file = (self.directory / f'{self.circuit_name}_tb.sv').absolute()
+        if not tb_file.is_file() or tb_file.read_text() != self.stimulus_src:
+            with open(tb_file, "w") as f:
+                f.write(self.stimulus_src)
+        return tb_file
+
+    def compile_stimulus_test_bench(self, power_args=None):
+        """
+        Compile the DUT along with the test bench used with
+        `runtime_stimulus`.  The simulation is only recompiled if the command
+        or the contents of any of its sources changed since the last
+        compilation in this directory.
+
+        Returns the command that runs a test (to which the arguments returned
+        by `write_stimulus` are appended) and the error strings to look for in
+        its output.
+        """
+        vlog_srcs = [self.write_stimulus_test_bench(power_args)]
+        if not self.ext_model_file:
+            vlog_srcs += [self.verilog_file]
+        vlog_srcs += self.include_verilog_libraries
+        if self.simulator == 'vcs':
+            sim_cmd, bin_file = self.vcs_cmd(sources=vlog_srcs)
+            sim_err_str = None
+            bin_file = (self.directory / bin_file).resolve()
+            bin_cmd = [str(bin_file)]
+            bin_err_str = ['Error', 'Fatal']
+        elif self.simulator == 'iverilog':
+            sim_cmd, bin_file = self.iverilog_cmd(sources=vlog_srcs)
+            sim_err_str = ['syntax error', 'I give up.']
+            bin_file = (self.directory / bin_file).resolve()
+            bin_cmd = ['vvp', '-N', str(bin_file)]
+            bin_err_str = ['ERROR', 'FATAL']
+        else:
+            raise NotImplementedError(self.simulator)
+
+        if not self.skip_run:
+            # sources are relative to the build directory unless absolute
+            key = hash_parts(sim_cmd, [self.directory / Path(src)
+                                       for src in vlog_srcs])
+            hash_file = self.directory / f'{self.circuit_name}_tb.hash'
+            if not (bin_file.exists() and hash_file.is_file() and
+                    hash_file.read_text() == key):
+                subprocess_run(sim_cmd, cwd=self.directory, env=self.sim_env,
+                               err_str=sim_err_str, disp_type=self.disp_type)
+                hash_file.write_text(key)
+        return bin_cmd, bin_err_str
+
+    def write_stimulus(self, actions, directory=None):
+        """
+        Encode `actions` into a stimulus file in `directory` (defaults to the
+        target directory) and return the plusargs for the simulation.
+        """
+        directory = self.directory if directory is None else Path(directory)
+        stimulus_file = directory / f"{self.circuit_name}_stimulus.txt"
+        # match the action indices of the generated test bench, which opens
+        # the value file before running the actions
+        start = 1 if any(isinstance(action, GetValue)
+                         for action in actions) else 0
+        self.stimulus.write(actions, stimulus_file, start)
+        value_file = directory / Path(self.value_file.name).name
+        return [f"+STIMULUS={stimulus_file.resolve()}",
+                f"+VALUES={value_file.resolve()}"]
+
     def run(self, actions, power_args=None):
+        if self.runtime_stimulus:
+            bin_cmd, bin_err_str = self.compile_stimulus_test_bench(
+                power_args)
+            args = self.write_stimulus(actions)
+            if self.skip_run:
+                return
+            log = self.directory / f'{self.circuit_name}.log'
+            subprocess_run(bin_cmd + args, cwd=self.directory,
+                           env=self.sim_env, err_str=bin_err_str,
+                           disp_type=self.disp_type, log_file=log)
+            self.post_process_get_value_actions(actions)
+            return
+
         # assemble list of sources files
         vlog_srcs = []
         if not self.ext_test_bench:
@@ -885,10 +1057,13 @@ class SystemVerilogTarget(VerilogTarget):
         subprocess_run(sim_cmd, cwd=self.directory, env=self.sim_env,
                        err_str=sim_err_str, disp_type=self.disp_type)
 
-        # run the simulation binary (if applicable)
+        # run the simulation binary (if applicable), streaming its output to
+        # a logfile
         if bin_cmd is not None:
+            log = self.directory / f'{self.circuit_name}.log'
             subprocess_run(bin_cmd, cwd=self.directory, env=self.sim_env,
-                           err_str=bin_err_str, disp_type=self.disp_type)
+                           err_str=bin_err_str, disp_type=self.disp_type,
+                           log_file=log)
 
         # post-process GetValue actions
         self.post_process_get_value_actions(actions)
@@ -912,7 +1087,10 @@ class SystemVerilogTarget(VerilogTarget):
             old_stat_result = os.stat(tb_file)
             old_times = (old_stat_result.st_atime, old_stat_result.st_mtime)
         with open(tb_file, "w") as f:
-            f.write(src)
+            if isinstance(actions, ActionStream):
+                actions.write_source(f, src)
+            else:
+                f.write(src)
         if check_timestamp:
             new_stat_result = os.stat(tb_file)
             new_times = (new_stat_result.st_atime, new_stat_result.st_mtime)
@@ -1227,4 +1405,8 @@ class SynchronousSystemVerilogTarget(SystemVerilogTarget):
         )
 
     def make_step(self, i, action):
+        if action.until is not None:
+            raise NotImplementedError(
+                "Step with until is not supported by the system-verilog "
+                "target")
         return [f"#{self.clock_step_delay * action.steps};"]
@@ -0,0 +1,315 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import fault.actions as actions
+from fault.subprocess_run import subprocess_run, error_detected
+from fault.system_verilog_target import SystemVerilogTarget
+from fault.verilator_target import VerilatorTarget
+
+
+class TestResult:
+    """
+    Outcome of running one test of a `TestSuite`
+    """
+    __test__ = False  # Tell pytest to skip this class for discovery
+
+    def __init__(self, name, actions, directory):
+        self.name = name
+        self.actions = actions
+        self.directory = directory
+        self.returncode = None
+        self.stdout = None
+        self.stderr = None
+
+    @property
+    def passed(self):
+        return self.returncode == 0
+
+    @property
+    def get_values(self):
+        """
+        The GetValue actions of this test, which are filled in once the test
+        has run
+        """
+        return [action for action in self.actions
+                if isinstance(action, actions.GetValue)]
+
+    def __str__(self):
+        status = "PASSED" if self.passed else "FAILED"
+        return f"TestResult({self.name}, {status})"
+
+    def __repr__(self):
+        return str(self)
+
+
+class _Segment:
+    """
+    Actions [start, end) shared by `tests` in the prefix tree of a
+    `TestSuite`.  The segment is simulated once, starting from the state saved
+    by its parent, and saves the state at `end` if tests branch off there.
+    """
+    def __init__(self, tests, start, end):
+        self.tests = tests
+        self.start = start
+        self.end = end
+        self.children = []
+        self.directory = None
+        self.restore_from = None
+        self.checkpoint = None
+        self.returncode = None
+        self.stdout = None
+        self.stderr = None
+
+    @property
+    def is_empty(self):
+        # only the root of the tree can be empty, when the tests don't share
+        # a prefix
+        return self.start == self.end and bool(self.children)
+
+
+class TestSuite:
+    """
+    Runs many action sequences against a single circuit.  The model is
+    compiled once and then the tests are run in parallel, each in its own
+    working directory (containing its stimulus, value file, and logs).
+
+    Example:
+
+        suite = TestSuite(circuit, directory="build", flags=["-Wno-lint"])
+        for seed in range(100):
+            tester = fault.Tester(circuit)
+            ...
+            suite.add(tester, name=f"seed_{seed}")
+        results = suite.run()
+
+    The "verilator" and "system-verilog" targets are supported (the latter
+    with the "iverilog" and "vcs" simulators, e.g.
+    `TestSuite(circuit, target="system-verilog", simulator="iverilog")`),
+    using the `runtime_stimulus` mode of the target.
+
+    With `share_prefixes`, actions shared by the beginning of several tests
+    are only simulated once: the tests are arranged in a prefix tree, the
+    state of the model is saved where tests branch off, and the runs of the
+    remaining actions start from the saved state.  This requires the
+    "verilator" target (the model is built with `savable=True`).
+    """
+    __test__ = False  # Tell pytest to skip this class for discovery
+
+    def __init__(self, circuit, target="verilator", directory="build/",
+                 processes=None, share_prefixes=False, **kwargs):
+        """
+        `circuit`: the device under test (a magma circuit)
+        `target`: the target used to compile and run the tests
+        `directory`: build directory for the model; the working directories
+        of the tests are created in `directory`/tests
+        `processes`: maximum number of tests to run at the same time
+        (defaults to the number of CPUs)
+        `share_prefixes`: simulate the common prefixes of tests once (see
+        above)
+        `kwargs`: passed on to the target constructor
+        """
+        if target not in {"verilator", "system-verilog"}:
+            raise NotImplementedError(target)
+        if share_prefixes:
+            if target != "verilator":
+                raise NotImplementedError(
+                    f"share_prefixes is not supported for {target}")
+            kwargs["savable"] = True
+        self.circuit = circuit
+        self.target = target
+        self.directory = Path(directory)
+        self.processes = processes
+        self.share_prefixes = share_prefixes
+        self.target_kwargs = kwargs
+        self.tests = []
+        self.target_obj = None
+        self.cmd = None
+        self.err_str = None
+
+    def add(self, tester, name=None):
+        """
+        Add a test, given as a Tester or as a list of actions
+        """
+        if not isinstance(tester, list):
+            tester = tester.actions
+        if name is None:
+            name = f"test_{len(self.tests)}"
+        if any(test.name == name for test in self.tests):
+            raise ValueError(f"Duplicate test name: {name}")
+        self.tests.append(TestResult(name, tester,
+                                     self.directory / "tests" / name))
+
+    def compile(self):
+        """
+        Compile the model and the test driver (only done once)
+        """
+        if self.cmd is not None:
+            return
+        if self.target == "verilator":
+            self.target_obj = VerilatorTarget(self.circuit,
+                                              directory=self.directory,
+                                              runtime_stimulus=True,
+                                              **self.target_kwargs)
+            self.target_obj.generate_stimulus_driver()
+            self.cmd = [str(self.target_obj.make_driver())]
+        else:
+            self.target_obj = SystemVerilogTarget(self.circuit,
+                                                  directory=self.directory,
+                                                  runtime_stimulus=True,
+                                                  **self.target_kwargs)
+            self.cmd, self.err_str = \
+                self.target_obj.compile_stimulus_test_bench()
+
+    def _simulate(self, args, directory):
+        """
+        Run the simulation with `args` in `directory`, returning its return
+        code (non-zero if it failed), STDOUT, and STDERR
+        """
+        target = self.target_obj
+        log = directory / f"{target.circuit_name}.log"
+        result = subprocess_run(self.cmd + args, cwd=directory,
+                                disp_type=target.disp_type,
+                                chk_ret_code=False, log_file=log)
+        returncode = result.returncode
+        # simulators report failed expects in their output rather than in
+        # the return code
+        if self.err_str is not None and not returncode:
+            with open(log, "r") as f:
+                if any(error_detected(line, self.err_str) for line in f) or \
+                        error_detected(result.stderr, self.err_str):
+                    returncode = 1
+        return returncode, result.stdout, result.stderr
+
+    def _value_file(self, directory):
+        return directory / Path(self.target_obj.value_file.name).name
+
+    def _run_test(self, test):
+        target = self.target_obj
+        # start from a clean working directory so that stale logs or value
+        # files from an earlier run are never mistaken for results
+        shutil.rmtree(test.directory, ignore_errors=True)
+        os.makedirs(test.directory)
+        args = target.write_stimulus(test.actions, test.directory)
+        test.returncode, test.stdout, test.stderr = \
+            self._simulate(args, test.directory)
+        if test.passed:
+            target.post_process_get_value_actions(
+                test.actions, self._value_file(test.directory))
+        return test
+
+    def _build_prefix_tree(self):
+        """
+        Arrange the tests in a tree of `_Segment`s.  Actions are compared by
+        their encoding in the stimulus file.
+        """
+        stimulus = self.target_obj.stimulus
+        codes = {test.name: [stimulus.encode_action(i, action)
+                             for i, action in enumerate(test.actions)]
+                 for test in self.tests}
+        segments = []
+
+        def split(tests, start):
+            end = start
+            while all(len(codes[test.name]) > end for test in tests) and \
+                    len({codes[test.name][end] for test in tests}) == 1:
+                end += 1
+            segment = _Segment(tests, start, end)
+            if len(tests) == 1:
+                segment.directory = tests[0].directory
+            else:
+                segment.directory = \
+                    self.directory / "tests" / f"_prefix_{len(segments)}"
+            segments.append(segment)
+            groups = {}
+            for test in tests:
+                if len(codes[test.name]) > end:
+                    groups.setdefault(codes[test.name][end], []).append(test)
+            segment.children = [split(group, end)
+                                for group in groups.values()]
+            return segment
+
+        return split(self.tests, 0), segments
+
+    def _run_segment(self, segment):
+        target = self.target_obj
+        actions_ = segment.tests[0].actions[segment.start:segment.end]
+        start = segment.start
+        if segment.restore_from is not None:
+            actions_ = [actions.RestoreState(segment.restore_from)] + actions_
+            start -= 1
+        if segment.children:
+            segment.checkpoint = str((segment.directory /
+                                      "state.bin").resolve())
+            actions_ = actions_ + [actions.SaveState(segment.checkpoint)]
+        args = target.write_stimulus(actions_, segment.directory, start)
+        segment.returncode, segment.stdout, segment.stderr = \
+            self._simulate(args, segment.directory)
+        if segment.returncode == 0:
+            value_file = self._value_file(segment.directory)
+            for test in segment.tests:
+                target.post_process_get_value_actions(
+                    test.actions[segment.start:segment.end], value_file)
+        return segment
+
+    def _run_shared(self, executor):
+        """
+        Run the segments of the prefix tree, one level of the tree at a time
+        """
+        root, segments = self._build_prefix_tree()
+        for path in {segment.directory for segment in segments} | \
+                {test.directory for test in self.tests}:
+            shutil.rmtree(path, ignore_errors=True)
+            os.makedirs(path)
+        level = [root]
+        while level:
+            list(executor.map(self._run_segment,
+                              [segment for segment in level
+                               if not segment.is_empty]))
+            next_level = []
+            for segment in level:
+                if segment.is_empty:
+                    segment.returncode, segment.stdout, segment.stderr = \
+                        0, "", ""
+                passed = segment.returncode == 0
+                for test in segment.tests:
+                    # the results of a test are those of the segment where
+                    # it ends or of the first failing segment on its path
+                    if not passed or len(test.actions) == segment.end:
+                        test.returncode = segment.returncode
+                        test.stdout = segment.stdout
+                        test.stderr = segment.stderr
+                if passed:
+                    for child in segment.children:
+                        if segment.is_empty:
+                            child.restore_from = segment.restore_from
+                        else:
+                            child.restore_from = segment.checkpoint
+                    next_level += segment.children
+            level = next_level
+        return self.tests
+
+    def run(self, raise_on_failure=True):
+        """
+        Run all of the tests, returning a list of TestResults in the order
+        the tests were added.  If `raise_on_failure` is True, an
+        AssertionError listing the failing tests is raised after all of the
+        tests have run.
+        """
+        self.compile()
+        # the work is done by the simulator subprocesses, so threads are
+        # enough to keep `processes` of them running at a time
+        processes = self.processes or os.cpu_count()
+        with ThreadPoolExecutor(max_workers=processes) as executor:
+            if self.share_prefixes:
+                results = self._run_shared(executor)
+            else:
+                results = list(executor.map(self._run_test, self.tests))
+        failures = [test for test in results if not test.passed]
+        if raise_on_failure and failures:
+            msg = f"{len(failures)} of {len(results)} tests failed:\n"
+            for test in failures:
+                msg += f"{test.name} (return code {test.returncode})\n"
+                msg += test.stderr + "\n"
+            raise AssertionError(msg)
+        return results
@@ -4,8 +4,15 @@ from magma.simulator.python_simulator import PythonSimulator
 from hwtypes import BitVector, SIntVector, UIntVector, Bit
 from inspect import signature
 from itertools import product
+import os
+import numpy as np
 import pytest
 import fault
+from fault.batch_simulator import BatchSimulator
+from fault.vector_store import VectorStore, VectorStoreWriter
+
+
+INT64_MAX = (1 << 63) - 1
 
 
 class TestVector:
@@ -52,124 +59,332 @@ def check(circuit, func):
 
 
 def flatten_tests(tests):
-    flattened_tests = []
-    for i in range(len(tests)):
-        flattened_tests.append(tests[i][0][:])
-        if i == 0:
-            flattened_tests[-1].extend(
-                [fault.AnyValue for _ in range(len(tests[i][1]))])
-        else:
-            flattened_tests[-1].extend(tests[i - 1][1])
-    flattened_tests.append(tests[-1][0][:])
-    flattened_tests[-1].extend(tests[-1][1])
-    return [TestVector(x) for x in flattened_tests]
+    return list(iter_flatten_tests(tests))
 
 
-@pytest.mark.skip(reason="Not a test")
-def generate_function_test_vectors(circuit, func, input_ranges=None,
-                                   mode='complete', flatten=True):
-    check(circuit, func)
+def iter_flatten_tests(tests):
+    """
+    Lazy version of `flatten_tests`, `tests` can be any iterable of
+    [inputs, outputs] pairs.
+    """
+    prev = None
+    for test in tests:
+        if prev is None:
+            outputs = [fault.AnyValue for _ in range(len(test[1]))]
+        else:
+            outputs = prev[1]
+        yield TestVector(test[0][:] + list(outputs))
+        prev = test
+    if prev is not None:
+        yield TestVector(prev[0][:] + list(prev[1]))
 
+
+def _input_args(circuit, input_ranges, strict):
+    """
+    Returns a list of (name, type, input_range) for every input of
+    `circuit`, where `type` is used to construct the values in `input_range`.
+    Unsupported inputs raise NotImplementedError if `strict` is True and are
+    skipped otherwise.
+    """
     args = []
     for i, (name, port) in enumerate(circuit.IO.items()):
         if port.is_input():
             if issubclass(port, m.Bit):
-                args.append([Bit(0), Bit(1)])
+                args.append((name, Bit, range(2)))
             elif issubclass(port, Array) and issubclass(port.T, m.Bit):
                 num_bits = port.N
                 if issubclass(port, SInt):
+                    T = SIntVector[num_bits]
                     if input_ranges is None:
-                        input_range = range(-2**(num_bits - 1),
-                                            2**(num_bits - 1))
+                        start = -2**(num_bits - 1)
+                        # We don't subtract one because range end is exclusive
+                        end = 2**(num_bits - 1)
+                        input_range = range(start, end)
                     else:
                         input_range = input_ranges[i]
-                    args.append([SIntVector[num_bits](x)
-                                 for x in input_range])
                 else:
+                    T = BitVector[num_bits]
                     if input_ranges is None:
                         input_range = range(1 << num_bits)
                     else:
                         input_range = input_ranges[i]
-                    args.append([BitVector[num_bits](x)
-                                 for x in input_range])
-            else:
+                args.append((name, T, input_range))
+            elif strict:
                 raise NotImplementedError(port, type(port))
+    return args
+
 
-    tests = []
-    for test in product(*args):
-        result = func(*list(test))
-        test = [list(test), []]
-        if isinstance(result, tuple):
-            test[-1].extend(result)
+def _column_info(circuit, names):
+    widths, kinds = [], []
+    for name in names:
+        port = circuit.IO.ports[name]
+        if issubclass(port, m.Digital):
+            widths.append(1)
+            kinds.append("bit")
         else:
-            test[-1].append(result)
-        tests.append(test)
+            widths.append(len(port))
+            kinds.append("sint" if issubclass(port, SInt) else "bits")
+    return widths, kinds
+
+
+def _output_names(circuit):
+    return [name for name, port in circuit.IO.items() if port.is_output()]
+
+
+def _iter_chunks(args, chunk_size):
+    """
+    Yields the length of every chunk of at most `chunk_size` vectors of the
+    product of the input ranges (in the same order as `itertools.product`)
+    along with one numpy array per input.  A circuit without inputs has a
+    single vector.
+
+    Vectors are indexed and inputs are stored as int64, so the product of
+    the input ranges and the input values have to fit in an int64.
+    """
+    ranges = [input_range for _, _, input_range in args]
+    shape = tuple(len(input_range) for input_range in ranges)
+    total = int(np.prod(shape, dtype=object))
+    if total > INT64_MAX:
+        raise ValueError(f"The product of the input ranges has {total} "
+                         "vectors, too many to enumerate, restrict "
+                         "`input_ranges`")
+    for (name, _, _), input_range in zip(args, ranges):
+        if isinstance(input_range, range) and len(input_range) and \
+                max(abs(input_range[0]), abs(input_range[-1])) > INT64_MAX:
+            raise ValueError(f"The values of input {name} don't fit in an "
+                             "int64")
+    for start in range(0, total, chunk_size):
+        index = np.arange(start, min(start + chunk_size, total))
+        indices = np.unravel_index(index, shape) if shape else ()
+        columns = []
+        for input_range, idx in zip(ranges, indices):
+            if isinstance(input_range, range):
+                columns.append(input_range.start +
+                               idx.astype(np.int64) * input_range.step)
+            else:
+                columns.append(np.asarray(input_range, dtype=np.int64)[idx])
+        yield len(index), columns
+
+
+def _write_chunks(writer, chunks, flatten):
+    """
+    Write chunks of (input columns, output columns) to `writer`, shifting
+    the outputs by one vector if `flatten` is True.
+    """
+    num_outputs = None
+    prev = None
+    for inputs, outputs in chunks:
+        if not flatten:
+            writer.append(inputs + outputs)
+            continue
+        num_outputs = len(outputs)
+        shifted, masks = [], []
+        for k, output in enumerate(outputs):
+            output = np.asarray(output)
+            if prev is None:
+                first = np.zeros(1, dtype=output.dtype)
+            else:
+                first = prev[1][k][-1:]
+            shifted.append(np.concatenate([first, output[:-1]]))
+            mask = np.zeros(len(output), dtype=bool)
+            mask[0] = prev is None
+            masks.append(mask)
+        writer.append(inputs + shifted, [None] * len(inputs) + masks)
+        prev = (inputs, [np.asarray(output) for output in outputs])
+    if flatten and prev is not None:
+        writer.append([column[-1:] for column in prev[0]] +
+                      [column[-1:] for column in prev[1]])
+    return num_outputs
+
+
+@pytest.mark.skip(reason="Not a test")
+def generate_function_test_vectors(circuit, func, input_ranges=None,
+                                   mode='complete', flatten=True):
+    tests = iter_function_test_vectors(circuit, func, input_ranges, mode,
+                                       flatten)
+    return list(tests)
+
+
+def iter_function_test_vectors(circuit, func, input_ranges=None,
+                               mode='complete', flatten=True):
+    """
+    Lazy version of `generate_function_test_vectors`.
+    """
+    check(circuit, func)
+
+    args = [[T(x) for x in input_range]
+            for _, T, input_range in _input_args(circuit, input_ranges,
+                                                 strict=True)]
+
+    def tests():
+        for test in product(*args):
+            result = func(*list(test))
+            test = [list(test), []]
+            if isinstance(result, tuple):
+                test[-1].extend(result)
+            else:
+                test[-1].append(result)
+            yield test
     if flatten:
-        tests = flatten_tests(tests)
+        yield from iter_flatten_tests(tests())
     else:
-        tests = [test[0] + test[1] for test in tests]
-    return tests
+        for test in tests():
+            yield test[0] + test[1]
+
+
+def write_function_test_vectors(circuit, func, directory, input_ranges=None,
+                                flatten=True, chunk_size=1 << 16,
+                                vectorized=False):
+    """
+    Evaluates `func` on the product of the input ranges `chunk_size` vectors
+    at a time and writes the results to a `VectorStore` in `directory`.
+
+    If `vectorized` is True, `func` is called once per chunk with one int64
+    numpy array per input and should return an array (or a tuple of arrays)
+    of outputs.
+
+    Returns the (memory-mapped) `VectorStore`.
+    """
+    check(circuit, func)
+    args = _input_args(circuit, input_ranges, strict=True)
+    input_names = [name for name, _, _ in args]
+    output_names = _output_names(circuit)
+    widths, kinds = _column_info(circuit, input_names + output_names)
+
+    def chunks():
+        for length, columns in _iter_chunks(args, chunk_size):
+            if vectorized:
+                with np.errstate(all='ignore'):
+                    result = func(*columns)
+                if not isinstance(result, tuple):
+                    result = (result, )
+                result = [np.broadcast_to(np.asarray(value), (length, ))
+                          for value in result]
+            else:
+                result = [[] for _ in output_names]
+                for row in range(length):
+                    values = [column[row] for column in columns]
+                    outputs = func(*(T(int(value)) for (_, T, _), value
+                                     in zip(args, values)))
+                    if not isinstance(outputs, tuple):
+                        outputs = (outputs, )
+                    for column, value in zip(result, outputs):
+                        column.append(int(value))
+                result = [np.array(column, dtype=object) for column in result]
+            yield columns, [_to_word_array(column) for column in result]
+
+    with VectorStoreWriter(directory, input_names + output_names, widths,
+                           kinds, len(input_names), flatten) as writer:
+        _write_chunks(writer, chunks(), flatten)
+    return VectorStore.load(directory)
+
+
+def _to_word_array(column):
+    """
+    Returns the integer array `column` as an int64/uint64 numpy array.
+    """
+    column = np.asarray(column)
+    if column.dtype == object:
+        return np.array([int(value) & ((1 << 64) - 1) for value in column],
+                        dtype=np.uint64)
+    if column.dtype == bool:
+        return column.astype(np.uint64)
+    return column
 
 
 def generate_simulator_test_vectors(circuit, input_ranges=None,
                                     mode='complete', flatten=True):
-    ntest = len(circuit.interface.ports.items())
+    return list(iter_simulator_test_vectors(circuit, input_ranges, mode,
+                                            flatten))
+
 
+def iter_simulator_test_vectors(circuit, input_ranges=None, mode='complete',
+                                flatten=True):
+    """
+    Lazy version of `generate_simulator_test_vectors`.
+    """
     simulator = PythonSimulator(circuit)
 
-    args = []
-    for i, (name, port) in enumerate(circuit.IO.items()):
-        if port.is_input():
-            if issubclass(port, m.Bit):
-                args.append([Bit(0), Bit(1)])
-            elif issubclass(port, Array) and issubclass(port.T, m.Bit):
-                num_bits = port.N
-                if issubclass(port, SInt):
-                    if input_ranges is None:
-                        start = -2**(num_bits - 1)
-                        # We don't subtract one because range end is exclusive
-                        end = 2**(num_bits - 1)
-                        input_range = range(start, end)
-                    else:
-                        input_range = input_ranges[i]
-                    args.append([SIntVector[num_bits](x)
-                                 for x in input_range])
-                else:
-                    if input_ranges is None:
-                        input_range = range(1 << num_bits)
-                    else:
-                        input_range = input_ranges[i]
-                    args.append([BitVector[num_bits](x)
-                                 for x in input_range])
-            else:
-                assert True, "can't test Tuples"
-
-    tests = []
-    for test in product(*args):
-        testv = [list(test), []]
-        j = 0
-        for i, (name, port) in enumerate(circuit.IO.items()):
-            if port.is_input():
-                val = test[j]
-                if isinstance(val, BitVector):
-                    val = test[j].as_bool_list()
-                simulator.set_value(getattr(circuit, name), val)
-                j += 1
-
-        simulator.evaluate()
-
-        for i, (name, port) in enumerate(circuit.IO.items()):
-            if port.is_output():
-                val = simulator.get_value(getattr(circuit, name))
-                if issubclass(port, Array) and \
-                        not issubclass(port, (Bits, SInt, UInt)):
-                    val = BitVector[len(port)](val)
-                testv[1].append(val)
-
-        tests.append(testv)
+    args = [[T(x) for x in input_range]
+            for _, T, input_range in _input_args(circuit, input_ranges,
+                                                 strict=False)]
+
+    def tests():
+        for test in product(*args):
+            testv = [list(test), []]
+            j = 0
+            for i, (name, port) in enumerate(circuit.IO.items()):
+                if port.is_input():
+                    val = test[j]
+                    if isinstance(val, BitVector):
+                        val = test[j].as_bool_list()
+                    simulator.set_value(getattr(circuit, name), val)
+                    j += 1
+
+            simulator.evaluate()
+
+            for i, (name, port) in enumerate(circuit.IO.items()):
+                if port.is_output():
+                    val = simulator.get_value(getattr(circuit, name))
+                    if issubclass(port, Array) and \
+                            not issubclass(port, (Bits, SInt, UInt)):
+                        val = BitVector[len(port)](val)
+                    testv[1].append(val)
+
+            yield testv
 
     if flatten:
-        tests = flatten_tests(tests)
+        yield from iter_flatten_tests(tests())
     else:
-        tests = [test[0] + test[1] for test in tests]
+        for test in tests():
+            yield test[0] + test[1]
+
+
+def write_simulator_test_vectors(circuit, directory, input_ranges=None,
+                                 flatten=True, chunk_size=1 << 16):
+    """
+    Simulates the product of the input ranges `chunk_size` vectors at a time
+    using `BatchSimulator` and writes the results to a `VectorStore` in
+    `directory`.
+
+    Returns the (memory-mapped) `VectorStore`.
+    """
+    os.makedirs(directory, exist_ok=True)
+    prefix = os.path.join(directory, circuit.name)
+    m.compile(prefix, circuit, output="coreir")
+
+    args = _input_args(circuit, input_ranges, strict=False)
+    input_names = [name for name, _, _ in args]
+    output_names = _output_names(circuit)
+    widths, kinds = _column_info(circuit, input_names + output_names)
+
+    def chunks():
+        simulator = None
+        for length, columns in _iter_chunks(args, chunk_size):
+            if simulator is None or simulator.batch_size != length:
+                simulator = BatchSimulator(f"{prefix}.json", length)
+            for name, column in zip(input_names, columns):
+                simulator.set_value(name, column.astype(np.uint64))
+            simulator.evaluate()
+            yield columns, [simulator.get_value(name)
+                            for name in output_names]
+
+    with VectorStoreWriter(directory, input_names + output_names, widths,
+                           kinds, len(input_names), flatten) as writer:
+        _write_chunks(writer, chunks(), flatten)
+    return VectorStore.load(directory)
+
+
+def generate_batch_test_vectors(circuit, input_ranges=None,
+                                mode='complete', flatten=True,
+                                directory="build/"):
+    """
+    Same as `generate_simulator_test_vectors`, but simulates every input
+    combination at once using `BatchSimulator`.
+    """
+    store = write_simulator_test_vectors(circuit, directory, input_ranges,
+                                         flatten, chunk_size=1 << 62)
+    tests = list(store)
+    if not flatten:
+        tests = [test.test_vector for test in tests]
     return tests
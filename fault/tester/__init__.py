@@ -1,5 +1,5 @@
 from .base import TesterBase
 from .staged_tester import Tester
 from .symbolic_tester import SymbolicTester
-from .interactive_tester import PythonTester
+from .interactive_tester import PythonTester, VerilatorTester
 from .synchronous import SynchronousTester
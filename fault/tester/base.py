@@ -6,6 +6,7 @@ from ..wrapper import CircuitWrapper, PortWrapper
 from ..select_path import SelectPath
 from ..wrapped_internal_port import WrappedVerilogInternalPort
 from ..magma_utils import is_recursive_type
+from .utils import Caller
 import inspect
 from hwtypes import BitVector
 
@@ -20,8 +21,8 @@ class TesterBase:
         `reset`: optional, a port from `circuit` corresponding to the reset
         `expect_strict_default`: if True, use strict equality check if
         not specified by the user.
-        `debug_mode`: if True, use `inspect` module to store calling frame
-        information for debugging (slow performance for large test benches)
+        `debug_mode`: if True, store the file and line of the caller of each
+        expect for debugging
         """
         if hasattr(circuit, "circuit_definition"):
             circuit = circuit.circuit_definition
@@ -153,11 +154,11 @@ class TesterBase:
         if strict is None:
             strict = self.expect_strict_default
         if self.debug_mode and caller is None:
-            try:
-                previous_frame = inspect.currentframe().f_back
-                caller = inspect.getframeinfo(previous_frame)
-            except IndexError:
-                pass
+            # only the location is captured, `inspect.getframeinfo` reads
+            # the source of the caller which is slow for large test benches
+            previous_frame = inspect.currentframe().f_back
+            caller = Caller(previous_frame.f_code.co_filename,
+                            previous_frame.f_lineno)
 
         def recurse(port):
             if isinstance(value, dict):
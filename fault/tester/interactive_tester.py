@@ -1,3 +1,5 @@
+import ctypes
+from pathlib import Path
 import magma as m
 from magma.simulator import PythonSimulator
 from magma.scope import Scope
@@ -8,6 +10,7 @@ from ..value_utils import make_value
 from hwtypes import BitVector, Bit
 from ..wrapper import PortWrapper
 from ..magma_utils import is_recursive_type
+import fault.actions as actions
 
 
 class InteractiveTester(TesterBase):
@@ -132,3 +135,152 @@ class PythonTester(InteractiveTester):
 
     def advance_cycle(self):
         self.step(2)
+
+
+class VerilatorTester(InteractiveTester):
+    """
+    Interactive tester that drives a verilated model in-process.  The model
+    is built once as a shared library and loaded with ctypes, so actions are
+    executed immediately and Python code can react to the outputs of the
+    circuit cycle by cycle without regenerating a driver.
+
+    Only top-level digital ports of at most 64 bits are supported.
+    """
+    def __init__(self, circuit, clock=None, directory="build/", flags=None,
+                 trace_file=None, **kwargs):
+        """
+        `directory`, `flags`, and `**kwargs` are passed on to VerilatorTarget
+        to build the model.
+
+        `trace_file`: if given, dump the waveforms to this file (the model has
+        to be built with the --trace flag, see the `trace_format` option of
+        VerilatorTarget)
+        """
+        from ..verilator_target import VerilatorTarget
+        from ..runtime_stimulus import RuntimeStimulus
+        super().__init__(circuit, clock)
+        flags = list(flags) if flags is not None else []
+        # build the driver as a shared library instead of an executable
+        flags += ["-CFLAGS", "-fPIC", "-LDFLAGS", "-shared"]
+        self.target = VerilatorTarget(self._circuit, directory=directory,
+                                      flags=flags, **kwargs)
+        self.stimulus = RuntimeStimulus(self._circuit)
+        src = self.stimulus.generate_library(self.target.circuit_name,
+                                             self.target.runtime_includes(),
+                                             self.target.tracing)
+        self.target.write_driver(src)
+        self.lib = ctypes.CDLL(str(self.target.make_driver()))
+        self.lib.fault_open.argtypes = [ctypes.c_char_p]
+        self.lib.fault_open.restype = ctypes.c_void_p
+        self.lib.fault_close.argtypes = [ctypes.c_void_p]
+        self.lib.fault_eval.argtypes = [ctypes.c_void_p]
+        self.lib.fault_step.argtypes = [ctypes.c_void_p, ctypes.c_uint32,
+                                        ctypes.c_uint32]
+        self.lib.fault_get.argtypes = [ctypes.c_void_p, ctypes.c_uint32,
+                                       ctypes.c_uint8, ctypes.c_uint64]
+        self.lib.fault_get.restype = ctypes.c_uint64
+        self.lib.fault_set.argtypes = [ctypes.c_void_p, ctypes.c_uint32,
+                                       ctypes.c_uint8, ctypes.c_uint64,
+                                       ctypes.c_uint64]
+        if trace_file is not None:
+            trace_file = str(Path(trace_file).resolve()).encode()
+        self.handle = self.lib.fault_open(trace_file)
+
+    def close(self):
+        """
+        Finish the simulation (flushing the trace file, if any).
+        """
+        if self.handle is not None:
+            self.lib.fault_close(self.handle)
+            self.handle = None
+
+    def __del__(self):
+        if getattr(self, "handle", None) is not None:
+            self.close()
+
+    def eval(self):
+        self.lib.fault_eval(self.handle)
+
+    def _poke(self, port, value, delay=None):
+        if delay is not None:
+            raise NotImplementedError("delay is not supported by "
+                                      "VerilatorTester")
+        index, shift, width = self.stimulus._make_ref(port)
+        value = self.stimulus._to_int(value, width)
+        self.lib.fault_set(self.handle, index, shift, (1 << width) - 1,
+                           value)
+
+    def _get_value(self, port):
+        if isinstance(port, (int, BitVector, Bit)):
+            return port
+        if isinstance(port, actions.Peek):
+            port = port.port
+        if isinstance(port, PortWrapper):
+            port = port.select_path
+        leaf = port[-1] if isinstance(port, SelectPath) else port
+        if isinstance(leaf, m.Tuple):
+            return tuple(self._get_value(elem) for elem in leaf)
+        if isinstance(leaf, m.Array) and not issubclass(leaf.T, m.Digital):
+            return [self._get_value(elem) for elem in leaf]
+        index, shift, width = self.stimulus._make_ref(port)
+        result = self.lib.fault_get(self.handle, index, shift,
+                                    (1 << width) - 1)
+        if isinstance(leaf, m.Digital):
+            return Bit(result)
+        return BitVector[width](result)
+
+    def _expect(self, port, value, strict=None, caller=None, **kwargs):
+        got = self._get_value(port)
+        if isinstance(value, (actions.Peek, PortWrapper)):
+            expected = self._get_value(value)
+        else:
+            width = self.stimulus._make_ref(port)[2]
+            expected = type(got)(self.stimulus._to_int(value, width))
+        port, _ = _process_port(port)
+        assert got == expected, \
+            f"Port {port.debug_name}: got {got}, expected {expected}"
+
+    def peek(self, port):
+        return self._get_value(port)
+
+    def print(self, format_str, *args):
+        values = tuple(int(self._get_value(port)) for port in args)
+        print(format_str % values, end="")
+
+    def assert_(self, expr, msg=""):
+        assert expr, msg
+
+    def delay(self, time):
+        raise NotImplementedError("delay is not supported by VerilatorTester, "
+                                  "use step to advance the simulation")
+
+    def get_value(self, port):
+        """
+        Returns the current value of `port` as an int, like the `value` of
+        the GetValue actions of the other testers (read with `fault_get`).
+        """
+        value = self._get_value(port)
+        if isinstance(value, (BitVector, Bit)):
+            return int(value)
+        return value
+
+    def step(self, steps=1):
+        """
+        Step the clock `steps` times.
+        """
+        if self.clock is None:
+            raise RuntimeError("Stepping tester without a clock (did you "
+                               "specify a clock during initialization?)")
+        index, _, _ = self.stimulus._make_ref(self.clock)
+        self.lib.fault_step(self.handle, index, steps)
+
+    def wait_until_low(self, signal):
+        while self.peek(signal):
+            self.step()
+
+    def wait_until_high(self, signal):
+        while not self.peek(signal):
+            self.step()
+
+    def advance_cycle(self):
+        self.step(2)
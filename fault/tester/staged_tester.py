@@ -15,11 +15,13 @@ except ModuleNotFoundError:
     MagmaSimulatorTarget = None
     pass
 from fault.vector_builder import VectorBuilder
+from fault.action_list import CompactActionList
 from fault.value_utils import make_value
 from fault.verilator_target import VerilatorTarget
 from fault.system_verilog_target import SystemVerilogTarget
 from fault.verilogams_target import VerilogAMSTarget
 from fault.spice_target import SpiceTarget
+from fault.batch_simulator_target import BatchSimulatorTarget
 from fault.actions import Loop, While, If
 from fault.circuit_utils import check_interface_is_subset
 from fault.wrapper import PortWrapper
@@ -33,6 +35,7 @@ from fault.config import get_test_dir
 import tempfile
 import pysv
 from hwtypes import BitVector
+import numpy as np
 
 
 def _cond_type_check(fn):
@@ -80,7 +83,8 @@ class Tester(TesterBase):
 
     def __init__(self, circuit: m.Circuit, clock: m.Clock = None,
                  reset: m.Reset = None, poke_delay_default=None,
-                 expect_strict_default=True, monitors=None):
+                 expect_strict_default=True, monitors=None, debug_mode=False,
+                 compact_actions=False):
         """
         `circuit`: the device under test (a magma circuit)
         `clock`: optional, a port from `circuit` corresponding to the clock
@@ -89,9 +93,15 @@ class Tester(TesterBase):
         at None, the target-specific default will be used.
         `expect_strict_default`: if True, use strict equality check if
         not specified by the user.
+        `debug_mode`: if True, record the file and line of each expect
+        `compact_actions`: if True, store `self.actions` in a
+        `CompactActionList` to reduce the memory used by long tests
         """
         super().__init__(circuit, clock, reset, poke_delay_default,
-                         expect_strict_default)
+                         expect_strict_default, debug_mode)
+        self.compact_actions = compact_actions
+        if compact_actions:
+            self.actions = CompactActionList()
         self.init_clock()
         self.targets = {}
         # For public verilator modules
@@ -115,7 +125,7 @@ class Tester(TesterBase):
         corresponding target object.
 
         Supported values of target: "verilator", "coreir", "python",
-            "system-verilog", "verilog-ams"
+            "system-verilog", "verilog-ams", "spice", "batch"
         """
         if target == "verilator":
             return VerilatorTarget(self._circuit, **kwargs)
@@ -137,11 +147,15 @@ class Tester(TesterBase):
             return VerilogAMSTarget(self._circuit, **kwargs)
         elif target == "spice":
             return SpiceTarget(self._circuit, **kwargs)
+        elif target == "batch":
+            return BatchSimulatorTarget(self._circuit, clock=self.clock,
+                                        **kwargs)
         raise NotImplementedError(target)
 
     def _poke(self, port, value, delay=None):
+        # numpy arrays hold one value per vector for the "batch" target
         if not isinstance(value, (LoopIndex, actions.FileRead,
-                                  expression.Expression)):
+                                  expression.Expression, np.ndarray)):
             type_ = get_port_type(port)
             value = make_value(type_, value)
         self.actions.append(actions.Poke(port, value, delay=delay))
@@ -169,7 +183,8 @@ class Tester(TesterBase):
     def _expect(self, port, value, strict=None, caller=None, **kwargs):
         # implement expect
         if not isinstance(value, (actions.Peek, PortWrapper, actions.FileRead,
-                                  LoopIndex, expression.Expression)):
+                                  LoopIndex, expression.Expression,
+                                  np.ndarray)):
             type_ = get_port_type(port)
             value = make_value(type_, value)
         self.actions.append(actions.Expect(port=port, value=value,
@@ -197,14 +212,24 @@ class Tester(TesterBase):
         self.actions.append(action)
         return action
 
-    def step(self, steps=1):
+    def step(self, steps=1, until=None, trace=True):
         """
         Step the clock `steps` times.
+
+        `until`: a signal or expression that is checked after every step; the
+        remaining steps are skipped once it is true (e.g. to wait for a done
+        signal with a timeout of `steps`)
+
+        `trace`: if False, waveforms are not dumped while stepping, so long
+        idle periods don't bloat the trace
+
+        `until` and `trace` are supported by the Verilator target, which
+        generates a loop for the steps.
         """
         if self.clock is None:
             raise RuntimeError("Stepping tester without a clock (did you "
                                "specify a clock during initialization?)")
-        self.actions.append(actions.Step(self.clock, steps))
+        self.actions.append(actions.Step(self.clock, steps, until, trace))
 
     def serialize(self):
         """
@@ -215,6 +240,20 @@ class Tester(TesterBase):
             builder.process(action)
         return builder.vectors
 
+    def serialize_to(self, directory, chunk_size=4096):
+        """
+        Serialize the action sequence into a set of test vectors stored in
+        `directory` (see `fault.vector_store.VectorStore`), vectors are
+        streamed to disk in chunks of `chunk_size`.
+
+        Returns the memory-mapped `VectorStore`.
+        """
+        builder = VectorBuilder(self._circuit, directory=directory,
+                                chunk_size=chunk_size)
+        for action in self.actions:
+            builder.process(action)
+        return builder.close()
+
     def _make_directory(self, directory):
         """
         Handles support for `set_test_dir('callee_file_dir')`
@@ -284,6 +323,27 @@ class Tester(TesterBase):
             args += (self.verilator_includes, )
         return target_obj.generate_test_bench(*args)
 
+    def stream_to(self, target="verilator", **kwargs):
+        """
+        Compile `target` and stream the code for every action recorded from
+        now on straight to the build directory instead of keeping the actions
+        in memory (see fault/action_stream.py).  Actions that were already
+        recorded are written first.  Call `run(target)` to finish the test
+        bench and run it.
+
+        Only the "verilator" and "system-verilog" targets are supported, and
+        `self.actions` only holds the `GetValue` actions afterwards.
+        """
+        self.compile(target, **kwargs)
+        target_obj = self.targets[target]
+        if not hasattr(target_obj, "open_stream"):
+            raise NotImplementedError(
+                f"Target {target} does not support action streams")
+        stream = target_obj.open_stream()
+        stream.extend(self.actions)
+        self.actions = stream
+        return stream
+
     def _compile_and_run(self, target="verilator", **kwargs):
         """
         Compile and run the current action sequence using `target`, assuming
@@ -318,9 +378,12 @@ class Tester(TesterBase):
         # Check that the interface of self._circuit is a subset of new_circuit
         check_interface_is_subset(self._circuit, new_circuit)
 
-        new_tester = Tester(new_circuit, clock)
+        new_tester = Tester(new_circuit, clock,
+                            compact_actions=self.compact_actions)
         new_tester.actions = [action.retarget(new_circuit, clock) for action in
                               self.actions]
+        if self.compact_actions:
+            new_tester.actions = CompactActionList(new_tester.actions)
         return new_tester
 
     def clear(self):
@@ -328,7 +391,10 @@ class Tester(TesterBase):
         Reset the tester by removing any existing actions. Useful for reusing a
         Tester (e.g. one with verilator already compiled).
         """
-        self.actions = []
+        if self.compact_actions:
+            self.actions = CompactActionList()
+        else:
+            self.actions = []
 
     def __str__(self):
         """
@@ -512,5 +578,33 @@ class Tester(TesterBase):
     def finish(self):
         self.actions.append(actions.Finish())
 
+    def save_state(self, file_name):
+        """
+        Save the state of the simulation to `file_name`.  A later test can
+        start from this point with `restore_state` instead of simulating the
+        same actions again (requires a target built with `savable=True`).
+        """
+        self.actions.append(actions.SaveState(file_name))
+
+    def restore_state(self, file_name):
+        """
+        Restore the state of the simulation saved with `save_state`
+        """
+        self.actions.append(actions.RestoreState(file_name))
+
+    def start_trace(self):
+        """
+        Start dumping waveforms again after `stop_trace`
+        """
+        self.actions.append(actions.TraceControl(True))
+
+    def stop_trace(self):
+        """
+        Stop dumping waveforms, e.g. during the uninteresting part of a long
+        simulation (supported by the Verilator target, see also its
+        `trace_window` option)
+        """
+        self.actions.append(actions.TraceControl(False))
+
 
 StagedTester = Tester
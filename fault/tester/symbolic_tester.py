@@ -1,3 +1,4 @@
+import random
 import fault
 from .staged_tester import Tester
 from fault.wrapper import Wrapper, PortWrapper, InstanceWrapper
@@ -7,7 +8,8 @@ except ImportError:
     # Optional dependency
     pass
 import fault.actions as actions
-from fault.random import ConstrainedRandomGenerator
+from fault.random import (ConstrainedRandomGenerator,
+                          constrained_random_sampler)
 
 
 class SymbolicWrapper(Wrapper):
@@ -64,10 +66,20 @@ class SymbolicInstanceWrapper(InstanceWrapper):
 
 class SymbolicTester(Tester):
     def __init__(self, circuit, clock=None, num_tests=100,
-                 random_strategy="rejection"):
+                 random_strategy="rejection", random_seed=None):
+        """
+        `random_strategy`: how random values satisfying the assumptions are
+        generated, one of "rejection", "smt", "adaptive" (see
+        `fault.random.ConstrainedRandomSampler`) or "runtime" (the verilator
+        harness draws and checks the values itself, falling back to
+        "rejection" for assumptions that can't be compiled to C++)
+        `random_seed`: seed of the harness PRNG for the "runtime" strategy,
+        by default drawn from `random`
+        """
         super().__init__(circuit, clock)
         self.num_tests = num_tests
         self.random_strategy = random_strategy
+        self.random_seed = random_seed
 
     def assume(self, port, constraint):
         """
@@ -84,6 +96,14 @@ class SymbolicTester(Tester):
             gen = ConstrainedRandomGenerator()
             action.randvals = iter(gen(v, constraint, self.num_tests))
             action.has_randvals = True
+        elif self.random_strategy == "adaptive":
+            # rejection sampling, falling back to a solver for constraints
+            # with a low hit rate
+            port = port[-1]
+            v = {str(port.name): len(port)}
+            sampler = constrained_random_sampler(v, constraint)
+            action.randvals = iter(sampler.sample(self.num_tests))
+            action.has_randvals = True
         self.actions.append(action)
 
     def guarantee(self, port, constraint):
@@ -101,8 +121,14 @@ class SymbolicTester(Tester):
 
     def run(self, target="verilator"):
         if target == "verilator":
-            self.targets[target].run(self.actions, self.verilator_includes,
-                                     self.num_tests, self._circuit)
+            random_seed = self.random_seed
+            if random_seed is None:
+                random_seed = random.getrandbits(64)
+            self.targets[target].run(
+                self.actions, self.verilator_includes, self.num_tests,
+                self._circuit,
+                runtime_random=self.random_strategy == "runtime",
+                random_seed=random_seed)
         elif target == "pono":
             self.targets[target].run(self.actions)
         else:
@@ -11,3 +11,15 @@ def get_port_type(port):
     if isinstance(port, Var):
         return port._type
     return type(port)
+
+
+class Caller:
+    """
+    Location of a call to the tester (has the `filename` and `lineno`
+    attributes of `inspect.FrameInfo`)
+    """
+    __slots__ = ('filename', 'lineno')
+
+    def __init__(self, filename, lineno):
+        self.filename = filename
+        self.lineno = lineno
@@ -1,21 +1,88 @@
-from hwtypes import BitVector
+import numpy as np
+from hwtypes import BitVector, Bit
 import magma
 import fault.actions as actions
-from fault.value_utils import make_value
+from fault.array import Array
 from fault.value import AnyValue
+from fault.ms_types import RealType
+from fault.vector_store import (VectorStore, VectorStoreWriter, num_words,
+                                decode, is_object, WORD_MASK, _to_int)
 
 
 class VectorBuilder:
-    def __init__(self, circuit):
+    """
+    Builds test vectors (one value per port, or AnyValue) from a sequence of
+    actions, starting a new vector on every Eval.
+
+    Vectors are stored in a columnar `VectorStore` with one column per leaf
+    port (nested arrays are split into their elements), filled `chunk_size`
+    vectors at a time.  If `directory` is given, the chunks are streamed to a
+    `VectorStoreWriter` instead of being kept in memory, see `close`.
+
+    Values that can't be encoded (e.g. `UnknownValue` or `Peek` expressions)
+    are kept in the `objects` of the store.
+    """
+    def __init__(self, circuit, directory=None, chunk_size=4096):
         self.circuit = circuit
         self.port_to_index = {}
         for i, port in enumerate(self.circuit.interface.ports.values()):
             self.port_to_index[port] = i
-        self.vectors = [self.__empty_vector()]
 
-    def __empty_vector(self):
-        ports = self.circuit.interface.ports
-        return [make_value(type(port), AnyValue) for port in ports.values()]
+        # leaf columns, circuit inputs first (the directions of the
+        # interface ports are flipped, so circuit outputs are "inputs")
+        self.types = {}
+        leaves = []
+        for i, port in enumerate(self.circuit.interface.ports.values()):
+            self.__add_leaves((i, ), type(port), leaves)
+        leaves.sort(key=lambda leaf: leaf[1].is_input())
+        self.leaf_index = {path: k for k, (path, _) in enumerate(leaves)}
+        names, widths, kinds = [], [], []
+        ports = list(self.circuit.interface.ports.keys())
+        for path, type_ in leaves:
+            names.append(".".join([ports[path[0]]] +
+                                  [str(i) for i in path[1:]]))
+            if issubclass(type_, RealType):
+                widths.append(64)
+                kinds.append("real")
+            elif issubclass(type_, magma.Digital):
+                widths.append(1)
+                kinds.append("bit")
+            else:
+                widths.append(len(type_))
+                kinds.append("bits")
+        num_inputs = sum(not type_.is_input() for _, type_ in leaves)
+        if directory is None:
+            self.writer = None
+            self.store = VectorStore(names, widths, kinds, num_inputs)
+        else:
+            self.writer = VectorStoreWriter(directory, names, widths, kinds,
+                                            num_inputs)
+            self.store = self.writer.store
+        # expected outputs are cleared on every eval
+        self.outputs = [k for k, (_, type_) in enumerate(leaves)
+                        if type_.is_input()]
+
+        self.chunk_size = chunk_size
+        self.buffers = [np.zeros((chunk_size, num_words(width)),
+                                 dtype=np.uint64) for width in widths]
+        self.buffer_masks = [np.zeros(chunk_size, dtype=bool)
+                             for _ in widths]
+        self.buffer_length = 0
+        self.length = 0
+        self.current = [AnyValue for _ in leaves]
+
+    def __add_leaves(self, path, type_, leaves):
+        self.types[path] = type_
+        if isinstance(type_, magma.MagmaProtocolMeta):
+            type_ = type_._to_magma_()
+        if issubclass(type_, magma.Array) and \
+                not issubclass(type_.T, magma.Digital):
+            for i in range(type_.N):
+                self.__add_leaves(path + (i, ), type_.T, leaves)
+        elif issubclass(type_, (magma.Digital, magma.Array, RealType)):
+            leaves.append((path, type_))
+        else:
+            raise NotImplementedError(type_)
 
     def __indices(self, port):
         if port in self.port_to_index:
@@ -25,24 +92,160 @@ class VectorBuilder:
             return (*indices, port.name.index)
         raise NotImplementedError(port, type(port))
 
+    def __to_int(self, value, width, kind="bits"):
+        if value is AnyValue or is_object(value):
+            return value
+        if kind == "real":
+            # real columns hold the bits of a double, also for int values
+            if isinstance(value, (BitVector, Bit)):
+                value = int(value)
+            return _to_int(float(value))
+        if isinstance(value, float):
+            return _to_int(value)
+        return _to_int(value) & ((1 << width) - 1)
+
     def __get(self, indices):
-        out = self.vectors[-1]
-        for idx in indices:
-            out = out[idx]
-        return out
+        if indices in self.leaf_index:
+            return self.current[self.leaf_index[indices]]
+        if len(indices) > 1 and indices[:-1] in self.leaf_index:
+            value = self.current[self.leaf_index[indices[:-1]]]
+            if value is AnyValue or is_object(value):
+                return value
+            return (value >> indices[-1]) & 1
+        raise NotImplementedError(indices)
 
     def __set(self, indices, value):
-        parent = self.vectors[-1]
-        for idx in indices[:-1]:
-            parent = parent[idx]
-        parent[indices[-1]] = value
+        if indices in self.leaf_index:
+            k = self.leaf_index[indices]
+            self.current[k] = self.__to_int(value, self.store.widths[k],
+                                            self.store.kinds[k])
+        elif len(indices) > 1 and indices[:-1] in self.leaf_index:
+            # a single bit of a leaf
+            k = self.leaf_index[indices[:-1]]
+            if is_object(value):
+                raise NotImplementedError(indices, value)
+            old = self.current[k]
+            if old is AnyValue or is_object(old):
+                old = 0
+            bit = 1 << indices[-1]
+            if self.__to_int(value, 1):
+                self.current[k] = old | bit
+            else:
+                self.current[k] = old & ~bit
+        elif indices in self.types:
+            # nested array
+            for i in range(self.types[indices].N):
+                if isinstance(value, (Array, list)):
+                    elem = value[i]
+                else:
+                    elem = value
+                self.__set(indices + (i, ), elem)
+        else:
+            raise NotImplementedError(indices)
 
     def __eval(self):
-        self.vectors.append(self.vectors[-1].copy())
-        for port in self.circuit.interface.ports.values():
-            if port.is_input():
-                index = self.port_to_index[port]
-                self.vectors[-1][index] = make_value(type(port), AnyValue)
+        self.__append(self.current)
+        for k in self.outputs:
+            self.current[k] = AnyValue
+
+    def __append(self, vector):
+        row = self.buffer_length
+        for k, (buffer, mask, value) in enumerate(zip(self.buffers,
+                                                      self.buffer_masks,
+                                                      vector)):
+            if value is AnyValue or is_object(value):
+                if value is not AnyValue:
+                    self.store.objects[(k, self.length)] = value
+                mask[row] = True
+                buffer[row] = 0
+                continue
+            mask[row] = False
+            if buffer.shape[1] == 1:
+                buffer[row, 0] = value
+            else:
+                for word in range(buffer.shape[1]):
+                    buffer[row, word] = (value >> (64 * word)) & WORD_MASK
+        self.buffer_length += 1
+        self.length += 1
+        if self.buffer_length == self.chunk_size:
+            self.__flush()
+
+    def __flush(self):
+        if self.buffer_length == 0:
+            return
+        data = [buffer[:self.buffer_length].copy()
+                for buffer in self.buffers]
+        masks = [mask[:self.buffer_length].copy()
+                 for mask in self.buffer_masks]
+        if self.writer is None:
+            self.store.extend(data, masks)
+        else:
+            self.writer.write(data, masks)
+        self.buffer_length = 0
+
+    def __decode(self, vector):
+        def build(path):
+            if path in self.leaf_index:
+                k = self.leaf_index[path]
+                if vector[k] is AnyValue or is_object(vector[k]):
+                    return vector[k]
+                return decode(self.store.kinds[k], self.store.widths[k],
+                              vector[k])
+            N = self.types[path].N
+            return Array([build(path + (i, )) for i in range(N)], N)
+        return [build((i, )) for i in range(len(self.port_to_index))]
+
+    @property
+    def vectors(self):
+        """
+        The vectors built so far (including the current one) as lists of
+        values, nested arrays are returned as `fault.array.Array`s.
+        """
+        if self.writer is not None:
+            raise RuntimeError("Vectors were streamed to "
+                               f"{self.writer.directory}")
+        self.__flush()
+        self.store.consolidate()
+        vectors = []
+        for row in range(len(self.store)):
+            vector = [self.store.objects.get((k, row), AnyValue)
+                      if self.store.masks[k][row] else
+                      sum(int(word) << (64 * i) for i, word in
+                          enumerate(self.store.columns[k][row]))
+                      for k in range(len(self.store.names))]
+            vectors.append(self.__decode(vector))
+        vectors.append(self.__decode(self.current))
+        return vectors
+
+    def to_store(self):
+        """
+        Returns a `VectorStore` holding the vectors built so far, including
+        the current one.
+        """
+        if self.writer is not None:
+            raise RuntimeError("Vectors were streamed to "
+                               f"{self.writer.directory}")
+        self.__flush()
+        self.store.consolidate()
+        store = VectorStore(self.store.names, self.store.widths,
+                            self.store.kinds, self.store.num_inputs)
+        store.columns = list(self.store.columns)
+        store.masks = list(self.store.masks)
+        store.objects = dict(self.store.objects)
+        store.append_vector(self.current)
+        return store
+
+    def close(self):
+        """
+        Finish streaming vectors (including the current one) to the
+        directory, returns the memory-mapped `VectorStore`.
+        """
+        self.__append(self.current)
+        self.__flush()
+        self.writer.close()
+        store = VectorStore.load(self.writer.directory)
+        store.objects = self.store.objects
+        return store
 
     def process(self, action):
         if isinstance(action, (actions.Poke, actions.Expect)):
@@ -51,10 +254,14 @@ class VectorBuilder:
         elif isinstance(action, actions.Eval):
             self.__eval()
         elif isinstance(action, actions.Step):
+            if action.until is not None:
+                raise NotImplementedError(action)
             indices = self.__indices(action.clock)
             val = self.__get(indices)
+            if val is AnyValue:
+                val = 0
             for step in range(action.steps):
-                val ^= BitVector[1](1)
+                val ^= 1
                 self.__eval()
                 self.__set(indices, val)
         elif isinstance(action, actions.Print):
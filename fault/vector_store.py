@@ -0,0 +1,386 @@
+"""
+Compact columnar storage for test vectors.
+
+A `VectorStore` holds one column per port.  Every column is a uint64 array of
+shape (num_vectors, words), where `words` is the number of 64-bit words
+needed for the width of the port, along with a boolean mask that is True for
+entries that are `AnyValue` (don't care).  Entries that can't be encoded
+as numbers, such as `UnknownValue`, `HiZ` or expected values that are
+expressions (e.g. `Peek`s), are masked and kept as Python objects in
+`VectorStore.objects`.
+
+Stores can be saved to a directory containing a `vectors.json` header and two
+raw files per column (`<k>.data` and `<k>.mask`), and loaded back as
+memory-mapped arrays, so that very long vector sets don't have to fit in
+memory.  `VectorStoreWriter` appends chunks of vectors straight to disk.
+`objects` are not saved.
+"""
+import json
+import os
+import struct
+from pathlib import Path
+import numpy as np
+from hwtypes import BitVector, SIntVector, Bit
+from fault.value import AnyValue
+
+
+HEADER = "vectors.json"
+WORD_MASK = (1 << 64) - 1
+
+
+def num_words(width):
+    return max((width + 63) // 64, 1)
+
+
+def encode_column(values, width, length=None):
+    """
+    Returns `values` as a uint64 array of shape (len(values), words).
+    `values` is either a numpy integer array, or a sequence of ints/hwtypes
+    values.  Scalars are broadcast to `length` rows.
+    """
+    words = num_words(width)
+    if isinstance(values, np.ndarray):
+        if values.ndim == 2:
+            return values.astype(np.uint64)
+        # negative values are stored in two's complement
+        data = values.astype(np.int64).astype(np.uint64)
+        if width < 64:
+            data &= np.uint64((1 << width) - 1)
+        if words == 1:
+            return data.reshape(-1, 1)
+        result = np.zeros((len(data), words), dtype=np.uint64)
+        result[:, 0] = data
+        if np.issubdtype(values.dtype, np.signedinteger):
+            # sign extend into the upper words
+            negative = values < 0
+            result[negative, 1:] = np.uint64(WORD_MASK)
+            top = width - 64 * (words - 1)
+            if top < 64:
+                result[:, -1] &= np.uint64((1 << top) - 1)
+        return result
+    if length is not None:
+        values = [values] * length
+    result = np.zeros((len(values), words), dtype=np.uint64)
+    for row, value in enumerate(values):
+        value = _to_int(value) & ((1 << width) - 1)
+        for word in range(words):
+            result[row, word] = (value >> (64 * word)) & WORD_MASK
+    return result
+
+
+def _to_int(value):
+    if value is AnyValue:
+        return 0
+    if isinstance(value, BitVector):
+        return value.as_uint()
+    if isinstance(value, float):
+        # real values are stored as the bits of a double
+        return struct.unpack("<Q", struct.pack("<d", value))[0]
+    return int(value)
+
+
+def is_object(value):
+    """
+    Returns True if `value` can't be encoded in a column.
+    """
+    return not (value is AnyValue or
+                isinstance(value, (BitVector, Bit, int, float, np.integer)))
+
+
+def decode(kind, width, value):
+    """
+    Returns the unsigned int `value` as a value of `kind`.
+    """
+    if kind == "bit":
+        return Bit(value)
+    if kind == "sint":
+        return SIntVector[width](value)
+    if kind == "real":
+        return struct.unpack("<d", struct.pack("<Q", value))[0]
+    return BitVector[width](value)
+
+
+class VectorStore:
+    """
+    Columnar test vectors.  `names`, `widths` and `kinds` describe the
+    columns, where a kind is one of "bit", "bits", "sint" or "real" (used to
+    decode entries back into `Bit`, `BitVector`, `SIntVector` and float
+    values).  The first `num_inputs` columns are circuit inputs, the rest are
+    outputs.
+
+    If `flattened` is True, the outputs of a vector are the expected outputs
+    for the inputs of the previous vector (see `flatten_tests`).
+
+    `objects` maps (column, row) to the entries that can't be encoded (see
+    `is_object`), which are masked in the column.
+    """
+    def __init__(self, names, widths, kinds=None, num_inputs=None,
+                 flattened=False):
+        self.names = list(names)
+        self.widths = list(widths)
+        if kinds is None:
+            kinds = ["bits"] * len(self.names)
+        self.kinds = list(kinds)
+        if num_inputs is None:
+            num_inputs = len(self.names)
+        self.num_inputs = num_inputs
+        self.flattened = flattened
+        self.columns = [np.zeros((0, num_words(width)), dtype=np.uint64)
+                        for width in self.widths]
+        self.masks = [np.zeros(0, dtype=bool) for _ in self.widths]
+        self.objects = {}
+        self._pending = []
+
+    @classmethod
+    def from_header(cls, header):
+        return cls(header["names"], header["widths"], header["kinds"],
+                   header["num_inputs"], header["flattened"])
+
+    def header(self, length):
+        return {"names": self.names, "widths": self.widths,
+                "kinds": self.kinds, "num_inputs": self.num_inputs,
+                "flattened": self.flattened, "length": length}
+
+    def encode(self, columns, masks=None):
+        """
+        Encode a chunk of vectors, given as one sequence of values per
+        column.  Entries that are `AnyValue` are added to the mask.
+        """
+        length = None
+        for column in columns:
+            if isinstance(column, (np.ndarray, list, tuple)):
+                length = len(column)
+                break
+        if length is None:
+            length = 1
+        data, mask_data = [], []
+        for k, column in enumerate(columns):
+            if isinstance(column, (np.ndarray, list, tuple)):
+                data.append(encode_column(column, self.widths[k]))
+                if isinstance(column, np.ndarray):
+                    mask = np.zeros(length, dtype=bool)
+                else:
+                    mask = np.array([value is AnyValue for value in column],
+                                    dtype=bool)
+            else:
+                data.append(encode_column(column, self.widths[k], length))
+                mask = np.full(length, column is AnyValue, dtype=bool)
+            if masks is not None and masks[k] is not None:
+                mask |= np.asarray(masks[k], dtype=bool)
+            mask_data.append(mask)
+        return data, mask_data
+
+    def append(self, columns, masks=None):
+        """
+        Append a chunk of vectors (see `encode`).
+        """
+        self.extend(*self.encode(columns, masks))
+
+    def extend(self, data, masks):
+        """
+        Append a chunk of encoded columns and masks.
+        """
+        self._pending.append((data, masks))
+
+    def append_vector(self, vector):
+        """
+        Append a single vector, given as a list of values.
+        """
+        row = len(self)
+        for k, value in enumerate(vector):
+            if is_object(value):
+                self.objects[(k, row)] = value
+        self.append([[AnyValue if is_object(value) else value]
+                     for value in vector])
+
+    def consolidate(self):
+        """
+        Merge the chunks appended since the last call into the columns.
+        """
+        if not self._pending:
+            return
+        for k in range(len(self.names)):
+            self.columns[k] = np.concatenate(
+                [self.columns[k]] + [data[k] for data, _ in self._pending])
+            self.masks[k] = np.concatenate(
+                [self.masks[k]] + [mask[k] for _, mask in self._pending])
+        self._pending = []
+
+    def __len__(self):
+        if not self.names:
+            return 0
+        return len(self.columns[0]) + sum(len(data[0])
+                                          for data, _ in self._pending)
+
+    def value(self, column, row):
+        """
+        Returns entry `row` of `column` as a hwtypes value (or AnyValue, or
+        the object stored for the entry).
+        """
+        self.consolidate()
+        if self.masks[column][row]:
+            return self.objects.get((column, row), AnyValue)
+        value = 0
+        for word, data in enumerate(self.columns[column][row]):
+            value |= int(data) << (64 * word)
+        return decode(self.kinds[column], self.widths[column], value)
+
+    def vector(self, row):
+        return [self.value(column, row) for column in range(len(self.names))]
+
+    def __iter__(self):
+        from fault.test_vectors import TestVector
+        for row in range(len(self)):
+            yield TestVector(self.vector(row))
+
+    def __getitem__(self, row):
+        from fault.test_vectors import TestVector
+        return TestVector(self.vector(row))
+
+    def __eq__(self, other):
+        if isinstance(other, VectorStore):
+            if len(self) != len(other) or self.names != other.names:
+                return False
+            self.consolidate()
+            other.consolidate()
+            return all(np.array_equal(a, b) for a, b in
+                       zip(self.masks + self.columns,
+                           other.masks + other.columns)) and \
+                not self._object_mismatches(other)
+        return list(self) == list(other)
+
+    def mismatches(self, other):
+        """
+        Returns the indices of the vectors that differ between `self` and
+        `other` (which must have the same columns and length).
+        """
+        if self.names != other.names or len(self) != len(other):
+            raise ValueError("Vector stores have different shapes")
+        self.consolidate()
+        other.consolidate()
+        differ = np.zeros(len(self), dtype=bool)
+        for k in range(len(self.names)):
+            differ |= self.masks[k] != other.masks[k]
+            equal = (self.columns[k] == other.columns[k]).all(axis=1)
+            differ |= ~self.masks[k] & ~equal
+        for _, row in self._object_mismatches(other):
+            differ[row] = True
+        return np.nonzero(differ)[0]
+
+    def _object_mismatches(self, other):
+        # objects are compared by identity, expressions overload __eq__
+        keys = set(self.objects) | set(other.objects)
+        return [key for key in keys
+                if self.objects.get(key) is not other.objects.get(key)]
+
+    def save(self, directory):
+        """
+        Write the store to `directory`, see `load`.
+        """
+        with VectorStoreWriter(directory, self.names, self.widths,
+                               self.kinds, self.num_inputs,
+                               self.flattened) as writer:
+            self.consolidate()
+            writer.write(self.columns, self.masks)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Load a store written by `save` or `VectorStoreWriter`.  If `mmap` is
+        True, the columns are read-only memory-mapped arrays.
+        """
+        directory = Path(directory)
+        with open(directory / HEADER, "r") as f:
+            header = json.load(f)
+        store = cls.from_header(header)
+        length = header["length"]
+        for k, width in enumerate(store.widths):
+            shape = (length, num_words(width))
+            if length == 0:
+                continue
+            if mmap:
+                store.columns[k] = np.memmap(directory / f"{k}.data",
+                                             dtype="<u8", mode="r",
+                                             shape=shape)
+                store.masks[k] = np.memmap(directory / f"{k}.mask",
+                                           dtype=bool, mode="r",
+                                           shape=(length, ))
+            else:
+                store.columns[k] = np.fromfile(
+                    directory / f"{k}.data", dtype="<u8").reshape(shape)
+                store.masks[k] = np.fromfile(directory / f"{k}.mask",
+                                             dtype=bool)
+        return store
+
+    def apply(self, tester):
+        """
+        Add actions to `tester` that poke the inputs of every vector and
+        expect the outputs.
+        """
+        ports = tester._circuit.interface.ports
+        ports = [ports[name] for name in self.names]
+        for row in range(len(self)):
+            vector = self.vector(row)
+            inputs = zip(ports[:self.num_inputs], vector[:self.num_inputs])
+            outputs = zip(ports[self.num_inputs:], vector[self.num_inputs:])
+            if self.flattened:
+                # outputs are the results of the previous inputs
+                for port, value in outputs:
+                    if value is not AnyValue:
+                        tester.expect(port, value)
+            for port, value in inputs:
+                if value is not AnyValue:
+                    tester.poke(port, value)
+            tester.eval()
+            if not self.flattened:
+                for port, value in outputs:
+                    if value is not AnyValue:
+                        tester.expect(port, value)
+
+
+class VectorStoreWriter:
+    """
+    Streams chunks of vectors to `directory` in the format read by
+    `VectorStore.load`.  The header is written by `close`.
+    """
+    def __init__(self, directory, names, widths, kinds=None, num_inputs=None,
+                 flattened=False):
+        self.directory = Path(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.store = VectorStore(names, widths, kinds, num_inputs, flattened)
+        self.length = 0
+        self.files = [(open(self.directory / f"{k}.data", "wb"),
+                       open(self.directory / f"{k}.mask", "wb"))
+                      for k in range(len(self.store.names))]
+
+    def write(self, columns, masks):
+        """
+        Write encoded columns and masks (see `VectorStore.encode`).
+        """
+        for (data_file, mask_file), data, mask in zip(self.files, columns,
+                                                      masks):
+            np.ascontiguousarray(data, dtype="<u8").tofile(data_file)
+            np.ascontiguousarray(mask, dtype=bool).tofile(mask_file)
+        if columns:
+            self.length += len(columns[0])
+
+    def append(self, columns, masks=None):
+        """
+        Append a chunk of vectors, given as one sequence of values per
+        column.
+        """
+        self.write(*self.store.encode(columns, masks))
+
+    def close(self):
+        for data_file, mask_file in self.files:
+            data_file.close()
+            mask_file.close()
+        self.files = []
+        with open(self.directory / HEADER, "w") as f:
+            json.dump(self.store.header(self.length), f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -4,24 +4,31 @@ import magma as m
 from .util import (is_valid_file_mode, file_mode_allows_reading,
                    file_mode_allows_writing)
 import fault.actions as actions
-from fault.actions import Poke, Eval, FileOpen, FileClose, GetValue, Loop, If
+from fault.actions import (Poke, Eval, FileOpen, FileClose, GetValue, Loop,
+                           If, Var)
 from fault.verilog_target import VerilogTarget
 from fault.verilog_utils import verilator_name
 import fault.value_utils as value_utils
 from fault.verilator_utils import (verilator_make_cmd, verilator_comp_cmd,
-                                   verilator_version)
+                                   verilator_version, VerilatorTrace)
 from fault.select_path import SelectPath
 from fault.wrapper import PortWrapper, InstanceWrapper
 import math
 from hwtypes import BitVector, AbstractBitVectorMeta, Bit, SIntVector
 from fault.random import constrained_random_bv
+from fault.cxx_predicate import compile_predicate
 from fault.subprocess_run import subprocess_run
+from fault.build_cache import hash_parts
+from fault.runtime_stimulus import RuntimeStimulus
+from fault.action_stream import ActionStream, MARKER
 from fault.ms_types import RealType
 import fault.utils as utils
 import fault.expression as expression
 import platform
 import os
+import logging
 import glob
+import shutil
 import pysv
 
 
@@ -59,21 +66,13 @@ void write_coverage() {{
 
 #endif
 
-#if VM_TRACE
-VerilatedVcdC* tracer;
-#endif
+{trace_declarations}
 
 int main(int argc, char **argv) {{
   Verilated::commandArgs(argc, argv);
   V{circuit_name}* top = new V{circuit_name};
   {start_code}
-#if VM_TRACE
-  Verilated::traceEverOn(true);
-  tracer = new VerilatedVcdC;
-  top->trace(tracer, 99);
-  mkdir("logs", S_IRWXU | S_IRWXG | S_IROTH | S_IXOTH);
-  tracer->open("logs/{circuit_name}.vcd");
-#endif
+{trace_open}
 
 {main_body}
 
@@ -92,6 +91,21 @@ int main(int argc, char **argv) {{
 """  # nopep8
 
 
+shard_tpl = """\
+#include "math.h"
+{includes}
+
+extern vluint64_t main_time;
+{trace_declarations}
+{declarations}
+
+int {function}(V{circuit_name}* top) {{
+{body}
+  return 0;
+}}
+"""
+
+
 class VerilatorTarget(VerilogTarget):
 
     # Language properties of C used in generating code blocks
@@ -105,7 +119,11 @@ class VerilatorTarget(VerilogTarget):
                  circuit_name=None, magma_opts=None, skip_verilator=False,
                  disp_type='on_error', coverage=False, use_kratos=False,
                  defines=None, parameters=None, ext_model_file=None,
-                 use_pysv=False):
+                 use_pysv=False, use_build_cache=False, build_cache_dir=None,
+                 runtime_stimulus=False, loop_compression=False,
+                 driver_shards=None, perf_mode=False, threads=None,
+                 compile_cache=True, compile_cache_dir=None, savable=False,
+                 trace_format="vcd", trace_depth=None, trace_window=None):
         """
         Params:
             `include_verilog_libraries`: a list of verilog libraries to include
@@ -115,6 +133,68 @@ class VerilatorTarget(VerilogTarget):
             `include_directories`: a list of directories to include using the
             -I flag. From the the verilator docs:
                 -I<dir>                    Directory to search for includes
+
+            `use_build_cache`: if True, reuse the verilated model (obj_dir) and
+            its compiled objects from a previous build with identical Verilog
+            sources, flags, defines, parameters, and Verilator version.
+
+            `build_cache_dir`: location of the persistent build cache
+            (defaults to the `build_cache_dir` option of the fault config
+            file, or ~/.cache/fault)
+
+            `runtime_stimulus`: if True, compile a generic driver that reads
+            the actions from a stimulus file at runtime instead of generating
+            code for them.  The driver only needs to be built once per
+            circuit, so running new action sequences does not require
+            recompiling.  Only pokes, expects, evals, steps, prints, and
+            GetValue on top-level ports of at most 64 bits are supported.
+
+            `loop_compression`: if True, emit runs of pokes, expects, evals,
+            and steps that only differ in the poked/expected values as loops
+            over static data tables instead of unrolling them, which shrinks
+            the generated driver and its compile time.
+
+            `driver_shards`: if set to N > 1, split the code generated for
+            the actions across N functions in separate source files, so that
+            `make -j` can compile them in parallel.  Actions that declare
+            variables or open files (other than the GetValue file) must stay
+            in a single function, so if any are present all actions go into
+            the first shard.
+
+            `perf_mode`: if True, build an optimized model for large designs:
+            Verilator -O3 with fast X assignment/initialization, generated
+            C++ split into smaller files, and the model compiled with
+            OPT_FAST=-O3 in parallel.  Unless `threads` is given, the model
+            is multithreaded with up to 4 threads.
+
+            `threads`: number of threads used by the verilated model
+            (--threads).
+
+            `compile_cache`: if True (default), reuse the Verilog generated
+            by magma for the same circuit and `magma_opts` by an earlier
+            target in this process instead of compiling the circuit again.
+
+            `compile_cache_dir`: if given, the generated Verilog is also
+            cached in this directory, keyed by a hash of the circuit
+            definition, so that it is reused across processes.
+
+            `savable`: if True, build the model with --savable, so that the
+            state of the simulation can be saved to a file (SaveState) and
+            later simulations can start from it (RestoreState).  Relative file
+            names are relative to the target directory.
+
+            `trace_format`: format of the waveforms dumped when the model is
+            built with the --trace flag, "vcd" (logs/<circuit>.vcd) or "fst"
+            (logs/<circuit>.fst, compressed and much smaller for long runs).
+
+            `trace_depth`: if given, only trace this many levels of the
+            hierarchy (--trace-depth).
+
+            `trace_window`: if given, a (start, stop) pair of simulation times
+            outside of which no values are dumped (`stop` may be None).  Each
+            clock toggle advances the time by 5, so a clock cycle takes 10.
+            Tracing can also be stopped and restarted at specific actions with
+            `tester.stop_trace()` and `tester.start_trace()`.
         """
 
         # Set defaults
@@ -148,7 +228,11 @@ class VerilatorTarget(VerilogTarget):
         # Call super constructor
         super().__init__(circuit, circuit_name, directory, skip_compile,
                          include_verilog_libraries, magma_output, magma_opts,
-                         coverage=coverage)
+                         coverage=coverage, use_build_cache=use_build_cache,
+                         build_cache_dir=build_cache_dir,
+                         loop_compression=loop_compression,
+                         compile_cache=compile_cache,
+                         compile_cache_dir=compile_cache_dir)
 
         # Determine the path to the Verilog file being tested
         if ext_model_file is not None:
@@ -158,7 +242,41 @@ class VerilatorTarget(VerilogTarget):
 
         self.use_pysv = use_pysv
 
+        self.runtime_stimulus = runtime_stimulus
+        if runtime_stimulus:
+            if use_kratos or use_pysv:
+                raise NotImplementedError(
+                    "runtime_stimulus does not support kratos or pysv")
+            self.stimulus = RuntimeStimulus(circuit, savable=savable)
+
+        if driver_shards is not None and driver_shards <= 1:
+            driver_shards = None
+        if driver_shards is not None and \
+                (use_kratos or use_pysv or runtime_stimulus):
+            raise NotImplementedError(
+                "driver_shards does not support kratos, pysv, or "
+                "runtime_stimulus")
+        self.driver_shards = driver_shards
+        self.driver_shard_srcs = []
+
+        self.savable = savable
+        if savable:
+            flags = (flags if flags is not None else []) + ["--savable"]
+
+        self.tracing = VerilatorTrace(trace_format, trace_depth, trace_window)
+        flags = self.tracing.flags(flags)
+
+        if perf_mode and threads is None:
+            threads = min(4, os.cpu_count() or 1)
+        self.perf_mode = perf_mode
+        self.threads = threads
+
+        # The version is part of the build cache key, so query it first
+        self.verilator_version = verilator_version(disp_type=self.disp_type)
+
         # Compile the design using `verilator`, if not skip
+        self.build_key = None
+        self.build_objects_cached = False
         if not skip_verilator:
             driver_file = self.directory / Path(
                 f"{self.circuit_name}_driver.cpp")
@@ -167,20 +285,84 @@ class VerilatorTarget(VerilogTarget):
                 verilog_filename=verilog_filename,
                 include_verilog_libraries=self.include_verilog_libraries,
                 include_directories=include_directories,
-                driver_filename=driver_file.name,
+                driver_filename=[driver_file.name] + self.shard_file_names,
                 verilator_flags=flags,
                 coverage=self.coverage,
                 use_kratos=use_kratos,
                 defines=defines,
                 parameters=parameters,
-                use_pysv=use_pysv
+                use_pysv=use_pysv,
+                threads=threads,
+                perf_mode=perf_mode
             )
-            # shell=True since 'verilator' is actually a shell script
-            subprocess_run(comp_cmd, cwd=self.directory, shell=True,
-                           disp_type=self.disp_type)
+            if self.build_cache is not None:
+                self.build_key = self.make_build_key(
+                    comp_cmd, verilog_filename, include_directories)
+            if not self.fetch_build():
+                # shell=True since 'verilator' is actually a shell script
+                subprocess_run(comp_cmd, cwd=self.directory, shell=True,
+                               disp_type=self.disp_type)
+                if self.build_key is not None:
+                    self.build_cache.store(self.build_key, self.obj_dir)
+
+    @property
+    def obj_dir(self):
+        return self.directory / "obj_dir"
+
+    @property
+    def shard_file_names(self):
+        return [f"{self.circuit_name}_driver_{k}.cpp"
+                for k in range(self.driver_shards or 0)]
+
+    def shard_function(self, k):
+        return f"{self.circuit_name}_shard_{k}"
+
+    def make_build_key(self, comp_cmd, verilog_filename, include_directories):
+        """
+        Hash everything that determines the contents of obj_dir: the
+        verilator command line, the Verilator version, and the contents of
+        the Verilog sources and include directories.
+        """
+        sources = [self.directory / verilog_filename]
+        sources += [self.directory / lib
+                    for lib in self.include_verilog_libraries]
+        for dir_ in (include_directories or []):
+            dir_ = self.directory / dir_
+            if dir_.is_dir():
+                sources += sorted(path for path in dir_.iterdir()
+                                  if path.is_file())
+        return hash_parts('verilator', self.verilator_version, comp_cmd,
+                          sources)
+
+    def fetch_build(self):
+        """
+        Restore obj_dir from the build cache, returning False on a miss.
+        """
+        if self.build_key is None or not self.build_cache.has(self.build_key):
+            return False
+        # Headers left over from a different model would be picked up by
+        # generate_code, so start from a clean obj_dir
+        shutil.rmtree(self.obj_dir, ignore_errors=True)
+        self.build_cache.fetch(self.build_key, self.obj_dir)
+        self.build_objects_cached = any(self.obj_dir.glob("*.o"))
+        return True
+
+    def store_build_objects(self):
+        """
+        After the first successful make, add the compiled model objects to the
+        cache entry so later builds only need to compile the driver.
+        """
+        if self.build_key is None or self.build_objects_cached:
+            return
+        driver_prefix = f"{self.circuit_name}_driver"
+        exe = f"V{self.circuit_name}"
 
-        # Initialize variables
-        self.verilator_version = verilator_version(disp_type=self.disp_type)
+        def ignore(src, names):
+            return {name for name in names
+                    if name.startswith(driver_prefix) or name == exe}
+
+        self.build_cache.store(self.build_key, self.obj_dir, ignore=ignore)
+        self.build_objects_cached = True
 
     def _make_assert(self, got, expected, i, port, user_msg,
                      below=None, above=None, style='hex'):
@@ -526,25 +708,52 @@ if (!({cond})) {{
             ]
 
     def make_eval(self, i, action):
-        return ["top->eval();", "#if VM_TRACE", "tracer->dump(main_time);",
+        return ["top->eval();", "#if VM_TRACE", "fault_trace_dump();",
                 "main_time++;", "#endif"]
 
     def make_step(self, i, action):
         name = verilator_name(action.clock.name)
         code = []
         code.append("top->eval();")
-        for step in range(action.steps):
-            code.append("#if VM_TRACE")
-            code.append("tracer->dump(main_time);")
-            code.append("#endif")
-            code.append(f"top->{name} ^= 1;")
-            code.append("top->eval();")
-            code.append("main_time += 5;")
-        return code
+        return code + self.make_clock_steps(action, f"top->{name} ^= 1;")
+
+    def make_clock_steps(self, action, toggle):
+        """
+        Code for the steps of `action`, where `toggle` toggles the clock.
+        Short steps are unrolled, other steps (and steps with `until` or
+        without tracing) are emitted as a loop, so their code size doesn't
+        depend on the number of steps.
+        """
+        body = []
+        if action.trace:
+            body += ["#if VM_TRACE", "fault_trace_dump();", "#endif"]
+        body += [toggle, "top->eval();", "main_time += 5;"]
+        if action.until is None and action.trace and action.steps <= 2:
+            return body * action.steps
+        if action.until is not None:
+            until = action.until
+            if isinstance(until, (m.Digital, m.Array)):
+                until = actions.Peek(until)
+            body += [f"if ({self.compile_expression(until)}) break;"]
+        return ([f"for (int fault_step = 0; fault_step < {action.steps}; "
+                 f"fault_step++) {{"] +
+                [f"  {line}" for line in body] +
+                ["}"])
 
     def make_join(self, i, action):
         raise NotImplementedError("fork/join not implemented for Verilator")
 
+    def make_table(self, name, table):
+        rows = [', '.join(f'0x{value:x}' for value in row) for row in table]
+        code = [f'static const uint64_t {name}[{len(table)}]'
+                f'[{len(table[0])}] = {{']
+        code += [f'{self.TAB}{{{row}}},' for row in rows]
+        code += ['};']
+        return code
+
+    def make_table_entry(self, name, row, n_cols, column):
+        return f'{name}[{row}][{column}]'
+
     def make_file_open(self, i, action):
         # make sure the file mode is supported
         if not is_valid_file_mode(action.file.mode):
@@ -668,7 +877,35 @@ if (!({expr_str})) {{
     def make_finish(self, i, action):
         return ["top->final(); exit(0);"]
 
-    def generate_code(self, actions, verilator_includes, num_tests, circuit):
+    def _check_savable(self, action):
+        if not self.savable:
+            raise ValueError(f"{action} requires a VerilatorTarget built "
+                             f"with savable=True")
+
+    def make_save_state(self, i, action):
+        self._check_savable(action)
+        return ["{",
+                "  VerilatedSave os;",
+                f'  os.open("{action.file_name}");',
+                "  os << main_time;",
+                "  os << *top;",
+                "}"]
+
+    def make_restore_state(self, i, action):
+        self._check_savable(action)
+        return ["{",
+                "  VerilatedRestore os;",
+                f'  os.open("{action.file_name}");',
+                "  os >> main_time;",
+                "  os >> *top;",
+                "}"]
+
+    def make_trace_control(self, i, action):
+        enable = "true" if action.enable else "false"
+        return ["#if VM_TRACE", f"fault_trace_enabled = {enable};", "#endif"]
+
+    def generate_code(self, actions, verilator_includes, num_tests, circuit,
+                      runtime_random=False, random_seed=0):
         if verilator_includes:
             # Include the top circuit by default
             verilator_includes.insert(
@@ -680,7 +917,7 @@ if (!({expr_str})) {{
             '"verilated.h"',
             '<iostream>',
             '<fstream>',
-            '<verilated_vcd_c.h>',
+            self.tracing.header,
             '<sys/types.h>',
             '<sys/stat.h>',
         ]
@@ -690,22 +927,48 @@ if (!({expr_str})) {{
 
         # if we're using the GetValue feature, then we need to open/close a
         # file in which GetValue results will be written
-        if any(isinstance(action, GetValue) for action in actions):
+        if not isinstance(actions, ActionStream) and \
+                any(isinstance(action, GetValue) for action in actions):
             actions = [FileOpen(self.value_file)] + actions
             actions += [FileClose(self.value_file)]
 
-        main_body = ""
-        for i, action in enumerate(actions):
-            code = self.generate_action_code(i, action)
-            for line in code:
-                main_body += f"  {line}\n"
-
-        for i in range(num_tests):
-            main_body += self.add_assumptions(circuit, actions, i)
-            code = self.make_eval(i, Eval())
-            for line in code:
-                main_body += f"  {line}\n"
-            main_body += self.add_guarantees(circuit, actions, i)
+        if isinstance(actions, ActionStream):
+            # the code was already generated, `generate_test_bench` replaces
+            # the marker with it
+            if num_tests > 0:
+                raise NotImplementedError(
+                    "Action streams do not support assumptions and "
+                    "guarantees")
+            main_body = f"{MARKER}\n"
+            shard_bodies = []
+        elif self.driver_shards is None:
+            main_body = ""
+            for i, action in self.enumerate_actions(actions):
+                code = self.generate_action_code(i, action)
+                for line in code:
+                    main_body += f"  {line}\n"
+            shard_bodies = []
+        else:
+            main_body, shard_bodies = self.generate_shard_bodies(actions)
+
+        random_loop = None
+        if num_tests > 0 and runtime_random:
+            try:
+                random_loop = self.make_random_test_loop(
+                    circuit, actions, num_tests, random_seed)
+            except NotImplementedError as e:
+                logging.warning(f"Could not compile the assumptions ({e}), "
+                                "generating the random values in Python")
+        if random_loop is not None:
+            includes += ['<random>']
+            main_body += random_loop
+        else:
+            for i in range(num_tests):
+                main_body += self.add_assumptions(circuit, actions, i)
+                code = self.make_eval(i, Eval())
+                for line in code:
+                    main_body += f"  {line}\n"
+                main_body += self.add_guarantees(circuit, actions, i)
 
         # Add includes from sub-modules (for internal wire selects).
         headers = glob.glob(os.path.join(self.directory, "obj_dir") + "/V*.h")
@@ -714,8 +977,33 @@ if (!({expr_str})) {{
 
         if self.coverage:
             includes += ["\"verilated_cov.h\""]
+        if self.savable:
+            includes += ["\"verilated_save.h\""]
 
         includes_src = "\n".join(["#include " + i for i in includes])
+
+        # sources for the driver shards, which are called in order by main
+        self.driver_shard_srcs = []
+        if shard_bodies:
+            declarations = ""
+            globals_src = ""
+            if any(isinstance(action, GetValue) for action in actions):
+                fd_var = self.fd_var(self.value_file)
+                declarations += f"extern FILE *{fd_var};\n"
+                globals_src += f"FILE *{fd_var};\n"
+            for k, body in enumerate(shard_bodies):
+                function = self.shard_function(k)
+                globals_src += f"int {function}(V{self.circuit_name}* top);\n"
+                self.driver_shard_srcs.append(shard_tpl.format(
+                    includes=includes_src,
+                    trace_declarations=self.tracing.extern_declarations(),
+                    declarations=declarations,
+                    function=function,
+                    circuit_name=self.circuit_name,
+                    body=body
+                ))
+            includes_src += "\n" + globals_src
+
         if self.use_kratos:
             includes_src += "\nvoid initialize_runtime();\n"
             includes_src += "void teardown_runtime();\n"
@@ -731,6 +1019,8 @@ if (!({expr_str})) {{
 
         src = src_tpl.format(
             includes=includes_src,
+            trace_declarations=self.tracing.declarations(),
+            trace_open=self.tracing.open_code(self.circuit_name),
             main_body=main_body,
             circuit_name=self.circuit_name,
             start_code=start_code,
@@ -740,23 +1030,175 @@ if (!({expr_str})) {{
         return src
 
     def generate_test_bench(self, actions, verilator_includes=None,
-                            num_tests=0, _circuit=None):
+                            num_tests=0, _circuit=None, runtime_random=False,
+                            random_seed=0):
         # Set default
         if verilator_includes is None:
             verilator_includes = []
         # Write the verilator driver to file.
         src = self.generate_code(actions, verilator_includes, num_tests,
-                                 _circuit)
+                                 _circuit, runtime_random, random_seed)
         driver_file = self.directory / Path(f"{self.circuit_name}_driver.cpp")
         with open(driver_file, "w") as f:
-            f.write(src)
+            if isinstance(actions, ActionStream):
+                actions.write_source(f, src)
+            else:
+                f.write(src)
+        # Only rewrite shards that changed, so make only recompiles those
+        for name, shard_src in zip(self.shard_file_names,
+                                   self.driver_shard_srcs):
+            shard_file = self.directory / name
+            if not shard_file.is_file() or shard_file.read_text() != shard_src:
+                with open(shard_file, "w") as f:
+                    f.write(shard_src)
         return driver_file
 
-    def run(self, actions, verilator_includes=None, num_tests=0,
-            _circuit=None):
+    def open_stream(self):
+        if self.driver_shards is not None or self.runtime_stimulus or \
+                self.use_kratos:
+            raise NotImplementedError(
+                "Action streams do not support driver_shards, "
+                "runtime_stimulus, or kratos")
+        return super().open_stream(indent="  ")
+
+    def generate_shard_bodies(self, actions):
+        """
+        Split the code for `actions` into `driver_shards` contiguous chunks
+        of similar size.  Returns the code that main runs (opening and closing
+        the GetValue file and calling the shards) and the body of each shard.
+        """
+        main_body = ""
+        items = []
+        for i, action in self.enumerate_actions(actions):
+            is_value_file = isinstance(action, (FileOpen, FileClose)) and \
+                action.file is self.value_file
+            if is_value_file and isinstance(action, FileOpen):
+                # the file descriptor is a global shared with the shards
+                fd_var = self.fd_var(self.value_file)
+                err_msg = f'Could not open file {self.value_file.name}'
+                code = self.generate_action_code(i, [
+                    f'{fd_var} = fopen("{self.value_file.name}", '
+                    f'"{self.value_file.mode}");',
+                    If(f'{fd_var} == NULL', [
+                        f'std::cout << "{err_msg}" << std::endl;',
+                        f'return 1;'
+                    ])
+                ])
+                main_body += "".join(f"  {line}\n" for line in code)
+            elif not is_value_file:
+                code = self.generate_action_code(i, action)
+                items.append((action, [f"  {line}\n" for line in code]))
+
+        n_shards = self.driver_shards
+        if any(isinstance(action, (FileOpen, Var))
+               for action, _ in items):
+            # declarations have to be visible to all later actions
+            chunks = [items] + [[] for _ in range(n_shards - 1)]
+        else:
+            # fill the shards greedily with a similar number of lines each
+            total = sum(len(code) for _, code in items)
+            chunks = [[] for _ in range(n_shards)]
+            k = 0
+            size = 0
+            for item in items:
+                if size >= total * (k + 1) / n_shards and k < n_shards - 1:
+                    k += 1
+                chunks[k].append(item)
+                size += len(item[1])
+
+        shard_bodies = []
+        for k, chunk in enumerate(chunks):
+            shard_bodies.append("".join(line for _, code in chunk
+                                        for line in code))
+            # shards return non-zero if an action failed (e.g. opening a
+            # file)
+            main_body += (f"  if (int rc = {self.shard_function(k)}(top)) "
+                          f"return rc;\n")
+        if any(isinstance(action, GetValue) for action in actions):
+            main_body += f"  fclose({self.fd_var(self.value_file)});\n"
+        return main_body, shard_bodies
 
-        self.generate_test_bench(actions, verilator_includes, num_tests,
-                                 _circuit)
+    def runtime_includes(self):
+        """
+        Includes for the generic drivers that don't generate code for the
+        actions (see fault/runtime_stimulus.py).
+        """
+        includes = [
+            f'"V{self.circuit_name}.h"',
+            '"verilated.h"',
+            self.tracing.header,
+            '<cstdint>',
+            '<cstdio>',
+            '<cstdlib>',
+            '<cstring>',
+            '<iostream>',
+            '<string>',
+            '<vector>',
+            '<sys/types.h>',
+            '<sys/stat.h>',
+        ]
+        if self.coverage:
+            includes += ["\"verilated_cov.h\""]
+        if self.savable:
+            includes += ["\"verilated_save.h\""]
+        return includes
+
+    def write_driver(self, src):
+        driver_file = self.directory / Path(f"{self.circuit_name}_driver.cpp")
+        # Only rewrite the driver when it changes, otherwise make would
+        # recompile it for every run
+        if not driver_file.is_file() or driver_file.read_text() != src:
+            with open(driver_file, "w") as f:
+                f.write(src)
+        return driver_file
+
+    def generate_stimulus_driver(self):
+        src = self.stimulus.generate_driver(self.circuit_name,
+                                            self.runtime_includes(),
+                                            self.tracing)
+        return self.write_driver(src)
+
+    def make_driver(self):
+        """
+        Build the driver executable using the makefile created by verilator
+        and return its path.
+        """
+        make_cmd = verilator_make_cmd(self.circuit_name,
+                                      perf_mode=self.perf_mode)
+        subprocess_run(make_cmd, cwd=self.directory, disp_type=self.disp_type)
+        self.store_build_objects()
+        return (self.obj_dir / f"V{self.circuit_name}").resolve()
+
+    def write_stimulus(self, actions, directory=None, start=None):
+        """
+        Encode `actions` into a stimulus file in `directory` (defaults to the
+        target directory) and return the arguments for the driver executable.
+        `start` is the index reported for the first action in failure
+        messages.
+        """
+        directory = self.directory if directory is None else Path(directory)
+        stimulus_file = directory / f"{self.circuit_name}_stimulus.bin"
+        if start is None:
+            # match the action indices reported by the generated driver,
+            # which opens the value file before running the actions
+            start = 1 if any(isinstance(action, GetValue)
+                             for action in actions) else 0
+        self.stimulus.write(actions, stimulus_file, start)
+        value_file = directory / Path(self.value_file.name).name
+        return [str(stimulus_file.resolve()), str(value_file.resolve())]
+
+    def run(self, actions, verilator_includes=None, num_tests=0,
+            _circuit=None, runtime_random=False, random_seed=0):
+
+        if self.runtime_stimulus:
+            if num_tests > 0:
+                raise NotImplementedError(
+                    "runtime_stimulus does not support assumptions and "
+                    "guarantees")
+            self.generate_stimulus_driver()
+        else:
+            self.generate_test_bench(actions, verilator_includes, num_tests,
+                                     _circuit, runtime_random, random_seed)
 
         lib_path = os.path.abspath(os.path.join(self.directory, "obj_dir"))
         env = {_LIBRARY_PATH_NAME: os.path.dirname(lib_path)}
@@ -782,23 +1224,21 @@ if (!({expr_str})) {{
             env[_LIBRARY_PATH_NAME] = ld_lib_path
 
         # Run makefile created by verilator
-        make_cmd = verilator_make_cmd(self.circuit_name)
-        subprocess_run(make_cmd, cwd=self.directory, disp_type=self.disp_type)
+        self.make_driver()
 
         # create the logs folder if necessary
         logs = Path(self.directory) / "logs"
         if not os.path.isdir(logs):
             os.mkdir(logs)
 
-        # Run the executable created by verilator and write the standard
+        # Run the executable created by verilator, streaming the standard
         # output to a logfile for later review or processing
         exe_cmd = [f'./obj_dir/V{self.circuit_name}']
-        result = subprocess_run(exe_cmd, cwd=self.directory,
-                                disp_type=self.disp_type,
-                                env=env)
+        if self.runtime_stimulus:
+            exe_cmd += self.write_stimulus(actions)
         log = Path(self.directory) / 'obj_dir' / f'{self.circuit_name}.log'
-        with open(log, 'w') as f:
-            f.write(result.stdout)
+        subprocess_run(exe_cmd, cwd=self.directory, disp_type=self.disp_type,
+                       env=env, log_file=log)
 
         # post-process GetValue actions
         self.post_process_get_value_actions(actions)
@@ -826,6 +1266,49 @@ if (!({expr_str})) {{
                         break
         return main_body
 
+    def make_random_test_loop(self, circuit, actions, num_tests, seed):
+        '''
+        Returns a loop running `num_tests` random tests in the harness: the
+        assumed inputs are drawn from a seeded PRNG until they satisfy their
+        assumption (compiled to C++), then the guarantees are checked.
+
+        Raises NotImplementedError if an assumption can't be compiled.
+        '''
+        draws = []
+        for port in circuit.interface.ports.values():
+            if not port.is_output():
+                continue
+            for assumption in self.assumptions:
+                assume_port = assumption.port
+                if isinstance(assume_port, SelectPath):
+                    assume_port = assume_port[-1]
+                if assume_port is port:
+                    if isinstance(port, m.SInt):
+                        # the compiled predicates use unsigned semantics
+                        raise NotImplementedError(
+                            f"Assumption on signed port {port.debug_name}")
+                    name = verilator_name(port.name)
+                    width = len(port) if isinstance(port, m.Array) else 1
+                    value = f"{name}_rand"
+                    pred = compile_predicate(assumption.value, [value],
+                                             width)
+                    mask = f"{(1 << width) - 1:#x}ULL"
+                    draws += [
+                        f"uint64_t {value};",
+                        f"do {{",
+                        f"  {value} = fault_rng() & {mask};",
+                        f"}} while (!{pred});",
+                        f"top->{name} = {value};"
+                    ]
+                    break
+        body = draws + self.make_eval(len(actions), Eval())
+        main_body = f"  std::mt19937_64 fault_rng({seed}ULL);\n"
+        main_body += f"  for (int i = 0; i < {num_tests}; i++) {{\n"
+        main_body += "".join(f"    {line}\n" for line in body)
+        main_body += self.add_guarantees(circuit, actions, "i")
+        main_body += "  }\n"
+        return main_body
+
     def add_guarantees(self, circuit, actions, i):
         main_body = ""
         for name, port in circuit.interface.ports.items():
@@ -846,7 +1329,7 @@ if (!({expr_str})) {{
       std::cerr << std::endl;  // end the current line
       std::cerr << \"Got      : 0x\" << std::hex << top->{name} << std::endl;
       std::cerr << \"Expected : {code}" << std::endl;
-      std::cerr << \"i        : {i}\" << std::endl;
+      std::cerr << \"i        : \" << std::dec << {i} << std::endl;
       std::cerr << \"Port     : {name}\" << std::endl;
       #if VM_TRACE
         tracer->close();
@@ -864,12 +1347,4 @@ class SynchronousVerilatorTarget(VerilatorTarget):
         self.clock = verilator_name(clock.name)
 
     def make_step(self, i, action):
-        code = []
-        for _ in range(action.steps):
-            code.append("#if VM_TRACE")
-            code.append("tracer->dump(main_time);")
-            code.append("#endif")
-            code.append(f"top->{self.clock} ^= 1;")
-            code.append("top->eval();")
-            code.append("main_time += 5;")
-        return code
+        return self.make_clock_steps(action, f"top->{self.clock} ^= 1;")
@@ -2,6 +2,16 @@ from .subprocess_run import subprocess_run
 import os
 
 
+# Verilator options used for perf_mode: optimize the model more aggressively
+# and split the generated C++ into smaller files that can be compiled in
+# parallel.  Note that "--x-assign fast" and "--x-initial fast" let Verilator
+# pick whatever value is fastest for X assignments and initial values.
+PERF_MODE_FLAGS = ['-O3', '--x-assign', 'fast', '--x-initial', 'fast',
+                   '--output-split', '20000',
+                   '--output-split-cfuncs', '20000']
+PERF_MODE_OPT_FAST = '-O3'
+
+
 def verilator_version(disp_type='on_error'):
     # assemble the command
     cmd = ['verilator', '--version']
@@ -20,7 +30,7 @@ def verilator_comp_cmd(top=None, verilog_filename=None,
                        driver_filename=None, verilator_flags=None,
                        coverage=False, use_kratos=False,
                        defines=None, parameters=None,
-                       use_pysv=None):
+                       use_pysv=None, threads=None, perf_mode=False):
     # set defaults
     if include_verilog_libraries is None:
         include_verilog_libraries = []
@@ -39,6 +49,10 @@ def verilator_comp_cmd(top=None, verilog_filename=None,
     retval += ['-Wall']
     retval += ['-Wno-INCABSPATH']
     retval += ['-Wno-DECLFILENAME']
+    if perf_mode:
+        retval += PERF_MODE_FLAGS
+    if threads is not None and threads > 1:
+        retval += ['--threads', f'{threads}']
     retval += verilator_flags
 
     if verilog_filename is not None:
@@ -69,8 +83,12 @@ def verilator_comp_cmd(top=None, verilog_filename=None,
     for k, v in parameters.items():
         retval += [f'-G{k}={v}']
 
+    # the driver may be split across several source files
     if driver_filename is not None:
-        retval += ['--exe', f'{driver_filename}']
+        if isinstance(driver_filename, (list, tuple)):
+            retval += ['--exe'] + [f'{name}' for name in driver_filename]
+        else:
+            retval += ['--exe', f'{driver_filename}']
     if top is not None:
         retval += ['--top-module', f'{top}']
 
@@ -84,11 +102,127 @@ def verilator_comp_cmd(top=None, verilog_filename=None,
     return retval
 
 
-def verilator_make_cmd(top):
+def verilator_make_cmd(top, perf_mode=False):
     cmd = []
     cmd += ['make']
     cmd += ['-C', 'obj_dir']
     cmd += ['-j']
     cmd += ['-f', f'V{top}.mk']
+    if perf_mode:
+        cmd += [f'OPT_FAST={PERF_MODE_OPT_FAST}']
+        cmd += ['VM_PARALLEL_BUILDS=1']
     cmd += [f'V{top}']
     return cmd
+
+
+# trace writer class, header, file extension, and Verilator flag for each
+# trace format
+TRACE_FORMATS = {
+    'vcd': ('VerilatedVcdC', '<verilated_vcd_c.h>', 'vcd', '--trace'),
+    'fst': ('VerilatedFstC', '<verilated_fst_c.h>', 'fst', '--trace-fst'),
+}
+
+
+class VerilatorTrace:
+    """
+    Waveform tracing options of a verilated model and the C++ code that
+    implements them in the generated drivers.
+
+    `trace_format`: 'vcd' or 'fst' (compressed, much smaller for long runs)
+    `trace_depth`: number of levels of the hierarchy that are traced
+    (defaults to all of them)
+    `trace_window`: (start, stop) simulation times between which values are
+    dumped, `stop` may be None to trace until the end
+
+    Values are dumped with `fault_trace_dump()`, which does nothing when the
+    simulation time is outside of the window or tracing was stopped by a
+    TraceControl action.
+    """
+    def __init__(self, trace_format='vcd', trace_depth=None,
+                 trace_window=None):
+        if trace_format not in TRACE_FORMATS:
+            raise ValueError(f"Unknown trace_format {trace_format}, expected "
+                             f"one of {list(TRACE_FORMATS)}")
+        if trace_window is not None:
+            start, stop = trace_window
+            if stop is not None and stop < start:
+                raise ValueError(f"Invalid trace_window {trace_window}")
+        self.trace_format = trace_format
+        self.trace_depth = trace_depth
+        self.trace_window = trace_window
+
+    @property
+    def tracer_class(self):
+        return TRACE_FORMATS[self.trace_format][0]
+
+    @property
+    def header(self):
+        return TRACE_FORMATS[self.trace_format][1]
+
+    @property
+    def extension(self):
+        return TRACE_FORMATS[self.trace_format][2]
+
+    @property
+    def levels(self):
+        return 99 if self.trace_depth is None else self.trace_depth
+
+    def flags(self, flags):
+        """
+        Returns `flags` with the --trace flag replaced by the flag for the
+        trace format, along with the trace depth if tracing is enabled
+        """
+        if flags is None or '--trace' not in flags:
+            return flags
+        trace_flag = TRACE_FORMATS[self.trace_format][3]
+        flags = [trace_flag if flag == '--trace' else flag for flag in flags]
+        if self.trace_depth is not None:
+            flags += ['--trace-depth', f'{self.trace_depth}']
+        return flags
+
+    def declarations(self):
+        """
+        Definitions of the tracer, the flag set by TraceControl actions, and
+        `fault_trace_dump`
+        """
+        cond = 'fault_trace_enabled'
+        if self.trace_window is not None:
+            start, stop = self.trace_window
+            cond += f' && main_time >= {start}'
+            if stop is not None:
+                cond += f' && main_time < {stop}'
+        return f"""\
+#if VM_TRACE
+{self.tracer_class}* tracer;
+bool fault_trace_enabled = true;
+void fault_trace_dump() {{
+  if ({cond}) {{
+    tracer->dump(main_time);
+  }}
+}}
+#endif"""
+
+    def extern_declarations(self):
+        """
+        Declarations for other source files of the driver
+        """
+        return f"""\
+#if VM_TRACE
+extern {self.tracer_class}* tracer;
+extern bool fault_trace_enabled;
+void fault_trace_dump();
+#endif"""
+
+    def open_code(self, circuit_name):
+        """
+        Code for main that creates the tracer and opens the trace file in the
+        logs directory
+        """
+        return f"""\
+#if VM_TRACE
+  Verilated::traceEverOn(true);
+  tracer = new {self.tracer_class};
+  top->trace(tracer, {self.levels});
+  mkdir("logs", S_IRWXU | S_IRWXG | S_IROTH | S_IXOTH);
+  tracer->open("logs/{circuit_name}.{self.extension}");
+#endif"""
@@ -3,10 +3,20 @@ import magma as m
 from .file import File
 from fault.target import Target
 from pathlib import Path
+import copy
+import weakref
 import fault.actions as actions
 from fault.util import flatten
 import os
 from fault.select_path import SelectPath
+from fault.build_cache import BuildCache, hash_parts, circuit_parts
+from fault.loop_compression import TableEntry, compress_loops
+from fault.action_stream import ActionStream
+
+
+# Verilog generated by magma in this process, keyed by circuit and then by
+# the compile options (see `VerilogTarget.compile_circuit`)
+_compiled_circuits = weakref.WeakKeyDictionary()
 
 
 class VerilogTarget(Target):
@@ -22,7 +32,10 @@ class VerilogTarget(Target):
     def __init__(self, circuit, circuit_name=None, directory="build/",
                  skip_compile=False, include_verilog_libraries=None,
                  magma_output="verilog", magma_opts=None, coverage=False,
-                 use_kratos=False, value_file_name='get_value_file.txt'):
+                 use_kratos=False, value_file_name='get_value_file.txt',
+                 use_build_cache=False, build_cache_dir=None,
+                 loop_compression=False, compile_cache=True,
+                 compile_cache_dir=None):
         super().__init__(circuit)
 
         self.circuit_name = circuit_name
@@ -59,18 +72,14 @@ class VerilogTarget(Target):
         else:
             suffix = "v"
         self.verilog_file = Path(f"{self.circuit_name}.{suffix}")
+        self.compile_cache = compile_cache
+        if compile_cache_dir is not None:
+            self.compile_build_cache = BuildCache(compile_cache_dir)
+        else:
+            self.compile_build_cache = None
         # Optionally compile this module to verilog first.
         if not self.skip_compile:
-            prefix = os.path.splitext(self.directory / self.verilog_file)[0]
-            m.compile(prefix, self.circuit, output=self.magma_output,
-                      **self.magma_opts)
-            if use_kratos:
-                # kratos generates SystemVerilog file
-                # Until magma/coreir can generate sv suffix, we have to move
-                # the files around
-                os.rename(prefix + ".v", prefix + ".sv")
-            if not (self.directory / self.verilog_file).is_file():
-                raise Exception(f"Compiling {self.circuit} failed")
+            self.compile_circuit(use_kratos)
 
         self.assumptions = []
         self.guarantees = []
@@ -82,6 +91,97 @@ class VerilogTarget(Target):
         # coverage
         self.coverage = coverage
 
+        # persistent cache of build products shared across targets/processes
+        if use_build_cache:
+            self.build_cache = BuildCache(build_cache_dir)
+        else:
+            self.build_cache = None
+
+        # emit repeated action patterns as table-driven loops
+        self.loop_compression = loop_compression
+
+    def compile_circuit(self, use_kratos=False):
+        '''
+        Compile the circuit to Verilog with magma.  With `compile_cache`, the
+        generated files are reused by later targets for the same circuit and
+        compile options in this process, and with `compile_cache_dir` they
+        are also stored on disk under a hash of the circuit definition, so
+        that other processes can reuse them.
+        '''
+        prefix = os.path.splitext(self.directory / self.verilog_file)[0]
+        options = hash_parts(self.magma_output, self.circuit_name,
+                             str(self.verilog_file), use_kratos,
+                             self.magma_opts)
+        memo = None
+        if self.compile_cache:
+            try:
+                memo = _compiled_circuits.setdefault(self.circuit, {})
+            except TypeError:
+                # circuits that can't be weakly referenced aren't cached
+                pass
+        if memo is not None and options in memo:
+            self._restore_compiled(memo[options])
+            return
+        key = None
+        if self.compile_cache and self.compile_build_cache is not None:
+            key = hash_parts('magma', getattr(m, '__version__', None),
+                             options, circuit_parts(self.circuit))
+            if self.compile_build_cache.fetch(key, self.directory) and \
+                    (self.directory / self.verilog_file).is_file():
+                if memo is not None:
+                    memo[options] = self._read_compiled(os.listdir(
+                        self.compile_build_cache.entry(key)))
+                return
+
+        # the files written by magma are the ones that are new or modified
+        # after compiling
+        before = self._directory_snapshot()
+        m.compile(prefix, self.circuit, output=self.magma_output,
+                  **self.magma_opts)
+        if use_kratos:
+            # kratos generates SystemVerilog file
+            # Until magma/coreir can generate sv suffix, we have to move
+            # the files around
+            os.rename(prefix + ".v", prefix + ".sv")
+        if not (self.directory / self.verilog_file).is_file():
+            raise Exception(f"Compiling {self.circuit} failed")
+        after = self._directory_snapshot()
+        names = [name for name, mtime in after.items()
+                 if before.get(name) != mtime]
+        if self.verilog_file.name not in names:
+            names.append(self.verilog_file.name)
+        if memo is not None:
+            memo[options] = self._read_compiled(names)
+        if key is not None:
+            self.compile_build_cache.store(key, self.directory, names=names)
+
+    def _directory_snapshot(self):
+        return {entry.name: entry.stat().st_mtime_ns
+                for entry in os.scandir(self.directory) if entry.is_file()}
+
+    def _read_compiled(self, names):
+        # contents are kept rather than paths, since the files may later be
+        # deleted or overwritten
+        files = {}
+        for name in names:
+            with open(self.directory / name, 'rb') as f:
+                files[name] = f.read()
+        return files
+
+    def _restore_compiled(self, files):
+        '''
+        Write the files generated by an earlier compilation to the target
+        directory
+        '''
+        for name, contents in files.items():
+            path = self.directory / name
+            if path.is_file():
+                with open(path, 'rb') as f:
+                    if f.read() == contents:
+                        continue
+            with open(path, 'wb') as f:
+                f.write(contents)
+
     @abstractmethod
     def compile_expression(self, value):
         pass
@@ -145,6 +245,8 @@ class VerilogTarget(Target):
             return self.make_guarantee(i, action)
         elif isinstance(action, actions.Loop):
             return self.make_loop(i, action)
+        elif isinstance(action, actions.TableLoop):
+            return self.make_table_loop(i, action)
         elif isinstance(action, actions.Join):
             return self.make_join(i, action)
         elif isinstance(action, actions.Call):
@@ -177,6 +279,12 @@ class VerilogTarget(Target):
             return self.make_assign(i, action)
         elif isinstance(action, actions.Finish):
             return self.make_finish(i, action)
+        elif isinstance(action, actions.SaveState):
+            return self.make_save_state(i, action)
+        elif isinstance(action, actions.RestoreState):
+            return self.make_restore_state(i, action)
+        elif isinstance(action, actions.TraceControl):
+            return self.make_trace_control(i, action)
         raise NotImplementedError(action)
 
     @abstractmethod
@@ -222,6 +330,57 @@ class VerilogTarget(Target):
         # return code representing the for loop
         return self.make_block(i, 'for', cond, action.actions)
 
+    def enumerate_actions(self, actions):
+        '''
+        Pairs of (index, action) to generate code for.  With loop compression
+        enabled, runs of actions differing only in their data are replaced by
+        table-driven loops.
+        '''
+        if self.loop_compression:
+            return compress_loops(actions)
+        return enumerate(actions)
+
+    def open_stream(self, indent):
+        '''
+        Returns an `ActionStream` that writes the code for each action to a
+        file in the build directory as soon as it is appended (see
+        fault/action_stream.py).
+        '''
+        if self.loop_compression:
+            raise NotImplementedError(
+                "loop_compression does not support action streams")
+        body_file = self.directory / f"{self.circuit_name}_stream.txt"
+        return ActionStream(self, body_file, indent)
+
+    def make_table_loop(self, i, action):
+        table = f'__table_{action.start}'
+        code = []
+        if action.table and action.table[0]:
+            code += self.make_table(table, action.table)
+        body = []
+        for j, elem in enumerate(action.actions):
+            if isinstance(getattr(elem, 'value', None), TableEntry):
+                column = elem.value.column
+                elem = copy.copy(elem)
+                elem.value = self.make_table_entry(
+                    table, action.loop_var, len(action.table[0]), column)
+            body += self.generate_action_code(action.index(j), elem)
+        loop = actions.Loop(action.n_iter, action.loop_var, body)
+        return code + self.make_loop(i, loop)
+
+    def make_table(self, name, table):
+        '''
+        Declare the data of a table-driven loop, returning any code that has
+        to come before the loop.
+        '''
+        raise NotImplementedError()
+
+    def make_table_entry(self, name, row, n_cols, column):
+        '''
+        Expression reading `column` of row `row` of the table `name`.
+        '''
+        raise NotImplementedError()
+
     @abstractmethod
     def make_join(self, i, action):
         pass
@@ -296,6 +455,24 @@ class VerilogTarget(Target):
     def make_finish(self, i, action):
         pass
 
+    def make_save_state(self, i, action):
+        '''
+        Save the state of the simulation to `action.file_name`
+        '''
+        raise NotImplementedError(action)
+
+    def make_restore_state(self, i, action):
+        '''
+        Restore the state of the simulation from `action.file_name`
+        '''
+        raise NotImplementedError(action)
+
+    def make_trace_control(self, i, action):
+        '''
+        Start or stop dumping waveforms, depending on `action.enable`
+        '''
+        raise NotImplementedError(action)
+
     def make_block(self, i, name, cond, actions, label=None):
         '''
         Generic function that creates a properly indented code block.  This
@@ -330,11 +507,13 @@ class VerilogTarget(Target):
         # return the code block
         return code
 
-    def post_process_get_value_actions(self, all_actions):
+    def post_process_get_value_actions(self, all_actions, value_file=None):
+        if value_file is None:
+            value_file = self.value_file.name
         get_value_actions = [action for action in all_actions
                              if isinstance(action, actions.GetValue)]
         if len(get_value_actions) > 0:
-            with open(self.value_file.name, 'r') as f:
+            with open(value_file, 'r') as f:
                 lines = f.readlines()
             for line, action in zip(lines, get_value_actions):
                 action.update_from_line(line)
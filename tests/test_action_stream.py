@@ -0,0 +1,38 @@
+import os
+import tempfile
+import pytest
+import fault
+from fault.action_stream import ActionStream
+from .common import TestBasicClkCircuit, pytest_sim_params
+
+
+def pytest_generate_tests(metafunc):
+    pytest_sim_params(metafunc, 'verilator', 'system-verilog')
+
+
+def test_action_stream(target, simulator):
+    circ = TestBasicClkCircuit
+    tester = fault.Tester(circ, circ.CLK)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        kwargs = {"target": target, "directory": tempdir}
+        if target == "verilator":
+            kwargs["flags"] = ["-Wno-fatal"]
+        else:
+            kwargs["simulator"] = simulator
+        stream = tester.stream_to(**kwargs)
+        assert isinstance(tester.actions, ActionStream)
+        get_values = []
+        for k in range(16):
+            tester.poke(circ.I, k % 3 == 0)
+            tester.step(2)
+            tester.expect(circ.O, k % 3 == 0)
+            get_values.append(tester.get_value(circ.O))
+        # only the GetValue actions are kept in memory
+        assert list(tester.actions) == get_values
+        assert os.path.isfile(stream.body_file)
+        tester.run(target)
+        assert stream.closed
+        with pytest.raises(RuntimeError):
+            tester.eval()
+    assert [get_value.value for get_value in get_values] == \
+        [k % 3 == 0 for k in range(16)]
@@ -0,0 +1,70 @@
+import tempfile
+import numpy as np
+import pytest
+import fault
+from .common import SimpleALU, TestBasicClkCircuit
+
+
+def test_batch_simulator_alu():
+    circ = SimpleALU
+    a, b = np.meshgrid(np.arange(0, 1 << 16, 257), np.arange(0, 1 << 16, 263))
+    a, b = a.ravel(), b.ravel()
+    expected = [a + b, a - b, a * b, b - a]
+
+    tester = fault.Tester(circ, circ.CLK)
+    tester.poke(circ.a, a)
+    tester.poke(circ.b, b)
+    for opcode in range(4):
+        tester.poke(circ.config_data, opcode)
+        tester.poke(circ.config_en, 1)
+        tester.step(2)
+        tester.poke(circ.config_en, 0)
+        tester.expect(circ.c, expected[opcode] & 0xFFFF)
+    c = tester.get_value(circ.c)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester.compile_and_run("batch", directory=tempdir)
+    assert (c.value == (b - a) & 0xFFFF).all()
+
+    # failures report the first failing vector
+    tester.expect(circ.c, expected[0] & 0xFFFF)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        with pytest.raises(AssertionError) as e:
+            tester.compile_and_run("batch", directory=tempdir)
+    assert "vector 1" in str(e.value)
+
+
+def test_batch_simulator_clock():
+    circ = TestBasicClkCircuit
+    tester = fault.Tester(circ, circ.CLK)
+    tester.poke(circ.I, np.array([0, 1, 1, 0]))
+    tester.step(2)
+    tester.expect(circ.O, np.array([0, 1, 1, 0]))
+    tester.poke(circ.I, 1)
+    tester.eval()
+    tester.expect(circ.O, np.array([0, 1, 1, 0]))
+    tester.step(2)
+    tester.expect(circ.O, 1)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester.compile_and_run("batch", directory=tempdir)
+
+
+def test_batch_simulator_any_value():
+    circ = TestBasicClkCircuit
+    tester = fault.Tester(circ, circ.CLK)
+    tester.poke(circ.I, np.array([0, 1, 1, 0]))
+    tester.step(2)
+    # don't care entries are not checked
+    tester.expect(circ.O, fault.AnyValue)
+    tester.expect(circ.O, np.ma.array([0, 0, 1, 0],
+                                      mask=[False, True, False, False]))
+    tester.expect(circ.O, np.array([fault.AnyValue, 1, 1, fault.AnyValue],
+                                   dtype=object))
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester.compile_and_run("batch", directory=tempdir)
+
+    tester.expect(circ.O, np.ma.array([1, 1, 1, 0],
+                                      mask=[False, True, False, False]))
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        with pytest.raises(AssertionError) as e:
+            tester.compile_and_run("batch", directory=tempdir)
+    assert "vector 0" in str(e.value)
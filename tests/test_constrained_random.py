@@ -1,5 +1,7 @@
 import random
-from fault.random import ConstrainedRandomGenerator
+import fault.random
+from fault.random import (ConstrainedRandomGenerator, ConstrainedRandomSampler,
+                          constrained_random_sampler, close_samplers)
 
 N = 8
 WIDTH = 8
@@ -19,3 +21,46 @@ def test_constrained_random():
 
     for m in models:
         assert pred(**m)
+
+
+def test_constrained_random_sampler():
+    random.seed(0)
+    v = dict(x=WIDTH, y=WIDTH)
+
+    def pred(x, y):
+        return (x * y == 0x2A) & (x != 1) & (y != 1)
+
+    sampler = constrained_random_sampler(v, pred)
+    samples = sampler.sample(N)
+    assert len(samples) == N
+    for m in samples:
+        assert pred(**m)
+    # the hit rate is too low for rejection sampling
+    assert sampler.use_smt
+    # samplers are cached and return distinct solutions
+    assert constrained_random_sampler(v, pred) is sampler
+    more = sampler.sample(N)
+    assert not set(samples) & set(more)
+
+    sampler = ConstrainedRandomSampler(dict(x=WIDTH), lambda x: x[0] == 0)
+    for m in sampler.sample(N):
+        assert m["x"][0] == 0
+    assert not sampler.use_smt
+
+
+def _even(x):
+    return x[0] == 0
+
+
+def test_constrained_random_sampler_cache():
+    close_samplers()
+    v = dict(x=WIDTH)
+    first = constrained_random_sampler(v, _even, processes=2)
+    first.sample(N)
+    assert first.pool is not None
+    # the least recently used sampler is closed and dropped
+    for batch_size in range(1, fault.random.MAX_SAMPLERS + 1):
+        constrained_random_sampler(v, _even, batch_size=batch_size)
+    assert first.pool is None
+    assert constrained_random_sampler(v, _even, processes=2) is not first
+    close_samplers()
@@ -0,0 +1,33 @@
+import pytest
+from hwtypes import BitVector
+from fault.cxx_predicate import compile_predicate
+
+
+def test_compile_predicate():
+    code = compile_predicate(lambda a: a < BitVector[16](32768), ["x"], 16)
+    assert code == "((x < 0x8000ULL))"
+
+    code = compile_predicate(lambda a: (a + 1 == 0) | (a // 3 > 1), ["x"], 8)
+    assert code == ("((((((x + 0x1ULL) & 0xffULL) == 0x0ULL)) | "
+                    "(((0x3ULL ? x / 0x3ULL : 0xffULL) > 0x1ULL))) & 0xffULL)")
+
+    code = compile_predicate(lambda a, b: 0 < a < b and not b, ["x", "y"], 8)
+    assert code == "(((0x0ULL < x) && (x < y)) && (!y))"
+
+    # ~ of a comparison is a logical not, not a bitwise one
+    code = compile_predicate(lambda a: ~(a == 0), ["x"], 16)
+    assert code == "(!((x == 0x0ULL)))"
+    code = compile_predicate(lambda a: ~a == 0, ["x"], 16)
+    assert code == "((((~x) & 0xffffULL) == 0x0ULL))"
+
+
+def test_compile_predicate_unsupported():
+    with pytest.raises(NotImplementedError):
+        compile_predicate(lambda a: a.bits()[0], ["x"], 8)
+    with pytest.raises(NotImplementedError):
+        compile_predicate(lambda a: a < 3, ["x"], 128)
+
+    def pred(a):
+        return a < 3
+    with pytest.raises(NotImplementedError):
+        compile_predicate(pred, ["x"], 8)
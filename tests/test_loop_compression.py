@@ -0,0 +1,93 @@
+import tempfile
+import pytest
+import fault
+from fault.actions import Poke, Expect, Eval, Step, Print, TableLoop
+from fault.loop_compression import TableEntry, compress_loops
+import os
+from .common import (TestBasicClkCircuit, TestByteCircuit, TestSIntCircuit,
+                     pytest_sim_params)
+
+
+def pytest_generate_tests(metafunc):
+    pytest_sim_params(metafunc, 'verilator', 'system-verilog')
+
+
+def test_compress_loops():
+    circ = TestByteCircuit
+    actions = [Print("start\n")]
+    for value in range(10):
+        actions += [Poke(circ.I, value), Eval(), Expect(circ.O, value)]
+    actions += [Poke(circ.I, -1), Eval()]
+
+    result = compress_loops(actions)
+    assert [i for i, _ in result] == [0, 1, 31, 32]
+    loop = result[1][1]
+    assert isinstance(loop, TableLoop)
+    assert (loop.n_iter, loop.period, loop.start) == (10, 3, 1)
+    assert loop.loop_var == "__fault_table_row_1"
+    assert loop.table == [[value, value] for value in range(10)]
+    assert [type(action) for action in loop.actions] == [Poke, Eval, Expect]
+    assert loop.actions[0].value.column == 0
+    assert isinstance(loop.actions[2].value, TableEntry)
+    assert loop.actions[2].value.column == 1
+    # the original actions are left untouched
+    assert actions[1].value == 0
+
+    # short runs are left unrolled
+    assert compress_loops(actions[:7]) == list(enumerate(actions[:7]))
+
+
+def _read_driver(directory, circ, target):
+    if target == "verilator":
+        name = f"{circ.name}_driver.cpp"
+    else:
+        name = f"{circ.name}_tb.sv"
+    with open(os.path.join(directory, name)) as f:
+        return f.read()
+
+
+def test_loop_compression(target, simulator):
+    circ = TestBasicClkCircuit
+    tester = fault.Tester(circ, circ.CLK)
+    for k in range(16):
+        tester.poke(circ.I, k % 3 == 0)
+        tester.step(2)
+        tester.expect(circ.O, k % 3 == 0)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        kwargs = {"target": target, "directory": tempdir,
+                  "loop_compression": True}
+        if target == "verilator":
+            kwargs["flags"] = ["-Wno-fatal"]
+        else:
+            kwargs["simulator"] = simulator
+        tester.compile_and_run(**kwargs)
+        assert "__table_" in _read_driver(tempdir, circ, target)
+
+    # failures report the index of the original action
+    tester.expect(circ.O, 1)
+    for k in range(8):
+        tester.poke(circ.I, 0)
+        tester.step(2)
+        tester.expect(circ.O, 1)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        kwargs["directory"] = tempdir
+        with pytest.raises(AssertionError):
+            tester.compile_and_run(**kwargs)
+
+
+def test_loop_compression_signed(target, simulator):
+    circ = TestSIntCircuit
+    tester = fault.Tester(circ)
+    for k in range(16):
+        tester.poke(circ.I, k % 8 - 4)
+        tester.eval()
+        tester.expect(circ.O, k % 8 - 4)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        kwargs = {"target": target, "directory": tempdir,
+                  "loop_compression": True}
+        if target == "verilator":
+            kwargs["flags"] = ["-Wno-fatal"]
+        else:
+            kwargs["simulator"] = simulator
+        tester.compile_and_run(**kwargs)
+        assert "__table_" in _read_driver(tempdir, circ, target)
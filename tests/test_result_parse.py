@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from fault.result_parse import (nut_parse, hspice_parse, NutmegData,
+                                SpiceResult, data_to_interp)
+
+
+def write_nutmeg(raw_file, names, data):
+    header = ''
+    header += 'Title: test\n'
+    header += 'Date: Thu Jan  1 00:00:00  1970\n'
+    header += 'Plotname: Transient Analysis\n'
+    header += 'Flags: real\n'
+    header += f'No. Variables: {len(names)}\n'
+    header += f'No. Points: {data.shape[0]}\n'
+    header += 'Variables:\n'
+    for k, name in enumerate(names):
+        kind = 'time' if name == 'time' else 'voltage'
+        header += f'\t{k}\t{name}\t{kind}\n'
+    header += 'Binary:\n'
+    with open(raw_file, 'wb') as f:
+        f.write(header.encode('ascii'))
+        f.write(np.asarray(data, dtype='<f8').tobytes())
+
+
+def test_nutmeg_binary(tmp_path):
+    raw_file = tmp_path / 'out.raw'
+    t = np.linspace(0, 1e-9, 11)
+    data = np.stack([t, 2 * t, 3 * t], axis=1)
+    write_nutmeg(raw_file, ['time', 'v(a)', 'i(vdd)'], data)
+
+    raw = NutmegData()
+    raw.read(raw_file)
+    assert raw.names() == ['time', 'v(a)', 'i(vdd)']
+    assert np.array_equal(raw.get('v(a)'), 2 * t)
+
+    results = nut_parse(raw_file)
+    assert set(results.keys()) == {'a', 'vdd'}
+    assert np.isclose(results['a'](0.55e-9), 1.1e-9)
+    assert np.isclose(results['vdd'](0.5e-9), 1.5e-9)
+
+    # only read in the requested signals
+    results = nut_parse(raw_file, signals={'a'})
+    assert set(results.keys()) == {'a'}
+
+
+def test_lazy_interp():
+    class Data:
+        def __init__(self):
+            self.accessed = []
+
+        def names(self):
+            return ['time', 'v(a)', 'v(b)']
+
+        def get(self, name):
+            self.accessed.append(name)
+            if name == 'time':
+                return np.array([0.0, 1.0, 2.0])
+            return np.array([0.0, 1.0, 0.0])
+
+    data = Data()
+    results = data_to_interp(data, time='time')
+    assert sorted(results) == ['a', 'b']
+    assert data.accessed == ['time']
+    assert np.isclose(results['a'](0.5), 0.5)
+    assert data.accessed == ['time', 'v(a)']
+    # interpolators are cached
+    assert results['a'] is results['a']
+
+
+@pytest.mark.parametrize('mode,expct', [
+    ('scipy', [0.0, 0.0, 0.5, 1.0, 0.5, 0.0]),
+    ('numpy', [0.0, 0.0, 0.5, 1.0, 0.5, 0.0]),
+    ('step', [0.0, 0.0, 0.0, 1.0, 1.0, 0.0])
+])
+def test_interp_mode(mode, expct):
+    result = SpiceResult(t=np.array([0.0, 1.0, 2.0]),
+                         v=np.array([0.0, 1.0, 0.0]), mode=mode)
+    meas = result(np.array([-1.0, 0.0, 0.5, 1.0, 1.5, 3.0]))
+    assert np.allclose(meas, expct)
+
+
+def test_csdf(tmp_path):
+    tr0_file = tmp_path / 'out.tr0'
+    with open(tr0_file, 'w') as f:
+        f.write("#H\n")
+        f.write("TITLE '* test'\n")
+        f.write("#N 'a' 'b'\n")
+        f.write("#C 0.0 2\n")
+        f.write(" 1.0 2.0\n")
+        f.write("#C 1.0e-9 2\n")
+        f.write(" 3.0\n")
+        f.write(" 4.0\n")
+        f.write("#;\n")
+
+    results = hspice_parse(tr0_file)
+    assert set(results.keys()) == {'a', 'b'}
+    assert np.isclose(results['a'](0.5e-9), 2.0)
+    assert np.isclose(results['b'](1e-9), 4.0)
@@ -0,0 +1,57 @@
+import tempfile
+import numpy as np
+import pytest
+import magma as m
+import fault
+from fault.actions import Expect
+from fault.fault_errors import ExpectError
+from fault.result_parse import SpiceResult
+from fault.spice_target import SpiceTarget
+
+
+class dut(m.Circuit):
+    name = 'mybus'
+    io = m.IO(
+        a=m.In(m.Bits[2]),
+        b=m.Out(m.Bits[2]),
+        c=fault.RealOut
+    )
+
+
+def make_results():
+    t = np.array([0, 1e-9, 2e-9, 3e-9])
+    return {
+        # b = 0b01, then 0b10, then an invalid logic level for b<0>
+        'b<0>': SpiceResult(t, np.array([1.0, 1.0, 0.0, 0.5])),
+        'b<1>': SpiceResult(t, np.array([0.0, 0.0, 1.0, 1.0])),
+        'c': SpiceResult(t, np.array([0.1, 0.2, 0.3, 0.4]))
+    }
+
+
+def test_spice_check_results():
+    with tempfile.TemporaryDirectory(dir='.') as tempdir:
+        target = SpiceTarget(dut, directory=tempdir, conn_order='alpha')
+        results = make_results()
+
+        # passing checks, including a bus expanded into bits
+        target.check_results(results, [
+            (0, Expect(dut.b, 0b01)),
+            (2e-9, Expect(dut.b, 0b10)),
+            (1e-9, Expect(dut.c, 0.2, abs_tol=1e-3)),
+            (2e-9, Expect(dut.c, 0, above=0.25)),
+        ])
+
+        # all failures are reported at once
+        with pytest.raises(ExpectError) as e:
+            target.check_results(results, [
+                (0, Expect(dut.b, 0b10)),
+                (1e-9, Expect(dut.c, 0, below=0.1)),
+            ])
+        msg = str(e.value)
+        assert msg.startswith('3 checks failed')
+        assert 'Failed checking port b<0>' in msg
+        assert 'Failed checking port b<1>' in msg
+        assert 'Expected below 0.1' in msg
+
+        with pytest.raises(fault.A2DError):
+            target.check_results(results, [(3e-9, Expect(dut.b, 0b11))])
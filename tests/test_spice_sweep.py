@@ -0,0 +1,49 @@
+import tempfile
+import magma as m
+import fault
+from pathlib import Path
+from fault.spice_target import corner_grid
+from .common import pytest_sim_params
+
+
+def pytest_generate_tests(metafunc):
+    pytest_sim_params(metafunc, 'spice')
+
+
+def test_spice_sweep(target, simulator, vsup=1.5):
+    # declare circuit
+    class myinv(m.Circuit):
+        io = m.IO(
+            in_=m.BitIn,
+            out=m.BitOut,
+            vdd=m.BitIn,
+            vss=m.BitIn
+        )
+
+    # define the test
+    tester = fault.Tester(myinv)
+    tester.poke(myinv.vdd, 1)
+    tester.poke(myinv.vss, 0)
+    tester.poke(myinv.in_, 1)
+    tester.expect(myinv.out, 0)
+    tester.poke(myinv.in_, 0)
+    tester.expect(myinv.out, 1)
+    tester.get_value(myinv.out)
+
+    corners = corner_grid(vsup=[1.2, vsup], temp=[25, 85])
+    with tempfile.TemporaryDirectory(dir='.') as tempdir:
+        spice_target = tester.make_target(
+            target,
+            simulator=simulator,
+            directory=tempdir,
+            model_paths=[Path('tests/spice/myinv.sp').resolve()],
+            vsup=vsup
+        )
+        rows = spice_target.sweep(tester.actions, corners, processes=2)
+
+    assert len(rows) == len(corners)
+    for row, corner in zip(rows, corners):
+        assert row['corner'] == corner
+        assert row['passed'], row['errors']
+        # the output is driven to the supply of each corner
+        assert abs(row['values'][0] - corner['vsup']) < 0.05
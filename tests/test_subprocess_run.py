@@ -0,0 +1,32 @@
+import sys
+import pytest
+from fault.subprocess_run import subprocess_run
+
+
+def test_subprocess_run_log_file(tmp_path):
+    log = tmp_path / 'out.log'
+    code = 'import sys\n'
+    code += 'for k in range(1000):\n'
+    code += '    print(f"line {k}")\n'
+    code += 'print("done", file=sys.stderr)\n'
+    result = subprocess_run([sys.executable, '-c', code], log_file=log,
+                            tail_lines=2)
+
+    # the whole output is in the log, but only the tail is kept in memory
+    with open(log, 'r') as f:
+        lines = f.read().splitlines()
+    assert lines == [f'line {k}' for k in range(1000)]
+    assert result.stderr == 'done'
+
+    # the tail has the same format as the output without a log file
+    code = 'print("line 998")\nprint("line 999")\n'
+    expected = subprocess_run([sys.executable, '-c', code]).stdout
+    assert result.stdout == expected == 'line 998line 999'
+
+
+def test_subprocess_run_log_file_err_str(tmp_path):
+    log = tmp_path / 'out.log'
+    code = 'print("ok")\nprint("ERROR: bad")\nprint("ok")\n'
+    with pytest.raises(AssertionError):
+        subprocess_run([sys.executable, '-c', code], log_file=log,
+                       err_str='ERROR')
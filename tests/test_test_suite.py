@@ -0,0 +1,118 @@
+import os
+import tempfile
+import pytest
+import fault
+from .common import TestBasicClkCircuit, TestByteCircuit, pytest_sim_params
+
+
+def test_test_suite():
+    circ = TestByteCircuit
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        suite = fault.TestSuite(circ, directory=tempdir, flags=["-Wno-lint"],
+                                processes=4)
+        get_values = []
+        for value in range(8):
+            tester = fault.Tester(circ)
+            tester.poke(circ.I, value)
+            tester.eval()
+            tester.expect(circ.O, value)
+            get_values.append(tester.get_value(circ.O))
+            suite.add(tester, name=f"value_{value}")
+        results = suite.run()
+        assert [result.name for result in results] == \
+            [f"value_{value}" for value in range(8)]
+        assert all(result.passed for result in results)
+        assert [get_value.value for get_value in get_values] == list(range(8))
+        for result in results:
+            assert os.path.isdir(result.directory)
+
+
+def test_test_suite_failure():
+    circ = TestBasicClkCircuit
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        suite = fault.TestSuite(circ, directory=tempdir, flags=["-Wno-lint"])
+        for value in range(2):
+            tester = fault.Tester(circ, circ.CLK)
+            tester.poke(circ.I, value)
+            tester.step(2)
+            tester.expect(circ.O, 1)
+            suite.add(tester)
+
+        results = suite.run(raise_on_failure=False)
+        assert [result.passed for result in results] == [False, True]
+
+        with pytest.raises(AssertionError):
+            suite.run()
+
+
+def pytest_generate_tests(metafunc):
+    pytest_sim_params(metafunc, 'system-verilog', exclude=['ncsim', 'vivado'])
+
+
+def test_test_suite_system_verilog(target, simulator):
+    circ = TestByteCircuit
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        def make_suite(values):
+            suite = fault.TestSuite(circ, target=target, directory=tempdir,
+                                    simulator=simulator)
+            get_values = []
+            for value in values:
+                tester = fault.Tester(circ)
+                tester.poke(circ.I, value)
+                tester.eval()
+                tester.expect(circ.O, value)
+                tester.expect(circ.O[0], value & 1)
+                get_values.append(tester.get_value(circ.O))
+                suite.add(tester, name=f"value_{value}")
+            return suite, get_values
+
+        suite, get_values = make_suite(range(4))
+        results = suite.run()
+        assert all(result.passed for result in results)
+        assert [get_value.value for get_value in get_values] == list(range(4))
+        hash_file = os.path.join(tempdir, f"{circ.name}_tb.hash")
+        mtime = os.path.getmtime(hash_file)
+
+        # a new suite reuses the compiled test bench
+        suite, get_values = make_suite(range(4, 8))
+        suite.run()
+        assert [get_value.value for get_value in get_values] == \
+            list(range(4, 8))
+        assert os.path.getmtime(hash_file) == mtime
+
+        tester = fault.Tester(circ)
+        tester.poke(circ.I, 1)
+        tester.eval()
+        tester.expect(circ.O, 2)
+        suite.add(tester, name="failure")
+        results = suite.run(raise_on_failure=False)
+        assert [result.passed for result in results] == [True] * 4 + [False]
+
+
+def test_test_suite_share_prefixes():
+    circ = TestBasicClkCircuit
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        suite = fault.TestSuite(circ, directory=tempdir, flags=["-Wno-lint"],
+                                share_prefixes=True)
+        get_values = []
+        for value in range(4):
+            tester = fault.Tester(circ, circ.CLK)
+            # shared prefix
+            tester.poke(circ.I, 1)
+            tester.step(2)
+            prefix_value = tester.get_value(circ.O)
+            # suffix
+            tester.poke(circ.I, value % 2)
+            tester.step(2)
+            tester.expect(circ.O, value % 2 if value < 3 else 0)
+            get_values.append((prefix_value, tester.get_value(circ.O)))
+            suite.add(tester, name=f"value_{value}")
+
+        results = suite.run(raise_on_failure=False)
+        assert [result.passed for result in results] == \
+            [True, True, True, False]
+        assert [(prefix.value, suffix.value)
+                for prefix, suffix in get_values[:3]] == \
+            [(1, 0), (1, 1), (1, 0)]
+        assert os.path.isfile(os.path.join(tempdir, "tests", "_prefix_0",
+                                           "state.bin"))
@@ -1,9 +1,14 @@
 from itertools import product
+import tempfile
 import pytest
 from hwtypes import Bit
 import magma as m
 from fault.test_vectors import (generate_function_test_vectors,
-                                generate_simulator_test_vectors)
+                                generate_simulator_test_vectors,
+                                generate_batch_test_vectors,
+                                write_function_test_vectors,
+                                write_simulator_test_vectors)
+import fault
 from fault.value import AnyValue
 from .common import TestBasicCircuit, TestArrayCircuit, TestSIntCircuit
 
@@ -18,6 +23,15 @@ def test_circuit(Circuit):
     assert function_test_vectors == simulator_test_vectors
 
 
+@pytest.mark.parametrize("Circuit", [TestBasicCircuit, TestArrayCircuit,
+                                     TestSIntCircuit])
+def test_batch_test_vectors(Circuit):
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        batch_test_vectors = generate_batch_test_vectors(Circuit,
+                                                         directory=tempdir)
+    assert batch_test_vectors == generate_simulator_test_vectors(Circuit)
+
+
 def test_combinational_circuit():
     def f(a, b, c):
         return (a & b) ^ c
@@ -52,3 +66,65 @@ def test_combinational_circuit():
     prev_inputs = test_vectors[-2].test_vector[:3]
     expected = Bit(f(*prev_inputs))
     assert vec[3] == expected
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_write_function_test_vectors(vectorized):
+    def f(a, b, c):
+        return (a & b) ^ c
+
+    class main(m.Circuit):
+        io = m.IO(a=m.In(m.Bit),
+                  b=m.In(m.Bit),
+                  c=m.In(m.Bit),
+                  d=m.Out(m.Bit))
+
+        m.wire(f(io.a, io.b, io.c), io.d)
+
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        # small chunks so that vectors are shifted across chunk boundaries
+        store = write_function_test_vectors(main, f, tempdir, chunk_size=3,
+                                            vectorized=vectorized)
+        assert list(store) == generate_function_test_vectors(main, f)
+
+        # vectors stored on disk can be replayed by any target
+        tester = fault.Tester(main)
+        store.apply(tester)
+        tester.compile_and_run("python")
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_write_function_test_vectors_no_inputs(vectorized):
+    def f():
+        return 5
+
+    class Const(m.Circuit):
+        io = m.IO(O=m.Out(m.Bits[4]))
+        io.O @= 5
+
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        store = write_function_test_vectors(Const, f, tempdir,
+                                            vectorized=vectorized)
+        assert list(store) == generate_function_test_vectors(Const, f)
+
+
+def test_write_simulator_test_vectors():
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        store = write_simulator_test_vectors(TestSIntCircuit, tempdir,
+                                             chunk_size=5)
+        assert list(store) == generate_simulator_test_vectors(TestSIntCircuit)
+
+
+def test_write_function_test_vectors_too_many():
+    def f(a, b, c):
+        return a
+
+    class Wide(m.Circuit):
+        io = m.IO(a=m.In(m.Bits[32]), b=m.In(m.Bits[32]),
+                  c=m.In(m.Bits[32]), O=m.Out(m.Bits[32]))
+        io.O @= io.a
+
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        with pytest.raises(ValueError):
+            write_function_test_vectors(Wide, f, tempdir,
+                                        vectorized=True)
@@ -1063,3 +1063,40 @@ def test_tester_array2_slice(target, simulator):
         else:
             tester.compile_and_run(target, directory=_dir, simulator=simulator,
                                    magma_opts={"sv": True})
+
+
+def test_tester_compact_actions(target, simulator):
+    circ = TestBasicClkCircuit
+    tester = fault.Tester(circ, circ.CLK, compact_actions=True,
+                          debug_mode=True)
+    tester.poke(circ.I, 1)
+    tester.step(2)
+    tester.expect(circ.O, 1, msg="O should be 1")
+    get_value = tester.get_value(circ.O)
+    tester.poke(circ.I, 0)
+    tester.eval()
+    tester.expect(circ.O, 1)
+    # the expects (which record their caller in debug mode) and the get value
+    # are kept as objects
+    assert tester.actions.objects.count(None) == 5
+    check(tester.actions[0], Poke(circ.CLK, 0))
+    check(tester.actions[1], Poke(circ.I, 1))
+    check(tester.actions[2], Step(circ.CLK, 2))
+    check(tester.actions[-1], Expect(circ.O, 1))
+    assert tester.actions[3].msg == "O should be 1"
+    assert tester.actions[3].traceback.startswith(__file__)
+    assert tester.actions[4] is get_value
+    # targets add actions around the ones of the test
+    wrapped = [Eval()] + tester.actions + [Eval()]
+    assert isinstance(wrapped, list)
+    assert [type(action) for action in wrapped[1:-1]] == \
+        [type(action) for action in tester.actions]
+    retargeted = tester.retarget(circ, circ.CLK)
+    assert isinstance(retargeted.actions, type(tester.actions))
+    assert len(retargeted.actions) == len(tester.actions)
+    with tempfile.TemporaryDirectory(dir=".") as _dir:
+        if target == "verilator":
+            tester.compile_and_run(target, directory=_dir, flags=["-Wno-fatal"])
+        else:
+            tester.compile_and_run(target, directory=_dir, simulator=simulator)
+    assert get_value.value == 1
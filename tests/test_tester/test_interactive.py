@@ -1,4 +1,6 @@
-from fault import PythonTester
+import tempfile
+import pytest
+from fault import PythonTester, VerilatorTester
 from ..common import AndCircuit, SimpleALU, TestTupleCircuit, \
     TestNestedArraysCircuit, TestNestedArrayTupleCircuit
 from hwtypes import BitVector
@@ -83,3 +85,27 @@ def test_tester_nested_array_tuple():
     tester.poke(TestNestedArrayTupleCircuit.I, val)
     tester.eval()
     tester.expect(TestNestedArrayTupleCircuit.O, val)
+
+
+def test_verilator_interactive(capsys):
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester = VerilatorTester(SimpleALU, SimpleALU.CLK, directory=tempdir,
+                                 flags=["-Wno-fatal"])
+        tester.circuit.CLK = 0
+        tester.circuit.config_data = 1
+        tester.circuit.config_en = 1
+        tester.advance_cycle()
+        # a Python reference model can react to the outputs immediately
+        for a, b in [(0xDEAD, 0xBEEF), (3, 5), (0xFFFF, 1)]:
+            tester.circuit.a = a
+            tester.circuit.b = b
+            tester.eval()
+            c = tester.peek(SimpleALU.c)
+            assert c == BitVector[16](a) - BitVector[16](b)
+            tester.circuit.c.expect(c)
+        tester.print("c=%d\n", SimpleALU.c)
+        assert capsys.readouterr()[0] == "c=65534\n"
+        assert tester.get_value(SimpleALU.c) == 65534
+        with pytest.raises(NotImplementedError):
+            tester.delay(10)
+        tester.close()
@@ -87,3 +87,85 @@ def test_tester_magma_internal_signals_verilator(target):
                                     "verilator_compat": True}
             kwargs["flags"] = ["-Wno-unused"]
         tester.compile_and_run(target, directory=_dir, **kwargs)
+
+
+def test_tester_runtime_random():
+    circ = SimpleALU
+
+    tester = SymbolicTester(circ, circ.CLK, num_tests=10000,
+                            random_strategy="runtime", random_seed=0)
+    tester.circuit.CLK = 0
+    tester.circuit.config_en = 1
+    tester.circuit.config_data = 1  # add is opcode 2
+    tester.step(2)
+    tester.circuit.config_en = 0
+    tester.step(2)
+    tester.circuit.a.assume(lambda a: a < BitVector[16](32768))
+    tester.circuit.b.assume(lambda b: (b < 32768) & (b % 2 == 0))
+    tester.circuit.c.guarantee(lambda a, b, c: (c >= a) and (c >= b))
+
+    with tempfile.TemporaryDirectory() as _dir:
+        tester.compile_and_run("verilator", directory=_dir,
+                               magma_opts={"verilator_debug": True,
+                                           "verilator_compat": True},
+                               flags=["-Wno-unused"])
+        with open(f"{_dir}/SimpleALU_driver.cpp", "r") as f:
+            driver = f.read()
+    # the random values are drawn by the harness, so the size of the driver
+    # doesn't depend on num_tests
+    assert "fault_rng" in driver
+    assert driver.count("top->eval();") < 100
+
+
+def test_pono_target_engine():
+    pytest.importorskip("pono")
+    from fault.pono_target import PonoTarget
+    with tempfile.TemporaryDirectory() as _dir:
+        target = PonoTarget(SimpleALU, directory=_dir, skip_compile=True,
+                            engine="bmc", bound=4, processes=2)
+        assert (target.engine, target.bound) == ("bmc", 4)
+        assert target.property_results == []
+        with pytest.raises(ValueError):
+            PonoTarget(SimpleALU, directory=_dir, skip_compile=True,
+                       engine="ic3")
+
+
+@pytest.mark.parametrize("engine", ["kind", "bmc"])
+@pytest.mark.parametrize("processes", [None, 2])
+def test_pono_target_check(engine, processes):
+    pytest.importorskip("pono")
+    from smt_switch.primops import BVUle, BVUge
+
+    class AndALU(m.Circuit):
+        io = m.IO(a=m.In(m.UInt[8]), b=m.In(m.UInt[8]),
+                  c=m.Out(m.UInt[8])) + m.ClockIO()
+        io.c @= io.a & io.b
+
+    def make_tester(op):
+        tester = SymbolicTester(AndALU, AndALU.CLK)
+        tester.step(2)
+        tester.step(2)
+        tester.circuit.c.guarantee(
+            lambda solver, ports: solver.make_term(op, ports['c'],
+                                                   ports['a']))
+        tester.circuit.c.guarantee(
+            lambda solver, ports: solver.make_term(BVUle, ports['c'],
+                                                   ports['b']))
+        return tester
+
+    kwargs = {"engine": engine, "bound": 4, "processes": processes}
+    with tempfile.TemporaryDirectory() as _dir:
+        # both guarantees hold (bmc can only check them up to the bound)
+        tester = make_tester(BVUle)
+        tester.compile_and_run("pono", directory=_dir, **kwargs)
+        results = tester.targets["pono"].property_results
+        assert [result.passed for result in results] == [True, True]
+        assert all(result.witness is None for result in results)
+
+        # c >= a fails for a = 1, b = 0
+        tester = make_tester(BVUge)
+        with pytest.raises(AssertionError):
+            tester.compile_and_run("pono", directory=_dir, **kwargs)
+        results = tester.targets["pono"].property_results
+        assert [result.passed for result in results] == [False, True]
+        assert results[0].witness is not None
@@ -1,9 +1,13 @@
 import random
+import tempfile
+import numpy as np
 from hwtypes import BitVector
+import magma as m
 import fault
-from fault.actions import Poke, Expect, Eval, Step, Print
+from fault.actions import Poke, Expect, Eval, Step, Print, Peek
 from fault.array import Array
 from fault.vector_builder import VectorBuilder
+from fault.vector_store import VectorStore
 from .common import (TestBasicCircuit, TestBasicClkCircuit,
                      TestNestedArraysCircuit)
 
@@ -49,3 +53,57 @@ def test_tester_nested_arrays():
         builder.process(Expect(circ.O[i], BitVector[4](val)))
         expected.append(val)
     assert builder.vectors == [[Array(expected, 3), Array(expected, 3)]]
+
+
+def test_tester_real():
+    class RealCircuit(m.Circuit):
+        io = m.IO(I=fault.RealIn, O=fault.RealOut)
+
+    circ = RealCircuit
+    builder = VectorBuilder(circ)
+    # ints poked into real ports are converted, not stored as raw bits
+    builder.process(Poke(circ.I, 1))
+    builder.process(Expect(circ.O, 2.5))
+    assert builder.vectors == [[1.0, 2.5]]
+
+
+def test_tester_serialize_to():
+    circ = TestBasicClkCircuit
+    tester = fault.Tester(circ, circ.CLK)
+    for i in range(100):
+        tester.poke(circ.I, i % 2)
+        tester.expect(circ.O, i % 2)
+        tester.step(2)
+    vectors = tester.serialize()
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        # small chunks so that the vectors span several writes
+        store = tester.serialize_to(tempdir, chunk_size=16)
+        assert isinstance(store.columns[0], np.memmap)
+        assert len(store) == len(vectors) == 201
+        loaded = VectorStore.load(tempdir)
+        assert loaded.mismatches(store).size == 0
+        ports = list(circ.interface.ports.keys())
+        columns = [ports.index(name) for name in store.names]
+        for vector, row in zip(vectors, store):
+            assert [vector[k] for k in columns] == row.test_vector
+
+
+def test_tester_serialize_objects():
+    circ = TestBasicCircuit
+    tester = fault.Tester(circ)
+    peek = Peek(circ.I)
+    tester.poke(circ.I, 1)
+    tester.expect(circ.O, peek)
+    tester.eval()
+    tester.poke(circ.I, fault.UnknownValue)
+    tester.expect(circ.O, fault.HiZ)
+    vectors = tester.serialize()
+    assert vectors[0][1] is peek
+    assert vectors[1] == [fault.UnknownValue, fault.HiZ]
+
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        store = tester.serialize_to(tempdir)
+        O = store.names.index("O")
+        assert store.value(O, 0) is peek
+        assert store.value(O, 1) is fault.HiZ
+        assert store.mismatches(store).size == 0
@@ -0,0 +1,33 @@
+import tempfile
+import numpy as np
+from hwtypes import BitVector, SIntVector
+import fault
+from fault.vector_store import VectorStore, VectorStoreWriter
+
+
+def test_vector_store():
+    store = VectorStore(["I", "O"], [100, 4], ["bits", "sint"])
+    store.append_vector([BitVector[100](1 << 99), fault.AnyValue])
+    store.append([np.arange(3), [SIntVector[4](-1), 2, fault.AnyValue]])
+    assert len(store) == 4
+    assert store[0].test_vector == [BitVector[100](1 << 99), fault.AnyValue]
+    assert store[1].test_vector == [BitVector[100](0), SIntVector[4](-1)]
+    assert store[3].test_vector[1] is fault.AnyValue
+
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        store.save(tempdir)
+        loaded = VectorStore.load(tempdir)
+        assert isinstance(loaded.columns[0], np.memmap)
+        assert loaded == store
+        assert list(loaded) == list(store)
+
+
+def test_vector_store_writer():
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        with VectorStoreWriter(tempdir, ["I"], [8]) as writer:
+            for start in range(0, 256, 64):
+                writer.append([np.arange(start, start + 64)])
+        store = VectorStore.load(tempdir)
+        assert len(store) == 256
+        assert [vector.test_vector[0] for vector in store] == \
+            [BitVector[8](x) for x in range(256)]
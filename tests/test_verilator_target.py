@@ -1,11 +1,14 @@
 import tempfile
+import pytest
 import magma as m
 import fault
 from hwtypes import BitVector
-from fault.actions import Poke, Expect, Eval, Step, Print, Peek
+from fault.actions import Poke, Expect, Eval, Step, Print, Peek, GetValue
 from fault.tester import Tester
+from fault.verilator_utils import verilator_comp_cmd, VerilatorTrace
 import os.path
-from .common import TestBasicCircuit, TestBasicClkCircuit
+from .common import (TestBasicCircuit, TestBasicClkCircuit,
+                     TestUInt64Circuit)
 
 
 def test_verilator_peeks():
@@ -44,6 +47,132 @@ def test_verilator_skip_build():
         assert mtime == new_mtime
 
 
+def test_verilator_build_cache():
+    circ = TestBasicCircuit
+    flags = ["-Wno-lint"]
+    tester = Tester(circ)
+    tester.poke(circ.I, 1)
+    tester.eval()
+    tester.expect(circ.O, 1)
+    with tempfile.TemporaryDirectory(dir=".") as cache_dir:
+        for _ in range(2):
+            with tempfile.TemporaryDirectory(dir=".") as tempdir:
+                tester.compile_and_run(target="verilator",
+                                       directory=tempdir,
+                                       flags=flags,
+                                       use_build_cache=True,
+                                       build_cache_dir=cache_dir)
+        # a single entry, including the compiled model objects
+        entries = [x for x in os.listdir(cache_dir) if not x.startswith(".")]
+        assert len(entries) == 1
+        assert os.path.isfile(os.path.join(cache_dir, entries[0],
+                                           "VBasicCircuit__ALL.a"))
+
+
+def test_verilator_runtime_stimulus():
+    circ = TestBasicClkCircuit
+    flags = ["-Wno-lint"]
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        target = fault.verilator_target.VerilatorTarget(
+            circ, directory=f"{tempdir}/", flags=flags,
+            runtime_stimulus=True)
+        target.run([Poke(circ.I, 1), Eval(), Expect(circ.O, 1),
+                    Print("O=%d\n", circ.O), Step(circ.CLK, 2)])
+        exe = os.path.join(tempdir, "obj_dir", "VBasicClkCircuit")
+        mtime = os.path.getmtime(exe)
+
+        # new actions are replayed by the same executable
+        get_value = GetValue(circ.O)
+        target.run([Poke(circ.I, 0), Eval(), get_value])
+        assert get_value.value == 0
+        assert os.path.getmtime(exe) == mtime
+
+        with pytest.raises(AssertionError):
+            target.run([Poke(circ.I, 0), Eval(), Expect(circ.O, 1)])
+
+
+def test_verilator_runtime_stimulus_get_value_64():
+    circ = TestUInt64Circuit
+    flags = ["-Wno-lint"]
+    value = (1 << 63) | 5
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        target = fault.verilator_target.VerilatorTarget(
+            circ, directory=f"{tempdir}/", flags=flags,
+            runtime_stimulus=True)
+        get_value = GetValue(circ.O)
+        target.run([Poke(circ.I, value), Eval(), get_value])
+        assert get_value.value == value
+
+
+def test_verilator_driver_shards():
+    circ = TestBasicClkCircuit
+    flags = ["-Wno-lint"]
+    tester = Tester(circ, circ.CLK)
+    get_values = []
+    for k in range(12):
+        tester.poke(circ.I, k % 2)
+        tester.step(2)
+        tester.expect(circ.O, k % 2)
+        get_values.append(tester.get_value(circ.O))
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=flags, driver_shards=3)
+        for k in range(3):
+            shard = os.path.join(tempdir, f"BasicClkCircuit_driver_{k}.cpp")
+            with open(shard, "r") as f:
+                assert "top->eval();" in f.read()
+    assert [get_value.value for get_value in get_values] == \
+        [k % 2 for k in range(12)]
+
+
+def test_verilator_driver_shards_file_io():
+    circ = TestBasicClkCircuit
+    flags = ["-Wno-lint"]
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        file_out = os.path.abspath(os.path.join(tempdir, "out.raw"))
+        tester = Tester(circ, circ.CLK)
+        fd = tester.file_open(file_out, "w")
+        for k in range(4):
+            tester.poke(circ.I, k % 2)
+            tester.step(2)
+            tester.file_write(fd, circ.O)
+        tester.file_close(fd)
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=flags, driver_shards=3)
+        with open(file_out, "rb") as f:
+            assert f.read() == bytes([0, 1, 0, 1])
+
+        # a file that fails to open stops the simulation with an error
+        tester = Tester(circ, circ.CLK)
+        fd = tester.file_open(os.path.join(tempdir, "missing.raw"), "r")
+        tester.poke(circ.I, tester.file_read(fd))
+        tester.step(2)
+        tester.file_close(fd)
+        with pytest.raises(AssertionError):
+            tester.compile_and_run(target="verilator", directory=tempdir,
+                                   flags=flags, driver_shards=3)
+
+
+def test_verilator_perf_mode():
+    cmd = verilator_comp_cmd(top="top", verilog_filename="top.v",
+                             verilator_flags=["--x-assign", "unique"],
+                             threads=2, perf_mode=True)
+    assert "-O3" in cmd
+    assert cmd[cmd.index("--threads") + 1] == "2"
+    # user flags come last so that they override the perf_mode defaults
+    assert cmd.index("unique") > cmd.index("fast")
+
+    circ = TestBasicClkCircuit
+    tester = Tester(circ, circ.CLK)
+    tester.poke(circ.I, 1)
+    tester.step(2)
+    tester.expect(circ.O, 1)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=["-Wno-fatal"], perf_mode=True,
+                               threads=2)
+
+
 def test_verilator_trace():
     circ = TestBasicClkCircuit
     actions = [
@@ -70,3 +199,83 @@ def test_verilator_trace():
         target.run(actions)
         assert os.path.isfile(f"{tempdir}/logs/BasicClkCircuit.vcd"), \
             "Expected VCD to exist"
+
+
+def test_verilator_trace_options():
+    tracing = VerilatorTrace("fst", trace_depth=2, trace_window=(100, None))
+    assert tracing.flags(["-Wno-lint", "--trace"]) == \
+        ["-Wno-lint", "--trace-fst", "--trace-depth", "2"]
+    # tracing stays disabled without --trace
+    assert tracing.flags(["-Wno-lint"]) == ["-Wno-lint"]
+    assert "main_time >= 100" in tracing.declarations()
+    assert "VerilatedFstC" in tracing.open_code("Foo")
+    with pytest.raises(ValueError):
+        VerilatorTrace("vpd")
+
+    circ = TestBasicClkCircuit
+    tester = Tester(circ, circ.CLK)
+    tester.poke(circ.I, 1)
+    tester.stop_trace()
+    tester.step(100)
+    tester.start_trace()
+    tester.step(2)
+    tester.expect(circ.O, 1)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=["-Wno-lint", "--trace"],
+                               trace_format="fst", trace_depth=1,
+                               trace_window=(0, 2000))
+        assert os.path.isfile(f"{tempdir}/logs/BasicClkCircuit.fst")
+        assert not os.path.isfile(f"{tempdir}/logs/BasicClkCircuit.vcd")
+        driver = os.path.join(tempdir, "BasicClkCircuit_driver.cpp")
+        with open(driver) as f:
+            assert "fault_trace_enabled = false;" in f.read()
+
+
+def test_verilator_save_restore_state():
+    circ = TestBasicClkCircuit
+    flags = ["-Wno-lint"]
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester = Tester(circ, circ.CLK)
+        tester.poke(circ.I, 1)
+        tester.step(2)
+        tester.save_state("state.bin")
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=flags, savable=True)
+        assert os.path.isfile(os.path.join(tempdir, "state.bin"))
+
+        tester = Tester(circ, circ.CLK)
+        tester.restore_state("state.bin")
+        tester.expect(circ.O, 1)
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=flags, savable=True)
+
+        tester = Tester(circ, circ.CLK)
+        tester.save_state("state.bin")
+        with pytest.raises(ValueError):
+            tester.compile_and_run(target="verilator", directory=tempdir,
+                                   flags=flags)
+
+
+def test_verilator_step_loop():
+    class Counter(m.Circuit):
+        io = m.IO(count=m.Out(m.UInt[16]), done=m.Out(m.Bit)) + m.ClockIO()
+        count = m.Register(m.UInt[16])()
+        io.count @= count(count.O + 1)
+        io.done @= count.O == 100
+
+    flags = ["-Wno-lint", "--trace"]
+    tester = Tester(Counter, Counter.CLK)
+    tester.step(1000000, until=tester.circuit.done)
+    tester.circuit.count.expect(100)
+    tester.step(20, trace=False)
+    tester.circuit.count.expect(110)
+    tester.step(1000000, until=tester.circuit.count == 120)
+    tester.circuit.count.expect(120)
+    with tempfile.TemporaryDirectory(dir=".") as tempdir:
+        tester.compile_and_run(target="verilator", directory=tempdir,
+                               flags=flags)
+        # the steps are emitted as loops instead of being unrolled
+        driver = os.path.join(tempdir, "Counter_driver.cpp")
+        with open(driver) as f:
+            assert len(f.readlines()) < 200
@@ -225,3 +225,46 @@ def test_target_sint_sign_extend(width, target, simulator):
         Expect(circ.O, -2),
     ]
     run(circ, actions, target, simulator)
+
+
+def test_compile_cache(monkeypatch):
+    circ = define_simple_circuit(m.Bits[4], "CompileCacheCircuit")
+    calls = []
+    compile_ = m.compile
+
+    def counting_compile(*args, **kwargs):
+        calls.append(args)
+        return compile_(*args, **kwargs)
+
+    monkeypatch.setattr(m, "compile", counting_compile)
+
+    def make_target(directory, **kwargs):
+        return fault.verilator_target.VerilatorTarget(
+            circ, directory=directory, skip_verilator=True, **kwargs)
+
+    with tempfile.TemporaryDirectory(dir=".") as cache_dir:
+        sources = []
+        for _ in range(2):
+            with tempfile.TemporaryDirectory(dir=".") as tempdir:
+                target = make_target(tempdir, compile_cache_dir=cache_dir)
+                with open(target.directory / target.verilog_file) as f:
+                    sources.append(f.read())
+        # the second target reuses the Verilog of the first one
+        assert len(calls) == 1
+        assert sources[0] == sources[1]
+
+        # different options are compiled separately
+        with tempfile.TemporaryDirectory(dir=".") as tempdir:
+            make_target(tempdir, circuit_name="CompileCacheCircuit2")
+        assert len(calls) == 2
+
+        # other processes use the on-disk cache
+        fault.verilog_target._compiled_circuits.clear()
+        with tempfile.TemporaryDirectory(dir=".") as tempdir:
+            target = make_target(tempdir, compile_cache_dir=cache_dir)
+            assert (target.directory / target.verilog_file).is_file()
+        assert len(calls) == 2
+
+        with tempfile.TemporaryDirectory(dir=".") as tempdir:
+            make_target(tempdir, compile_cache=False)
+        assert len(calls) == 3